@@ -39,6 +39,9 @@ setup(
     ],
     keywords='cli',
     packages=find_packages(exclude=["*tests*", "test_*"]),
+    package_data={
+        'zedenv': ['lib/programs/*.lua'],
+    },
     install_requires=[
         'click',
         'pyzfscmds @ git+https://github.com/johnramsden/pyzfscmds.git@v0.1.5-beta'
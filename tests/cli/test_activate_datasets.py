@@ -0,0 +1,45 @@
+"""Test zedenv activate dataset changes on the memory backend"""
+
+import pytest
+
+import zedenv.cli.activate
+from zedenv.lib.logger import ZELogger
+
+
+def test_activate_step_by_step(memory_backend):
+    zedenv.cli.activate.zedenv_activate("test", "zpool/ROOT", False, None, True, False)
+
+    assert memory_backend.zpool_get("zpool", ["bootfs"])[0][2] == "zpool/ROOT/test"
+    assert memory_backend.zfs_list("zpool/ROOT", recursive=True,
+                                   columns=["name", "origin", "mountpoint", "canmount"]) == [
+        ["zpool/ROOT", "-", "none", "on"],
+        ["zpool/ROOT/default", "zpool/ROOT/test@2018-05-21-16-150000", "/", "noauto"],
+        ["zpool/ROOT/test", "-", "/", "noauto"]]
+
+
+def test_activate_noop_prints_changes(memory_backend, caplog):
+    memory_backend.create("zpool/ROOT/other", properties={"mountpoint": "/"})
+    memory_backend.calls.clear()
+
+    zedenv.cli.activate.zedenv_activate("test", "zpool/ROOT", False, None, True, True)
+
+    assert [m for m in caplog.messages if m.startswith("Would")] == [
+        "Would set mountpoint=/ on zpool/ROOT/test",
+        "Would set canmount=noauto on zpool/ROOT/other",
+        "Would promote zpool/ROOT/test"]
+    assert ("promote", "zpool/ROOT/test") not in memory_backend.calls
+
+
+def test_activate_mountpoint_set_before_pools(memory_backend, monkeypatch):
+    def failed_pool(*args):
+        ZELogger.log({"level": "EXCEPTION", "message": "Failed to list datasets\n"},
+                     exit_on_error=True)
+
+    monkeypatch.setattr(zedenv.cli.activate, "activate_pool", failed_pool)
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.activate.zedenv_activate("test", "zpool/ROOT", False, None, True, False)
+
+    # Not left on the deleted temporary mountpoint, and still booting the previous one
+    assert memory_backend.datasets["zpool/ROOT/test"]["properties"]["mountpoint"] == "/"
+    assert memory_backend.zpool_get("zpool", ["bootfs"])[0][2] == "zpool/ROOT/default"
@@ -6,6 +6,7 @@ import pytest
 import pyzfscmds.utility as zfs_utility
 
 import zedenv.cli.create
+import zedenv.lib.be
 import zedenv.lib.check
 
 require_root_dataset = pytest.mark.require_root_dataset
@@ -41,3 +42,39 @@ def test_same_boot_environment_created(root_dataset):
     with pytest.raises(SystemExit):
         zedenv.cli.create.zedenv_create(parent_dataset, root_dataset,
                                         boot_environment, verbose, existing, None)
+
+
+def test_create_clones_rollback(memory_backend):
+    for name in ("bpool", "bpool/BOOT"):
+        memory_backend.create(name)
+    memory_backend.create("bpool/BOOT/zedenv-default", properties={"mountpoint": "/boot"})
+    memory_backend.zfs_snapshot("zpool/ROOT/default", "new")
+    memory_backend.zfs_snapshot("bpool/BOOT/zedenv-default", "new")
+    before = sorted(memory_backend.datasets)
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.create.create_clones([
+            ([("zpool/ROOT/default@new", "zpool/ROOT/new", ["canmount=noauto"])],
+             ["zpool/ROOT/default@new"], "Failed to create zpool/ROOT/new."),
+            ([("bpool/BOOT/zedenv-default@missing", "bpool/BOOT/zedenv-new", [])],
+             ["bpool/BOOT/zedenv-default@new"], "Failed to create the boot dataset of new.")
+        ])
+
+    # Neither half of the boot environment is left behind
+    assert sorted(memory_backend.datasets) == sorted(
+        set(before) - {"zpool/ROOT/default@new", "bpool/BOOT/zedenv-default@new"})
+
+
+def test_get_clones_rollback(memory_backend, monkeypatch):
+    memory_backend.create("zpool/ROOT/default/var")
+    before = sorted(memory_backend.datasets)
+
+    def clone_plan(dataset, snap_suffix, properties):
+        raise RuntimeError("Failed to list zpool/ROOT/default")
+
+    monkeypatch.setattr(zedenv.lib.be, "clone_plan", clone_plan)
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.create.get_clones("zpool/ROOT/default", None)
+
+    assert sorted(memory_backend.datasets) == before
@@ -0,0 +1,180 @@
+"""Test zedenv destroy planning on the memory backend"""
+
+import click
+import pytest
+
+import zedenv.cli.destroy
+import zedenv.lib.clones
+from zedenv.lib.backend.base import ChannelProgramUnsupported
+
+
+def test_destroy_clone_fallback(memory_backend):
+    zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                       verbose=False, noconfirm=True, noop=False)
+
+    assert sorted(memory_backend.datasets) == ["zpool", "zpool/ROOT", "zpool/ROOT/default"]
+
+
+def test_destroy_clone_channel_program(memory_backend):
+    programs = []
+
+    def channel_program(pool, program, args=None, readonly=False):
+        if readonly:
+            # Inventory is read by listing
+            raise ChannelProgramUnsupported("not supported")
+        programs.append((pool, program.rsplit("/", 1)[-1], args))
+        return {"destroyed": {"zpool/ROOT/test": True}}
+
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = channel_program
+
+    zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                       verbose=False, noconfirm=True, noop=False)
+
+    assert programs == [("zpool", "destroy_be.lua",
+                         ["zpool/ROOT/test", "zpool/ROOT/default@2018-05-21-16-150000"])]
+    assert "destroy" not in [c[0] for c in memory_backend.calls]
+
+
+def test_destroy_channel_program_keeps_shared_origin(memory_backend):
+    programs = []
+
+    def channel_program(pool, program, args=None, readonly=False):
+        if readonly:
+            raise ChannelProgramUnsupported("not supported")
+        programs.append(args)
+        return {"failed": {"zpool/ROOT/test": 16}}
+
+    memory_backend.zfs_clone("zpool/ROOT/default@2018-05-21-16-150000", "zpool/ROOT/other")
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = channel_program
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                           verbose=False, noconfirm=True, noop=False)
+
+    assert programs == [["zpool/ROOT/test"]]
+
+
+def test_destroy_unsupported_program_asks_once(memory_backend, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(click, "confirm", lambda text, **kwargs: prompts.append(text) or True)
+
+    def channel_program(pool, program, args=None, readonly=False):
+        raise ChannelProgramUnsupported("unrecognized command 'program'")
+
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = channel_program
+
+    zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                       verbose=False, noconfirm=False, noop=False)
+
+    # The answer given for the program is reused by the step by step path
+    assert prompts == ["Destroy 'zpool/ROOT/default@2018-05-21-16-150000'?"]
+    assert sorted(memory_backend.datasets) == ["zpool", "zpool/ROOT", "zpool/ROOT/default"]
+
+
+def test_destroy_failed_program_no_fallback(memory_backend):
+    def channel_program(pool, program, args=None, readonly=False):
+        if readonly:
+            raise ChannelProgramUnsupported("not supported")
+        raise RuntimeError("Channel program execution failed: memory limit exhausted")
+
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = channel_program
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                           verbose=False, noconfirm=True, noop=False)
+
+    # It may have made some of its changes, the pool isn't destroyed a second way
+    assert "destroy" not in [c[0] for c in memory_backend.calls]
+
+
+def test_destroy_mounted_uses_fallback(memory_backend):
+    memory_backend.channel_programs = True
+    memory_backend.zfs_mount("zpool/ROOT/test", mountpoint="/mnt")
+
+    zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                       verbose=False, noconfirm=True, noop=False)
+
+    assert "zpool/ROOT/test" not in memory_backend.datasets
+
+
+def test_destroy_keeps_shared_origin(memory_backend):
+    memory_backend.zfs_clone("zpool/ROOT/default@2018-05-21-16-150000", "zpool/ROOT/other")
+
+    zedenv.cli.destroy.destroy_element("test", "zpool/ROOT/test", False,
+                                       verbose=False, noconfirm=True, noop=False)
+
+    assert "zpool/ROOT/test" not in memory_backend.datasets
+    assert "zpool/ROOT/default@2018-05-21-16-150000" in memory_backend.datasets
+
+
+def test_destroy_match_targets(memory_backend):
+    memory_backend.zfs_snapshot("zpool/ROOT/test", "a")
+    memory_backend.create("zpool/ROOT/test/var")
+
+    assert zedenv.cli.destroy.match_targets("zpool/ROOT", ["t*"], regex=False) == ["test"]
+    assert zedenv.cli.destroy.match_targets("zpool/ROOT", ["*@*"], regex=False) == [
+        "default@2018-05-21-16-150000", "test@a"]
+    assert zedenv.cli.destroy.match_targets("zpool/ROOT", ["te.t", "default"], regex=True) == [
+        "test", "default"]
+    with pytest.raises(SystemExit):
+        zedenv.cli.destroy.match_targets("zpool/ROOT", ["missing*"], regex=False)
+
+
+def test_destroy_targets_clones_first(memory_backend):
+    memory_backend.zfs_snapshot("zpool/ROOT/test", "2018-05-22-10-000000")
+    memory_backend.zfs_clone("zpool/ROOT/test@2018-05-22-10-000000", "zpool/ROOT/newer")
+    memory_backend.zfs_set("zpool/ROOT", "org.zedenv:bootloader=-")
+    memory_backend.calls.clear()
+
+    zedenv.cli.destroy.zedenv_destroy_targets(["test", "newer"], "zpool/ROOT", None, None,
+                                              verbose=False, noconfirm=True, noop=False)
+
+    assert sorted(memory_backend.datasets) == ["zpool", "zpool/ROOT", "zpool/ROOT/default"]
+    assert "promote" not in [c[0] for c in memory_backend.calls]
+    assert [c for c in memory_backend.calls if c[0] == "destroy"] == [
+        ("destroy", "zpool/ROOT/newer"),
+        ("destroy", "zpool/ROOT/test"),
+        ("destroy", "zpool/ROOT/default@2018-05-21-16-150000")]
+
+
+def test_destroy_targets_snapshots_batched(memory_backend):
+    for snapname in ("a", "b"):
+        memory_backend.zfs_snapshot("zpool/ROOT/default", snapname)
+    memory_backend.calls.clear()
+
+    targets = zedenv.cli.destroy.match_targets("zpool/ROOT", ["default@[ab]"], regex=False)
+    zedenv.cli.destroy.zedenv_destroy_targets(targets, "zpool/ROOT", None, None,
+                                              verbose=False, noconfirm=True, noop=False)
+
+    assert [c for c in memory_backend.calls if c[0] == "destroy"] == [
+        ("destroy", "zpool/ROOT/default@a,b")]
+    assert "zpool/ROOT/default@a" not in memory_backend.datasets
+
+
+def test_destroy_targets_one_plan(memory_backend, monkeypatch):
+    origin = "zpool/ROOT/default@2018-05-21-16-150000"
+    memory_backend.zfs_clone(origin, "zpool/ROOT/other")
+    memory_backend.zfs_set("zpool/ROOT", "org.zedenv:bootloader=-")
+    prompts = []
+    monkeypatch.setattr(click, "confirm", lambda text, **kwargs: prompts.append(text) or True)
+    graphs = []
+    clone_graph = zedenv.lib.clones.CloneGraph
+
+    def counted_graph(root):
+        graphs.append(root)
+        return clone_graph(root)
+
+    monkeypatch.setattr(zedenv.lib.clones, "CloneGraph", counted_graph)
+
+    zedenv.cli.destroy.zedenv_destroy_targets(["test", "other"], "zpool/ROOT", None, None,
+                                              verbose=False, noconfirm=False, noop=False)
+
+    # The shared origin is part of the one confirmed plan, and destroyed with the last clone
+    assert len(prompts) == 1
+    assert "default@2018-05-21-16-150000" in prompts[0]
+    assert graphs == ["zpool/ROOT"]
+    assert sorted(memory_backend.datasets) == ["zpool", "zpool/ROOT", "zpool/ROOT/default"]
@@ -7,6 +7,8 @@ import pyzfscmds.utility as zfs_utility
 
 import zedenv.cli.create
 import zedenv.cli.list
+import zedenv.lib.backend.memory
+import zedenv.lib.configure
 
 require_zfs_version = pytest.mark.require_zfs_version
 require_root_dataset = pytest.mark.require_root_dataset
@@ -31,3 +33,23 @@ def test_boot_environment_listed(root_dataset, capsys):
         zfs_utility.dataset_parent(root_dataset), columns, True)
 
     assert any(f"{boot_environment}" in s for s in be_list)
+
+
+def test_boot_environment_list_constant_calls():
+    backend = zedenv.lib.backend.memory.MemoryBackend()
+    backend.create("zpool", properties={"mountpoint": "none"})
+    backend.create("zpool/ROOT")
+    for i in range(50):
+        backend.create(f"zpool/ROOT/be-{i}", properties={"mountpoint": "/", "canmount": "noauto"})
+    backend.zpool_set("zpool", "bootfs=zpool/ROOT/be-1")
+    backend.zfs_mount("zpool/ROOT/be-0")
+    backend.calls.clear()
+    zedenv.lib.configure.set_backend(backend)
+
+    be_list = zedenv.cli.list.configure_boot_environment_list(
+        "zpool/ROOT", ["name", "creation"], True, True)
+
+    assert len(be_list) == 50
+    assert be_list[0].startswith("be-0\tN\t/\t")
+    assert be_list[1].startswith("be-1\tR\t-\t")
+    assert sorted(c[0] for c in backend.calls) == ["list", "mount table", "zpool get"]
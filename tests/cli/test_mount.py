@@ -0,0 +1,54 @@
+"""Test zedenv mount command"""
+
+import pytest
+
+import zedenv.cli.mount
+import zedenv.lib.be
+
+
+@pytest.fixture
+def children_backend(memory_backend):
+    for child in ("var", "var/log", "var/cache", "home"):
+        memory_backend.create(f"zpool/ROOT/test/{child}")
+    memory_backend.create("zpool/ROOT/test/srv", properties={"mountpoint": "none"})
+    memory_backend.calls.clear()
+    return memory_backend
+
+
+def test_mount_tiers(children_backend, tmp_path):
+    mounts = zedenv.cli.mount.child_mounts(
+        zedenv.lib.be.list_child_mountpoints("zpool/ROOT/test"), str(tmp_path), verbose=False)
+
+    assert [[d for d, m in tier] for tier in zedenv.cli.mount.mount_tiers(mounts)] == [
+        ["zpool/ROOT/test/home", "zpool/ROOT/test/var"],
+        ["zpool/ROOT/test/var/cache", "zpool/ROOT/test/var/log"]]
+
+
+def test_mount_children(children_backend, tmp_path):
+    zedenv.cli.mount.mount_children(
+        zedenv.lib.be.list_child_mountpoints("zpool/ROOT/test"), str(tmp_path), verbose=False)
+
+    assert sorted(m["mountpoint"] for m in children_backend.mount_table()
+                  if m["dataset"].startswith("zpool/ROOT/test")) == [
+        str(tmp_path / "home"), str(tmp_path / "var"),
+        str(tmp_path / "var/cache"), str(tmp_path / "var/log")]
+    assert (tmp_path / "var/log").is_dir()
+
+
+def test_mount_children_failure_unwinds(children_backend, tmp_path):
+    mount = children_backend.zfs_mount
+
+    def zfs_mount(dataset, mountpoint=None):
+        if dataset == "zpool/ROOT/test/var/log":
+            raise RuntimeError("mount failed")
+        mount(dataset, mountpoint=mountpoint)
+
+    children_backend.zfs_mount = zfs_mount
+
+    with pytest.raises(RuntimeError, match="Failed mounting child datasets"):
+        zedenv.cli.mount.mount_children(
+            zedenv.lib.be.list_child_mountpoints("zpool/ROOT/test"), str(tmp_path),
+            verbose=False)
+
+    assert [m for m in children_backend.mount_table()
+            if m["dataset"].startswith("zpool/ROOT/test")] == []
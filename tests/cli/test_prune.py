@@ -0,0 +1,67 @@
+"""Test zedenv prune command"""
+
+import pytest
+
+import zedenv.cli.prune
+
+
+@pytest.fixture
+def prune_backend(memory_backend):
+    """
+    Two more boot environments newer than test, 'pinned' is pinned.
+    """
+    memory_backend.zfs_set("zpool/ROOT", "org.zedenv:bootloader=-")
+    memory_backend.create("zpool/ROOT/pinned", properties={"org.zedenv:pinned": "yes"})
+    memory_backend.create("zpool/ROOT/newest", space={"usedds": 10})
+    memory_backend.zfs_set("zpool/ROOT", "org.zedenv:prune-keep-last=1")
+    memory_backend.calls.clear()
+    return memory_backend
+
+
+def test_prune_noop(prune_backend, caplog):
+    zedenv.cli.prune.zedenv_prune("zpool/ROOT", "zpool/ROOT/default", None, {},
+                                  verbose=False, noconfirm=True, noop=True)
+
+    assert "Would destroy zpool/ROOT/test (100)" in caplog.text
+    assert "Would reclaim at least 100" in caplog.text
+    assert "zpool/ROOT/test" in prune_backend.datasets
+
+
+def test_prune_protects_active_current_and_pinned(prune_backend):
+    zedenv.cli.prune.zedenv_prune("zpool/ROOT", "zpool/ROOT/default", None, {},
+                                  verbose=False, noconfirm=True, noop=False)
+
+    assert sorted(prune_backend.datasets) == [
+        "zpool", "zpool/ROOT", "zpool/ROOT/default", "zpool/ROOT/newest", "zpool/ROOT/pinned"]
+
+
+def test_prune_option_overrides_property(prune_backend):
+    zedenv.cli.prune.zedenv_prune("zpool/ROOT", "zpool/ROOT/default", None, {"keep-last": "3"},
+                                  verbose=False, noconfirm=True, noop=False)
+
+    assert "zpool/ROOT/test" in prune_backend.datasets
+    assert "destroy" not in [c[0] for c in prune_backend.calls]
+
+
+def test_prune_without_rules(memory_backend):
+    with pytest.raises(SystemExit):
+        zedenv.cli.prune.zedenv_prune("zpool/ROOT", "zpool/ROOT/default", None, {},
+                                      verbose=False, noconfirm=True, noop=True)
+
+
+def test_prune_orphans(memory_backend, caplog):
+    memory_backend.create("zpool/ROOT/default/var")
+    memory_backend.zfs_snapshot("zpool/ROOT/default", "2018-05-22-10-000000", recursive=True)
+    memory_backend.zfs_snapshot("zpool/ROOT/default", "manual")
+    memory_backend.calls.clear()
+
+    zedenv.cli.prune.zedenv_prune_orphans(["zpool/ROOT"], verbose=False, noconfirm=True,
+                                          noop=False)
+
+    assert [c for c in memory_backend.calls if c[0] == "destroy"] == [
+        ("destroy", "zpool/ROOT/default/var@2018-05-22-10-000000"),
+        ("destroy", "zpool/ROOT/default@2018-05-22-10-000000")]
+    # The origin of test and snapshots zedenv didn't take are kept
+    assert "zpool/ROOT/default@2018-05-21-16-150000" in memory_backend.datasets
+    assert "zpool/ROOT/default@manual" in memory_backend.datasets
+    assert "Reclaimed at least" in caplog.text
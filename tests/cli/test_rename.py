@@ -0,0 +1,20 @@
+"""Test zedenv rename command"""
+
+import pytest
+
+import zedenv.cli.rename
+
+
+def test_rename_datasets_rollback(memory_backend):
+    for name in ("bpool", "bpool/BOOT", "bpool/BOOT/zedenv-test"):
+        memory_backend.create(name)
+    memory_backend.create("bpool/BOOT/zedenv-renamed")
+
+    with pytest.raises(SystemExit):
+        zedenv.cli.rename.rename_datasets([
+            ("zpool/ROOT/test", "zpool/ROOT/renamed"),
+            ("bpool/BOOT/zedenv-test", "bpool/BOOT/zedenv-renamed")])
+
+    assert "zpool/ROOT/test" in memory_backend.datasets
+    assert "zpool/ROOT/renamed" not in memory_backend.datasets
+    assert "bpool/BOOT/zedenv-test" in memory_backend.datasets
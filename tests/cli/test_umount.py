@@ -0,0 +1,66 @@
+"""Test zedenv umount command"""
+
+import platform
+
+import pytest
+
+import zedenv.cli.mount
+import zedenv.cli.umount
+import zedenv.lib.be
+import zedenv.lib.system
+
+
+@pytest.fixture
+def mounted_backend(memory_backend, tmp_path):
+    for child in ("var", "var/log", "home"):
+        memory_backend.create(f"zpool/ROOT/test/{child}")
+    zedenv.cli.mount.zedenv_mount("test", str(tmp_path), False, "zpool/ROOT")
+    memory_backend.calls.clear()
+    return memory_backend
+
+
+def test_umount_deepest_first(mounted_backend, tmp_path):
+    zedenv.cli.umount.zedenv_umount("test", False, "zpool/ROOT")
+
+    assert mounted_backend.mount_table() == [
+        {"dataset": "zpool/ROOT/default", "mountpoint": "/"}]
+    unmounted = [c[1] for c in mounted_backend.calls if c[0] == "unmount"]
+    assert unmounted[-1] == str(tmp_path)
+    assert unmounted.index(str(tmp_path / "var/log")) < unmounted.index(str(tmp_path / "var"))
+    assert "list" not in [c[0] for c in mounted_backend.calls]
+
+
+def test_umount_recursive(mounted_backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    monkeypatch.setattr(zedenv.lib.system, "mount", lambda: [
+        "proc on /proc type proc (rw,nosuid,nodev,noexec,relatime)",
+        f"zpool/ROOT/test on {tmp_path} type zfs (rw,relatime,xattr,noacl)"])
+
+    zedenv.cli.umount.zedenv_umount("test", False, "zpool/ROOT", recursive=True)
+
+    assert [c for c in mounted_backend.calls if c[0] == "unmount"] == [
+        ("unmount", str(tmp_path))]
+    assert len(mounted_backend.mount_table()) == 1
+
+
+def test_umount_recursive_unsafe(mounted_backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    mounted_backend.create("zpool/data")
+    zedenv.lib.be.zfs_mount("zpool/data", mountpoint=str(tmp_path / "srv"))
+
+    zedenv.cli.umount.zedenv_umount("test", False, "zpool/ROOT", recursive=True)
+
+    assert len([c for c in mounted_backend.calls if c[0] == "unmount"]) == 5
+    assert len(mounted_backend.mount_table()) == 1
+
+
+def test_umount_recursive_bind_mount(mounted_backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    monkeypatch.setattr(zedenv.lib.system, "mount", lambda: [
+        f"zpool/ROOT/test on {tmp_path} type zfs (rw,relatime,xattr,noacl)",
+        f"proc on {tmp_path}/proc type proc (rw,nosuid,nodev,noexec,relatime)"])
+
+    zedenv.cli.umount.zedenv_umount("test", False, "zpool/ROOT", recursive=True)
+
+    assert len([c for c in mounted_backend.calls if c[0] == "unmount"]) == 4
+    assert len(mounted_backend.mount_table()) == 1
@@ -1,6 +1,9 @@
 import pytest
 import pyzfscmds.system.agnostic
 
+import zedenv.lib.backend.memory
+import zedenv.lib.configure
+
 # https://github.com/zfsonlinux/zfs/commit/2a8b84b747cb27a175aa3a45b8cdb293cde31886
 zfs_support_version = '0.7.0'
 
@@ -79,3 +82,37 @@ def unsafe(request):
 def zfs_version(request):
     """Specify zfs version."""
     return request.config.getoption("--zfs-version")
+
+
+@pytest.fixture(autouse=True)
+def reset_backend():
+    """Each test chooses its backend again and starts with an empty inventory."""
+    zedenv.lib.configure.set_backend(None)
+    yield
+    zedenv.lib.configure.set_backend(None)
+
+
+@pytest.fixture
+def memory_backend():
+    """
+    Use the in-memory backend with a small pool, booted from zpool/ROOT/default
+    with a clone zpool/ROOT/test. Calls made during setup are cleared.
+    """
+    backend = zedenv.lib.backend.memory.MemoryBackend()
+    backend.create("zpool", properties={"mountpoint": "none"})
+    backend.create("zpool/ROOT", properties={"org.zedenv:bootloader": "systemdboot"})
+    backend.create("zpool/ROOT/default",
+                   properties={"mountpoint": "/", "canmount": "noauto"},
+                   space={"used": 2000, "usedds": 1500, "usedbysnapshots": 500, "refer": 1500})
+    backend.create("zpool/ROOT/default@2018-05-21-16-150000", zfs_type="snapshot",
+                   space={"used": 300, "refer": 1400})
+    backend.create("zpool/ROOT/test",
+                   origin="zpool/ROOT/default@2018-05-21-16-150000",
+                   properties={"mountpoint": "/", "canmount": "noauto"},
+                   space={"used": 100, "usedds": 100, "refer": 1450})
+    backend.zpool_set("zpool", "bootfs=zpool/ROOT/default")
+    backend.zfs_mount("zpool/ROOT/default")
+    backend.calls.clear()
+
+    zedenv.lib.configure.set_backend(backend)
+    return backend
@@ -0,0 +1,295 @@
+"""Test ZFS backends"""
+
+import os
+import subprocess
+import types
+
+import pytest
+import pyzfscmds.cmd
+
+import zedenv.lib.backend.command
+import zedenv.lib.backend.libzfs
+import zedenv.lib.backend.memory
+import zedenv.lib.configure
+from zedenv.lib.backend.base import ChannelProgramUnsupported
+
+require_zpool = pytest.mark.require_zpool
+require_unsafe = pytest.mark.require_unsafe
+
+
+def test_backend_from_environment(monkeypatch):
+    monkeypatch.setenv("ZEDENV_BACKEND", "memory")
+    assert isinstance(zedenv.lib.configure.get_backend(),
+                      zedenv.lib.backend.memory.MemoryBackend)
+    assert zedenv.lib.configure.get_backend() is zedenv.lib.configure.get_backend()
+
+
+def test_backend_default_and_unknown(monkeypatch):
+    monkeypatch.delenv("ZEDENV_BACKEND", raising=False)
+    monkeypatch.setattr(zedenv.lib.backend.libzfs, "libzfs_core", None)
+    assert isinstance(zedenv.lib.configure.get_backend(),
+                      zedenv.lib.backend.command.CommandBackend)
+
+    zedenv.lib.configure.set_backend(None)
+    monkeypatch.setenv("ZEDENV_BACKEND", "missing")
+    with pytest.raises(RuntimeError, match="missing"):
+        zedenv.lib.configure.get_backend()
+
+
+def test_stream_command_splits_lines():
+    rows = zedenv.lib.backend.command.stream_command(
+        ["printf", "zpool/ROOT/default\\t/\\nzpool/ROOT/default/srv\\t/srv/my data\\n"])
+
+    assert next(rows) == ["zpool/ROOT/default", "/"]
+    assert list(rows) == [["zpool/ROOT/default/srv", "/srv/my data"]]
+
+
+def test_stream_command_first_row_before_exit():
+    rows = zedenv.lib.backend.command.stream_command(["sh", "-c", "echo first; exec sleep 60"])
+
+    assert next(rows) == ["first"]
+    rows.close()
+
+
+def test_stream_command_failure():
+    with pytest.raises(RuntimeError, match="no such dataset"):
+        list(zedenv.lib.backend.command.stream_command(
+            ["sh", "-c", "echo partial; echo no such dataset >&2; exit 1"]))
+
+
+def test_stream_command_large_error_output():
+    with pytest.raises(RuntimeError, match="Failed to run"):
+        list(zedenv.lib.backend.command.stream_command(
+            ["sh", "-c", "head -c 1000000 /dev/zero | tr '\\0' x >&2; echo done; exit 1"]))
+
+
+def test_command_backend_arguments(monkeypatch):
+    calls = []
+    monkeypatch.setattr(zedenv.lib.backend.command, "stream_command",
+                        lambda call: calls.append(call) or iter([]))
+    monkeypatch.setattr(pyzfscmds.cmd, "zfs_destroy_snapshot",
+                        lambda snapname: calls.append(["destroy snapshot", snapname]))
+
+    backend = zedenv.lib.backend.command.CommandBackend()
+    backend.zfs_list("zpool/ROOT", recursive=True, columns=["name", "origin"],
+                     zfs_types=["filesystem", "snapshot"], sort_properties_descending=["name"])
+    backend.zfs_get("zpool/ROOT", properties=["mountpoint"], depth=1, source=["local"])
+    backend.zfs_destroy("zpool/ROOT/default@snap")
+    backend.zfs_destroy_snapshots("zpool/ROOT/default", ["a", "b"])
+    backend.zfs_set_properties("zpool/ROOT", ["org.zedenv:a=1", "org.zedenv:b=2"])
+
+    assert calls == [
+        ["zfs", "list", "-H", "-p", "-r", "-o", "name,origin", "-t", "filesystem,snapshot",
+         "-S", "name", "zpool/ROOT"],
+        ["zfs", "get", "-H", "-p", "-d", "1", "-o", "name,property,value,source",
+         "-s", "local", "mountpoint", "zpool/ROOT"],
+        ["destroy snapshot", "zpool/ROOT/default@snap"],
+        ["zfs", "destroy", "zpool/ROOT/default@a,b"],
+        ["zfs", "set", "org.zedenv:a=1", "org.zedenv:b=2", "zpool/ROOT"]]
+
+
+def test_command_backend_channel_program(monkeypatch):
+    calls = []
+
+    def run(call, **kwargs):
+        calls.append(call)
+        return types.SimpleNamespace(returncode=0, stderr="",
+                                     stdout='{"return": {"zpool/ROOT": {"type": "filesystem"}}}')
+
+    monkeypatch.setattr(subprocess, "run", run)
+    monkeypatch.setattr(os, "geteuid", lambda: 0)
+    backend = zedenv.lib.backend.command.CommandBackend()
+
+    assert backend.channel_program("zpool", "inventory.lua", args=["zpool/ROOT"],
+                                   readonly=True) == {"zpool/ROOT": {"type": "filesystem"}}
+    assert calls == [["zfs", "program", "-j", "-n", "zpool", "inventory.lua", "zpool/ROOT"]]
+
+    # Not run at all without root
+    monkeypatch.setattr(os, "geteuid", lambda: 1000)
+    with pytest.raises(ChannelProgramUnsupported):
+        backend.channel_program("zpool", "inventory.lua", args=["zpool/ROOT"], readonly=True)
+    assert len(calls) == 1
+
+
+def test_command_backend_channel_program_failure(monkeypatch):
+    stderr = []
+    monkeypatch.setattr(subprocess, "run", lambda call, **kwargs: types.SimpleNamespace(
+        returncode=1, stderr=stderr[-1], stdout=""))
+    monkeypatch.setattr(os, "geteuid", lambda: 0)
+    backend = zedenv.lib.backend.command.CommandBackend()
+
+    stderr.append("unrecognized command 'program'\nusage: ...")
+    with pytest.raises(ChannelProgramUnsupported):
+        backend.channel_program("zpool", "destroy_be.lua", args=["zpool/ROOT/test"])
+
+    # A program that ran and failed is not a reason to fall back
+    stderr.append("Channel program execution failed:\nmemory limit exhausted")
+    with pytest.raises(RuntimeError) as e:
+        backend.channel_program("zpool", "destroy_be.lua", args=["zpool/ROOT/test"])
+    assert not isinstance(e.value, ChannelProgramUnsupported)
+
+
+def test_memory_inherited_properties(memory_backend):
+    memory_backend.create("zpool/ROOT/default/var")
+
+    assert memory_backend.zfs_get("zpool/ROOT/default/var",
+                                  properties=["mountpoint", "org.zedenv:bootloader"],
+                                  columns=["property", "value", "source"]) == [
+        ["mountpoint", "/var", "inherited from zpool/ROOT/default"],
+        ["org.zedenv:bootloader", "systemdboot", "inherited from zpool/ROOT"]]
+    assert memory_backend.zfs_get("zpool/ROOT/default/var", source=["local"]) == []
+
+
+def test_memory_destroy_dependent_clones(memory_backend):
+    with pytest.raises(RuntimeError, match="dependent clones"):
+        memory_backend.zfs_destroy("zpool/ROOT/default@2018-05-21-16-150000")
+    with pytest.raises(RuntimeError, match="dependent clones"):
+        memory_backend.zfs_destroy("zpool/ROOT/default", recursive=True)
+
+    memory_backend.zfs_destroy("zpool/ROOT/test")
+    memory_backend.zfs_destroy("zpool/ROOT/default", recursive=True)
+
+    assert sorted(memory_backend.datasets) == ["zpool", "zpool/ROOT"]
+    assert memory_backend.mount_table() == []
+
+
+def test_memory_promote(memory_backend):
+    memory_backend.zfs_snapshot("zpool/ROOT/default", "later")
+    memory_backend.zfs_promote("zpool/ROOT/test")
+
+    assert "zpool/ROOT/test@2018-05-21-16-150000" in memory_backend.datasets
+    assert "zpool/ROOT/default@later" in memory_backend.datasets
+    assert memory_backend.zfs_list("zpool/ROOT", recursive=True, columns=["name", "origin"]) == [
+        ["zpool/ROOT", "-"],
+        ["zpool/ROOT/default", "zpool/ROOT/test@2018-05-21-16-150000"],
+        ["zpool/ROOT/test", "-"]]
+
+
+def test_memory_rename(memory_backend):
+    memory_backend.zfs_promote("zpool/ROOT/test")
+    memory_backend.zfs_rename("zpool/ROOT/test", "zpool/ROOT/renamed")
+
+    assert memory_backend.zfs_list("zpool/ROOT/default", columns=["origin"]) == [
+        ["zpool/ROOT/renamed@2018-05-21-16-150000"]]
+    assert memory_backend.zfs_list("zpool/ROOT", recursive=True,
+                                   zfs_types=["snapshot"]) == [
+        ["zpool/ROOT/renamed@2018-05-21-16-150000"]]
+
+
+def backend_operations(backend, root: str) -> list:
+    """
+    Run the operations zedenv makes when creating, activating and destroying a
+    boot environment on root/be and root/be/var, return the resulting datasets.
+    """
+    backend.zfs_snapshot(f"{root}/be", "one", recursive=True)
+    backend.zfs_clone(f"{root}/be@one", f"{root}/clone",
+                      properties=["canmount=noauto", "mountpoint=none"])
+    backend.zfs_clone(f"{root}/be/var@one", f"{root}/clone/var", properties=["canmount=noauto"])
+    backend.zfs_set(f"{root}/clone", "org.zedenv:test=yes")
+    backend.zfs_promote(f"{root}/clone")
+    backend.zfs_promote(f"{root}/clone/var")
+    backend.zfs_rename(f"{root}/be", f"{root}/old")
+    backend.zfs_destroy(f"{root}/old/var")
+    backend.zfs_destroy(f"{root}/old")
+    backend.zfs_destroy(f"{root}/clone/var@one")
+
+    return [[v.replace(root, "<root>") for v in ds] for ds in backend.zfs_list(
+        root, recursive=True, zfs_types=["filesystem", "snapshot"],
+        columns=["name", "origin", "canmount", "org.zedenv:test"])]
+
+
+def fake_libzfs_core(backend, supported: bool = True) -> types.SimpleNamespace:
+    """
+    Stand-in for the pyzfs bindings making its changes on a memory backend,
+    lzc_set_props is never supported and the others only when 'supported' is.
+    """
+    class ZFSError(Exception):
+        pass
+
+    canmount = {0: "off", 1: "on", 2: "noauto"}
+    calls = []
+
+    def lzc_snapshot(snaps):
+        calls.append("lzc_snapshot")
+        for snap in snaps:
+            backend.zfs_snapshot(*snap.decode().split("@"))
+
+    def lzc_clone(name, origin, props):
+        calls.append("lzc_clone")
+        backend.zfs_clone(origin.decode(), name.decode(), properties=[
+            f"{p.decode()}={canmount[v] if p == b'canmount' else v.decode()}"
+            for p, v in props.items()])
+
+    def lzc_destroy_snaps(snaps, defer):
+        calls.append("lzc_destroy_snaps")
+        for snap in snaps:
+            backend.zfs_destroy(snap.decode())
+
+    def call(name, method):
+        def lzc(*args):
+            calls.append(name)
+            method(*[a.decode() for a in args])
+        return lzc
+
+    return types.SimpleNamespace(
+        calls=calls,
+        exceptions=types.SimpleNamespace(ZFSError=ZFSError, DatasetBusy=ZFSError),
+        is_supported=lambda func: supported and func is not None,
+        lzc_set_props=None,
+        lzc_snapshot=lzc_snapshot,
+        lzc_clone=lzc_clone,
+        lzc_destroy_snaps=lzc_destroy_snaps,
+        lzc_promote=call("lzc_promote", backend.zfs_promote),
+        lzc_rename=call("lzc_rename", backend.zfs_rename),
+        lzc_destroy=call("lzc_destroy", backend.zfs_destroy))
+
+
+def memory_pool() -> zedenv.lib.backend.memory.MemoryBackend:
+    backend = zedenv.lib.backend.memory.MemoryBackend()
+    for name in ("zpool", "zpool/test", "zpool/test/be", "zpool/test/be/var"):
+        backend.create(name)
+    return backend
+
+
+def test_libzfs_core_matches_memory(monkeypatch):
+    native_pool = memory_pool()
+    lzc = fake_libzfs_core(native_pool)
+    monkeypatch.setattr(zedenv.lib.backend.libzfs, "libzfs_core", lzc)
+
+    native = zedenv.lib.backend.libzfs.LibZFSCoreBackend(fallback=native_pool)
+
+    assert backend_operations(native, "zpool/test") == \
+        backend_operations(memory_pool(), "zpool/test")
+    assert "lzc_promote" in lzc.calls and "lzc_clone" in lzc.calls
+    assert ("set", "zpool/test/clone") in native_pool.calls
+
+
+def test_libzfs_core_unsupported_falls_back(monkeypatch):
+    native_pool = memory_pool()
+    lzc = fake_libzfs_core(native_pool, supported=False)
+    monkeypatch.setattr(zedenv.lib.backend.libzfs, "libzfs_core", lzc)
+
+    native = zedenv.lib.backend.libzfs.LibZFSCoreBackend(fallback=native_pool)
+
+    assert backend_operations(native, "zpool/test") == \
+        backend_operations(memory_pool(), "zpool/test")
+    assert lzc.calls == []
+
+
+@require_zpool
+@require_unsafe
+@pytest.mark.skipif(not zedenv.lib.backend.libzfs.available(),
+                    reason="Requires the pyzfs libzfs_core bindings")
+def test_libzfs_core_matches_command(zpool):
+    results = []
+    for backend in (zedenv.lib.backend.command.CommandBackend(),
+                    zedenv.lib.backend.libzfs.LibZFSCoreBackend()):
+        root = f"{zpool}/zedenv-backend-test"
+        subprocess.check_call(["zfs", "create", "-o", "mountpoint=none", root])
+        subprocess.check_call(["zfs", "create", "-p", f"{root}/be/var"])
+        try:
+            results.append(backend_operations(backend, root))
+        finally:
+            subprocess.check_call(["zfs", "destroy", "-r", root])
+
+    assert results[0] == results[1]
@@ -0,0 +1,148 @@
+"""Test boot environment library functions"""
+
+import pytest
+
+import zedenv.lib.be
+from zedenv.lib.backend.base import ChannelProgramUnsupported
+
+
+def test_list_child_mountpoints(memory_backend):
+    memory_backend.create("zpool/ROOT/default/var")
+    memory_backend.create("zpool/ROOT/default/srv", properties={"mountpoint": "/srv/my data"})
+
+    assert zedenv.lib.be.list_child_mountpoints("zpool/ROOT/default") == [
+        {
+            'name': 'zpool/ROOT/default/srv',
+            'mountpoint': '/srv/my data',
+            'source': 'local'
+        },
+        {
+            'name': 'zpool/ROOT/default/var',
+            'mountpoint': '/var',
+            'source': 'inherited from zpool/ROOT/default'
+        }
+    ]
+    assert memory_backend.calls == [("get", "zpool/ROOT/default")]
+
+
+def test_subtree_properties(memory_backend):
+    memory_backend.zfs_set("zpool/ROOT/default", "compression=lz4")
+    memory_backend.calls.clear()
+
+    props = zedenv.lib.be.subtree_properties("zpool/ROOT", [["canmount", "noauto"]])
+
+    assert props == {
+        "zpool/ROOT": ["org.zedenv:bootloader=systemdboot", "canmount=noauto"],
+        "zpool/ROOT/default": ["mountpoint=/", "compression=lz4", "canmount=noauto"],
+        "zpool/ROOT/test": ["mountpoint=/", "canmount=noauto"],
+    }
+    assert [c[0] for c in memory_backend.calls].count("get") == 1
+    assert [c[0] for c in memory_backend.calls].count("zpool get") == 1
+
+
+def test_clone_properties_altroot():
+    assert zedenv.lib.be.clone_properties(
+        [["mountpoint", "/mnt/var"], ["atime", "off"]], [["canmount", "noauto"]], "/mnt"
+    ) == ["mountpoint=/var", "atime=off", "canmount=noauto"]
+
+
+def test_clone_plan(memory_backend):
+    assert zedenv.lib.be.clone_plan(
+        "zpool/ROOT/default", "2018-05-21-16-150000", [["canmount", "noauto"]]) == [{
+            "snapshot": "zpool/ROOT/default@2018-05-21-16-150000",
+            "properties": ["mountpoint=/", "canmount=noauto"],
+            "datasetchild": ""
+        }]
+
+    with pytest.raises(RuntimeError, match="zpool/ROOT/test@2018-05-21-16-150000"):
+        zedenv.lib.be.clone_plan("zpool/ROOT", "2018-05-21-16-150000")
+
+
+def test_clone_tiers():
+    clones = [("zpool/ROOT/default@new", "zpool/ROOT/new", []),
+              ("zpool/ROOT/default/var@new", "zpool/ROOT/new/var", []),
+              ("zpool/ROOT/default/var/log@new", "zpool/ROOT/new/var/log", []),
+              ("zpool/ROOT/default/srv@new", "zpool/ROOT/new/srv", [])]
+
+    assert zedenv.lib.be.clone_tiers(clones) == [[clones[0]], [clones[1], clones[3]], [clones[2]]]
+
+
+def test_zfs_clones_rollback(memory_backend):
+    memory_backend.create("zpool/ROOT/default/var")
+    memory_backend.zfs_snapshot("zpool/ROOT/default", "new", recursive=True)
+    before = sorted(memory_backend.datasets)
+    snapshots = ["zpool/ROOT/default@new", "zpool/ROOT/default/var@new"]
+
+    with pytest.raises(RuntimeError):
+        zedenv.lib.be.zfs_clones([
+            ("zpool/ROOT/default@new", "zpool/ROOT/new", ["canmount=noauto"]),
+            ("zpool/ROOT/default/var@new", "zpool/ROOT/new/var", ["canmount=noauto"]),
+            ("zpool/ROOT/default/var@missing", "zpool/ROOT/new/srv", ["canmount=noauto"])
+        ], created_snapshots=snapshots)
+
+    assert sorted(memory_backend.datasets) == sorted(set(before) - set(snapshots))
+    assert [c for c in memory_backend.calls if c[0] == "destroy"] == [
+        ("destroy", "zpool/ROOT/new/var"), ("destroy", "zpool/ROOT/new"),
+        ("destroy", "zpool/ROOT/default@new"), ("destroy", "zpool/ROOT/default/var@new")]
+
+
+def test_zfs_destroy_all_channel_program(memory_backend):
+    programs = []
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = \
+        lambda pool, program, args=None, readonly=False: programs.append((pool, args)) or {}
+
+    zedenv.lib.be.zfs_destroy_all(["zpool/ROOT/test", "zpool/ROOT/default@2018-05-21-16-150000"])
+
+    assert programs == [("zpool", ["zpool/ROOT/test", "zpool/ROOT/default@2018-05-21-16-150000"])]
+    assert "destroy" not in [c[0] for c in memory_backend.calls]
+
+
+def test_zfs_destroy_all_keeps_going(memory_backend):
+    with pytest.raises(RuntimeError) as excinfo:
+        zedenv.lib.be.zfs_destroy_all(
+            ["zpool/ROOT/default@2018-05-21-16-150000", "zpool/ROOT/test", "zpool/ROOT/missing"])
+
+    assert "zpool/ROOT/test" not in memory_backend.datasets
+    assert "zpool/ROOT/default@2018-05-21-16-150000" in memory_backend.datasets
+    assert "zpool/ROOT/missing" in str(excinfo.value)
+
+
+def test_run_channel_program_failure(memory_backend):
+    def channel_program(pool, program, args=None, readonly=False):
+        raise (ChannelProgramUnsupported if readonly else RuntimeError)("failed")
+
+    memory_backend.channel_programs = True
+    memory_backend.channel_program = channel_program
+
+    # Only a backend that can't run programs at all takes the fallback path
+    assert zedenv.lib.be.run_channel_program(
+        "zpool", "inventory", ["zpool"], readonly=True) is None
+    with pytest.raises(RuntimeError, match="failed"):
+        zedenv.lib.be.run_channel_program("zpool", "destroy", ["zpool/ROOT/test"])
+
+
+def test_zfs_set_properties(memory_backend):
+    zedenv.lib.be.zfs_set_properties("zpool/ROOT", ["org.zedenv:a=1", "org.zedenv:b=2"])
+
+    assert memory_backend.calls == [("set", "zpool/ROOT")]
+    assert zedenv.lib.be.get_property("zpool/ROOT", "org.zedenv:b") == "2"
+
+    with pytest.raises(RuntimeError, match="Failed to set 'creation=5' on zpool/ROOT"):
+        zedenv.lib.be.zfs_set_properties("zpool/ROOT", ["org.zedenv:c=3", "creation=5"])
+    assert [c for c in memory_backend.calls if c[0] == "set"] == [
+        ("set", "zpool/ROOT"), ("set", "zpool/ROOT")]
+    assert "org.zedenv:c" not in memory_backend.datasets["zpool/ROOT"]["properties"]
+    assert zedenv.lib.be.get_property("zpool/ROOT", "org.zedenv:c") == "-"
+
+
+def test_zfs_set_datasets_batches(memory_backend, monkeypatch):
+    monkeypatch.setattr(zedenv.lib.be, "set_batch_size", 2)
+    memory_backend.create("zpool/ROOT/other")
+
+    zedenv.lib.be.zfs_set_datasets(
+        ["zpool/ROOT/default", "zpool/ROOT/test", "zpool/ROOT/other"], "canmount=off")
+
+    assert memory_backend.calls == [("set", "zpool/ROOT/default zpool/ROOT/test"),
+                                    ("set", "zpool/ROOT/other")]
+    assert zedenv.lib.be.get_property("zpool/ROOT/other", "canmount") == "off"
@@ -0,0 +1,42 @@
+"""Test clone graph used for destroy planning"""
+
+import zedenv.lib.clones
+
+origin = "zpool/ROOT/default@2018-05-21-16-150000"
+
+
+def test_clone_graph(memory_backend):
+    memory_backend.create("zpool/data")
+    graph = zedenv.lib.clones.CloneGraph("zpool/ROOT")
+
+    assert graph.subtree("zpool/ROOT") == ["zpool/ROOT", "zpool/ROOT/default", "zpool/ROOT/test"]
+    assert graph.dependent_clones("zpool/ROOT/default") == ["zpool/ROOT/test"]
+    assert graph.dependent_clones("zpool/ROOT") == []
+    assert graph.origin_snapshots("zpool/ROOT/test") == [origin]
+    assert graph.dependents(origin) == ["zpool/ROOT/test"]
+    assert graph.orphaned(origin, "zpool/ROOT/test")
+    # Built from the inventory's listing of the root, nothing listed again
+    assert [c for c in memory_backend.calls if c[0] == "list"] == [("list", "zpool/ROOT")]
+    zedenv.lib.clones.CloneGraph("zpool/ROOT")
+    assert [c for c in memory_backend.calls if c[0] == "list"] == [("list", "zpool/ROOT")]
+
+
+def test_clone_graph_shared_origin(memory_backend):
+    memory_backend.zfs_clone(origin, "zpool/ROOT/other")
+    memory_backend.create("zpool/ROOT/test/var")
+    graph = zedenv.lib.clones.CloneGraph("zpool/ROOT")
+
+    assert graph.subtree("zpool/ROOT/test") == ["zpool/ROOT/test", "zpool/ROOT/test/var"]
+    assert graph.dependents(origin) == ["zpool/ROOT/other", "zpool/ROOT/test"]
+    assert not graph.orphaned(origin, "zpool/ROOT/test")
+
+
+def test_clone_graph_destroy_order(memory_backend):
+    memory_backend.zfs_snapshot("zpool/ROOT/test", "later")
+    memory_backend.zfs_clone("zpool/ROOT/test@later", "zpool/ROOT/newer")
+    graph = zedenv.lib.clones.CloneGraph("zpool/ROOT")
+
+    assert graph.destroy_order(["zpool/ROOT/default", "zpool/ROOT/test", "zpool/ROOT/newer"]) == [
+        "zpool/ROOT/newer", "zpool/ROOT/test", "zpool/ROOT/default"]
+    assert graph.destroy_order(["zpool/ROOT/newer", "zpool/ROOT/test"]) == [
+        "zpool/ROOT/newer", "zpool/ROOT/test"]
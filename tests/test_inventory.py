@@ -0,0 +1,173 @@
+"""Test invocation scoped inventory"""
+
+import zedenv.lib.be
+import zedenv.lib.inventory
+import zedenv.lib.runner
+from zedenv.lib.backend.base import ChannelProgramUnsupported
+
+
+def call_names(backend):
+    return [c[0] for c in backend.calls]
+
+
+def listings(backend):
+    return [c[1] for c in backend.calls if c[0] in ("list", "program")]
+
+
+def test_inventory_single_listing(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.dataset_exists("zpool/ROOT/default")
+    assert inventory.dataset_exists("zpool/ROOT/default@2018-05-21-16-150000",
+                                    zfs_type="snapshot")
+    assert not inventory.dataset_exists("zpool/ROOT/missing")
+    assert inventory.is_clone("zpool/ROOT/test")
+    assert not inventory.is_clone("zpool/ROOT/default")
+    assert inventory.pool_property("zpool", "bootfs") == "zpool/ROOT/default"
+    assert inventory.children("zpool/ROOT") == [
+        "zpool/ROOT", "zpool/ROOT/default", "zpool/ROOT/test"]
+    assert inventory.mountpoint_dataset("/") == "zpool/ROOT/default"
+
+    # Only the boot environment root is listed, once
+    assert call_names(memory_backend) == ["mount table", "zpool get", "list"]
+    assert listings(memory_backend) == ["zpool/ROOT"]
+
+
+def test_inventory_property_cached(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.get_property("zpool/ROOT", "org.zedenv:bootloader") == "systemdboot"
+    assert inventory.get_property("zpool/ROOT", "org.zedenv:bootloader") == "systemdboot"
+    assert inventory.get_property("zpool/ROOT/default", "canmount") == "noauto"
+
+    assert call_names(memory_backend).count("get") == 1
+
+
+def test_inventory_set_property(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+    assert inventory.get_property("zpool/ROOT/test", "canmount") == "noauto"
+
+    inventory.set_property("zpool/ROOT/test", "canmount", "on")
+    assert inventory.get_property("zpool/ROOT/test", "canmount") == "on"
+    assert listings(memory_backend) == ["zpool/ROOT"]
+
+    inventory.invalidate()
+    assert inventory.get_property("zpool/ROOT/test", "canmount") == "noauto"
+    assert listings(memory_backend) == ["zpool/ROOT", "zpool/ROOT"]
+
+
+def test_inventory_children_depth(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.children("zpool/ROOT", zfs_type=None, depth=1) == [
+        "zpool/ROOT", "zpool/ROOT/default", "zpool/ROOT/test"]
+    assert inventory.children("zpool/ROOT/default", zfs_type=None) == [
+        "zpool/ROOT/default", "zpool/ROOT/default@2018-05-21-16-150000"]
+
+
+def test_inventory_typed_values(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.get_property("zpool/ROOT/default", "creation") == \
+        memory_backend.datasets["zpool/ROOT/default"]["creation"]
+    assert inventory.get_property("zpool/ROOT/default", "usedds") == 1500
+    assert inventory.datasets["zpool/ROOT/test"]["origin"] == \
+        "zpool/ROOT/default@2018-05-21-16-150000"
+
+
+def test_inventory_add_snapshots(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+    assert inventory.dataset_exists("zpool/ROOT/test")
+
+    inventory.add_snapshots("zpool/ROOT", "test-snap", recursive=True)
+
+    assert inventory.dataset_exists("zpool/ROOT/test@test-snap", zfs_type="snapshot")
+    assert not inventory.dataset_exists("zpool/ROOT/default@2018-05-21-16-150000@test-snap",
+                                        zfs_type="snapshot")
+    assert listings(memory_backend) == ["zpool/ROOT"]
+
+
+def inventory_program(backend, fail: bool = False):
+    """
+    Answer the inventory channel program from the memory backend's datasets.
+    """
+    def channel_program(pool, program, args=None, readonly=False):
+        backend.calls.append(("program", pool))
+        assert program == zedenv.lib.be.channel_program("inventory") and readonly
+        if fail:
+            raise ChannelProgramUnsupported("unrecognized command 'program'")
+
+        result = {}
+        for name in backend.datasets:
+            if name == args[0] or name.startswith((f"{args[0]}/", f"{args[0]}@")):
+                ds = {c: backend._property(name, c)[0]
+                      for c in ("type", "origin", "mountpoint", "canmount", "creation", "refer")}
+                clones = backend._property(name, "clones")[0]
+                ds['clones'] = {c: True for c in zedenv.lib.be.zfs_value("clones", clones)}
+                ds['user'] = {"org.zedenv:bootloader": backend._property(
+                    name, "org.zedenv:bootloader")[0]} if "@" not in name else {}
+                result[name] = ds
+        return result
+
+    backend.channel_programs = True
+    backend.channel_program = channel_program
+
+
+def test_inventory_channel_program(memory_backend):
+    inventory_program(memory_backend)
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.is_clone("zpool/ROOT/test")
+    assert inventory.get_property("zpool/ROOT/default", "refer") == 1500
+    assert inventory.get_property("zpool/ROOT/default@2018-05-21-16-150000", "clones") == [
+        "zpool/ROOT/test"]
+    assert inventory.get_property("zpool/ROOT/test", "org.zedenv:bootloader") == "systemdboot"
+    assert inventory.get_property("zpool/ROOT/test", "org.zedenv:missing") == "-"
+
+    assert listings(memory_backend) == ["zpool"]
+
+
+def test_inventory_channel_program_fallback(memory_backend):
+    inventory_program(memory_backend, fail=True)
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert inventory.get_property("zpool/ROOT/default@2018-05-21-16-150000", "clones") == [
+        "zpool/ROOT/test"]
+    inventory.invalidate()
+    assert inventory.dataset_exists("zpool/ROOT/test")
+
+    assert listings(memory_backend) == ["zpool", "zpool/ROOT", "zpool/ROOT"]
+
+
+def test_inventory_scope(memory_backend):
+    memory_backend.create("zpool/data")
+    memory_backend.create("zpool/data@backup", zfs_type="snapshot")
+    inventory = zedenv.lib.inventory.inventory()
+
+    assert "zpool/data@backup" not in inventory.datasets
+    assert inventory.dataset_exists("zpool/data@backup", zfs_type="snapshot")
+    assert not inventory.dataset_exists("zpool/missing")
+    assert inventory.dataset_exists("zpool/data")
+    assert listings(memory_backend) == ["zpool/ROOT", "zpool/data", "zpool/missing"]
+
+    # Looked up subtrees are listed again with the roots
+    inventory.invalidate()
+    assert inventory.dataset_exists("zpool/data@backup", zfs_type="snapshot")
+    assert sorted(listings(memory_backend)[3:]) == ["zpool/ROOT", "zpool/data", "zpool/missing"]
+
+
+def test_inventory_concurrent_changes(memory_backend):
+    inventory = zedenv.lib.inventory.inventory()
+
+    def change(i):
+        def run():
+            for _ in range(50):
+                inventory.set_property("zpool/ROOT/test", "canmount", "on")
+                inventory.add_snapshots("zpool/ROOT", f"snap-{i}", recursive=True)
+                inventory.invalidate()
+                assert inventory.dataset_exists("zpool/ROOT/test")
+        return run
+
+    # Lookups and changes from other threads never see a half changed cache
+    results = zedenv.lib.runner.gather([change(i) for i in range(4)], limit=4)
+    assert results == [None] * 4
@@ -0,0 +1,46 @@
+"""Test retention rules of prune"""
+
+import datetime
+
+import pytest
+
+import zedenv.lib.prune
+
+day = 86400
+
+
+def boot_environments(*ages):
+    # Local noon on a Wednesday, hours before are the same day and week
+    now = datetime.datetime(2018, 5, 23, 12).timestamp()
+    return [{"name": f"be-{age}", "creation": now - age} for age in ages], now
+
+
+def test_parse_rules():
+    assert zedenv.lib.prune.parse_rules({"keep-last": "3", "max-age": "2w",
+                                         "keep-daily": "-"}) == {
+        "keep-last": 3, "max-age": 14 * day, "keep-daily": None, "keep-weekly": None}
+    assert zedenv.lib.prune.parse_age("12h") == 12 * 3600
+    assert zedenv.lib.prune.parse_age("30") == 30 * day
+
+    with pytest.raises(ValueError):
+        zedenv.lib.prune.parse_rules({"max-age": "a month"})
+    with pytest.raises(ValueError):
+        zedenv.lib.prune.parse_rules({"keep-last": "-1"})
+
+
+def test_retained_keep_last_and_max_age():
+    bes, now = boot_environments(0, day, 5 * day, 20 * day)
+
+    assert zedenv.lib.prune.retained(bes, {"keep-last": 2}, now=now) == {"be-0", f"be-{day}"}
+    assert zedenv.lib.prune.retained(bes, {"keep-last": 1, "max-age": 7 * day}, now=now) == {
+        "be-0", f"be-{day}", f"be-{5 * day}"}
+    assert zedenv.lib.prune.retained(bes, {}, now=now) == set()
+
+
+def test_retained_daily_and_weekly():
+    bes, now = boot_environments(3600, 7200, day + 3600, 2 * day + 3600, 9 * day, 30 * day)
+
+    assert zedenv.lib.prune.retained(bes, {"keep-daily": 2}, now=now) == {
+        "be-3600", f"be-{day + 3600}"}
+    assert zedenv.lib.prune.retained(bes, {"keep-weekly": 2}, now=now) == {
+        "be-3600", f"be-{9 * day}"}
@@ -0,0 +1,78 @@
+"""Test running operations concurrently"""
+
+import time
+
+import pytest
+
+import zedenv.lib.runner
+
+
+def sleeper(seconds: float, result=None, error: str = None):
+    def sleep():
+        time.sleep(seconds)
+        if error:
+            raise RuntimeError(error)
+        return result
+    return sleep
+
+
+def test_gather_results_in_order():
+    start = time.monotonic()
+    results = zedenv.lib.runner.gather(
+        [sleeper(0.3, "slow"), sleeper(0.1, "fast"), sleeper(0.2, "middle")], limit=3)
+
+    assert results == ["slow", "fast", "middle"]
+    # Took about as long as the slowest call
+    assert time.monotonic() - start < 0.5
+
+
+def test_gather_limit():
+    start = time.monotonic()
+    zedenv.lib.runner.gather([sleeper(0.1) for _ in range(4)], limit=2)
+
+    assert time.monotonic() - start >= 0.2
+
+
+def test_run_failures_in_order(caplog):
+    functions = [sleeper(0.2, error="first\n"), sleeper(0, "ok"), sleeper(0, error="second\n")]
+
+    results = zedenv.lib.runner.gather(functions)
+    assert results[1] == "ok"
+    assert zedenv.lib.runner.log_failures(results)
+    assert caplog.text.index("first") < caplog.text.index("second")
+
+    with pytest.raises(RuntimeError, match="first\nsecond"):
+        zedenv.lib.runner.run(functions)
+
+
+def test_gather_raises_other_errors(monkeypatch):
+    def broken():
+        raise KeyError("broken")
+
+    with pytest.raises(KeyError):
+        zedenv.lib.runner.gather([sleeper(0), broken])
+
+    monkeypatch.setenv("ZEDENV_JOBS", "1")
+    assert zedenv.lib.runner.concurrency() == 1
+    assert zedenv.lib.runner.gather([sleeper(0, 1), sleeper(0, error="failed")])[0] == 1
+
+
+def test_join_exits_after_all(caplog):
+    finished = []
+
+    def exits():
+        raise SystemExit(1)
+
+    def slow():
+        time.sleep(0.2)
+        finished.append("slow")
+
+    with pytest.raises(SystemExit):
+        zedenv.lib.runner.join([exits, slow, sleeper(0, error="failed\n")])
+
+    assert finished == ["slow"]
+    assert "failed" in caplog.text
+
+    with pytest.raises(SystemExit):
+        zedenv.lib.runner.join([exits, slow], serial=True)
+    assert finished == ["slow"]
@@ -0,0 +1,11 @@
+"""Test boot environment space accounting"""
+
+import zedenv.lib.space
+
+
+def test_boot_environment_space(memory_backend):
+    assert zedenv.lib.space.boot_environment_space("zpool/ROOT") == {
+        "zpool/ROOT/default": {"space": 2000, "exclusive": 1500, "shared": 300},
+        "zpool/ROOT/test": {"space": 100, "exclusive": 100, "shared": 1350},
+    }
+    assert [c for c in memory_backend.calls if c[0] == "list"] == [("list", "zpool/ROOT")]
@@ -1,3 +1,5 @@
+import datetime
+
 import pytest
 
 import zedenv.lib.system
@@ -10,3 +12,57 @@ require_zpool_root_mountpoint = pytest.mark.require_zpool_root_mountpoint
 
 def test_mount():
     zedenv.lib.system.mount()
+
+
+def test_zfs_mount_table_linux():
+    mount_list = [
+        "proc on /proc type proc (rw,nosuid,nodev,noexec,relatime)",
+        "zpool/ROOT/default on / type zfs (rw,relatime,xattr,noacl)",
+        "zpool/ROOT/default/var on /var type zfs (rw,relatime,xattr,noacl)",
+    ]
+
+    assert zedenv.lib.system.zfs_mount_table(mount_list) == [
+        {'dataset': 'zpool/ROOT/default', 'mountpoint': '/'},
+        {'dataset': 'zpool/ROOT/default/var', 'mountpoint': '/var'},
+    ]
+
+
+def test_zfs_mount_table_freebsd():
+    mount_list = [
+        "zpool/ROOT/default on / (zfs, local, noatime, nfsv4acls)",
+        "devfs on /dev (devfs, local, multilabel)",
+    ]
+
+    assert zedenv.lib.system.zfs_mount_table(mount_list) == [
+        {'dataset': 'zpool/ROOT/default', 'mountpoint': '/'},
+    ]
+
+
+def test_mount_table():
+    mount_list = [
+        "proc on /proc type proc (rw,nosuid,nodev,noexec,relatime)",
+        "zpool/ROOT/default on / (zfs, local, noatime, nfsv4acls)",
+    ]
+
+    assert zedenv.lib.system.mount_table(mount_list) == [
+        {'source': 'proc', 'mountpoint': '/proc', 'fstype': 'proc'},
+        {'source': 'zpool/ROOT/default', 'mountpoint': '/', 'fstype': 'zfs'},
+    ]
+
+
+def test_format_creation():
+    creation = int(datetime.datetime(2018, 5, 1, 16, 15).timestamp())
+
+    assert zedenv.lib.system.format_creation(creation) == "Tue-May-1-16:15-2018"
+
+
+def test_parse_time():
+    assert zedenv.lib.system.parse_time("2018-05-21-16-150000") == datetime.datetime(
+        2018, 5, 21, 16, 0, 0, 150000)
+
+
+def test_format_size():
+    assert zedenv.lib.system.format_size(512) == "512"
+    assert zedenv.lib.system.format_size(98304) == "96K"
+    assert zedenv.lib.system.format_size(1299227607) == "1.21G"
+    assert zedenv.lib.system.format_size(None) == "-"
@@ -6,14 +6,12 @@ import tempfile
 from typing import Optional, List
 
 import click
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility
 
 import zedenv.lib.be
 import zedenv.lib.check
 import zedenv.lib.configure
-import zedenv.lib.system
+import zedenv.lib.runner
 from zedenv.lib.logger import ZELogger
 
 
@@ -30,26 +28,22 @@ def mount_and_modify_dataset(dataset: str,
 
     if not noop:
         if pre_mount_properties:
-            for pre_prop in pre_mount_properties:
-                try:
-                    pyzfscmds.cmd.zfs_set(dataset, pre_prop)
-                except RuntimeError as e:
-                    ZELogger.log({
-                        "level": "EXCEPTION",
-                        "message": f"Failed to set {pre_prop} on {dataset}\n{e}\n"
-                    }, exit_on_error=True)
+            try:
+                zedenv.lib.be.zfs_set_properties(dataset, pre_mount_properties)
+            except RuntimeError as e:
+                ZELogger.log({"level": "EXCEPTION", "message": f"{e}\n"}, exit_on_error=True)
 
     # Allow even with noop, just mounts and runs plugin
     with tempfile.TemporaryDirectory() as tmpdir:
         try:
-            pyzfscmds.cmd.zfs_set(dataset, f"mountpoint={tmpdir}")
+            zedenv.lib.be.zfs_set(dataset, f"mountpoint={tmpdir}")
         except RuntimeError as e:
             ZELogger.log({
                 "level": "EXCEPTION", "message": f"Failed to set mountpoint={tmpdir}\n{e}\n"
             }, exit_on_error=True)
 
         try:
-            pyzfscmds.cmd.zfs_mount(dataset)
+            zedenv.lib.be.zfs_mount(dataset)
         except RuntimeError as e:
             ZELogger.log({
                 "level": "EXCEPTION", "message": f"Failed to mount mountpoint={tmpdir}\n{e}\n"
@@ -80,7 +74,7 @@ def mount_and_modify_dataset(dataset: str,
                 }, exit_on_error=True)
 
         try:
-            pyzfscmds.cmd.zfs_unmount(dataset)
+            zedenv.lib.be.zfs_unmount(dataset)
         except RuntimeError as e:
             ZELogger.log({
                 "level": "EXCEPTION",
@@ -89,16 +83,15 @@ def mount_and_modify_dataset(dataset: str,
         ZELogger.verbose_log(
             {"level": "INFO", "message": f"Unmounted {dataset} from {tmpdir}\n"}, verbose)
 
-    if not noop:
-        if post_mount_properties:
-            for post_prop in post_mount_properties:
-                try:
-                    pyzfscmds.cmd.zfs_set(dataset, post_prop)
-                except RuntimeError as e:
-                    ZELogger.log({
-                        "level": "EXCEPTION",
-                        "message": f"Failed to set {post_prop} on {dataset}\n{e}\n"
-                    }, exit_on_error=True)
+    if post_mount_properties:
+        if noop:
+            for prop in post_mount_properties:
+                ZELogger.log({"level": "INFO", "message": f"Would set {prop} on {dataset}"})
+        else:
+            try:
+                zedenv.lib.be.zfs_set_properties(dataset, post_mount_properties)
+            except RuntimeError as e:
+                ZELogger.log({"level": "EXCEPTION", "message": f"{e}\n"}, exit_on_error=True)
 
 
 def activate_boot_environment(be_requested: str,
@@ -116,7 +109,7 @@ def activate_boot_environment(be_requested: str,
 
             if not noop:
                 try:
-                    zedenv.lib.system.umount(dataset_mountpoint)
+                    zedenv.lib.be.zfs_unmount(be_requested, mountpoint=dataset_mountpoint)
                 except RuntimeError as e:
                     ZELogger.log({
                         "level": "EXCEPTION",
@@ -130,59 +123,118 @@ def activate_boot_environment(be_requested: str,
                                  noop=noop,
                                  plugin=bootloader_plugin)
 
-    if not noop:
-        try:
-            pyzfscmds.cmd.zpool_set(zedenv.lib.be.dataset_pool(be_requested),
-                                    f"bootfs={be_requested}")
-        except RuntimeError as e:
-            ZELogger.log({
-                "level": "EXCEPTION", "message": f"Failed to set bootfs to {be_requested}\n{e}\n"
-            }, exit_on_error=True)
+
+def set_bootfs(be_requested: str):
+    """
+    Set last, so the previous boot environment is still booted if
+    activation stops before this point.
+    """
+    try:
+        zedenv.lib.be.zpool_set(zedenv.lib.be.dataset_pool(be_requested),
+                                f"bootfs={be_requested}")
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION", "message": f"Failed to set bootfs to {be_requested}\n{e}\n"
+        }, exit_on_error=True)
 
 
-def disable_children_automount(be_child_datasets: List[str],
-                               be_requested: str,
-                               boot_environment_root: str,
-                               verbose: Optional[bool]):
+def automount_changes(be_child_datasets: List[str],
+                      be_requested: str,
+                      boot_environment_root: str) -> List[str]:
     """
-    Dont run if noop
+    Datasets that need canmount=noauto, the other boot environments and
+    be_requested itself. canmount is read from the inventory, so datasets
+    already set to noauto are left alone without a call per dataset.
     """
+    changes = []
     for ds in be_child_datasets:
-        if not (be_requested in ds) and not (boot_environment_root == ds):
-            try:
-                pyzfscmds.cmd.zfs_set(ds, "canmount=noauto")
-            except RuntimeError as e:
-                ZELogger.log({
-                    "level": "EXCEPTION",
-                    "message": f"Failed to set canmount=noauto on {ds}\n{e}\n"
-                }, exit_on_error=True)
-            ZELogger.verbose_log({"level": "INFO",
-                                  "message": f"Disabled automount for {ds}\n"}, verbose)
+        activated = (be_requested == ds)
+        other = not (be_requested in ds) and not (boot_environment_root == ds)
+        if (activated or other) and zedenv.lib.be.get_property(ds, "canmount") != "noauto":
+            changes.append(ds)
 
+    return changes
 
-def apply_settings_to_child_datasets(be_child_datasets_list, be_requested, verbose):
 
-    canmount_setting = "canmount=noauto"
-    for ds in be_child_datasets_list:
-        if be_requested == ds:
-            try:
-                pyzfscmds.cmd.zfs_set(ds, canmount_setting)
-            except RuntimeError as e:
-                ZELogger.log({
-                    "level": "EXCEPTION",
-                    "message": f"Failed to set {canmount_setting} for {ds}\n{e}\n"
-                }, exit_on_error=True)
+def disable_children_automount(datasets: List[str], verbose: Optional[bool]):
+    """
+    Dont run if noop
+    """
+    try:
+        zedenv.lib.be.zfs_set_datasets(datasets, "canmount=noauto")
+    except RuntimeError as e:
+        ZELogger.log({"level": "EXCEPTION", "message": f"{e}\n"}, exit_on_error=True)
 
-            if pyzfscmds.utility.is_clone(ds):
-                try:
-                    pyzfscmds.cmd.zfs_promote(ds)
-                except RuntimeError as e:
-                    ZELogger.log({
-                        "level": "EXCEPTION",
-                        "message": f"Failed to promote BE {ds}\n{e}\n"
-                    }, exit_on_error=True)
-                ZELogger.verbose_log(
-                    {"level": "INFO", "message": f"Promoted {ds}.\n"}, verbose)
+    for ds in datasets:
+        ZELogger.verbose_log({"level": "INFO",
+                              "message": f"Disabled automount for {ds}\n"}, verbose)
+
+
+def promote_boot_environment(be_requested: str, verbose: Optional[bool]):
+    try:
+        zedenv.lib.be.zfs_promote(be_requested)
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to promote BE {be_requested}\n{e}\n"
+        }, exit_on_error=True)
+    ZELogger.verbose_log(
+        {"level": "INFO", "message": f"Promoted {be_requested}.\n"}, verbose)
+
+
+def activate_datasets(be_child_datasets: List[str],
+                      be_requested: str,
+                      boot_environment_root: str,
+                      verbose: Optional[bool],
+                      noop: Optional[bool]):
+    """
+    Make the dataset changes of an activation, canmount=noauto where it isn't
+    set yet on the other boot environments and on be_requested, and the promote
+    of be_requested. With noop the changes are only printed.
+    """
+    automount = automount_changes(be_child_datasets, be_requested, boot_environment_root)
+
+    promote = None
+    if be_requested in be_child_datasets and zedenv.lib.be.is_clone(be_requested):
+        promote = be_requested
+
+    if noop:
+        for ds in automount:
+            ZELogger.log({"level": "INFO", "message": f"Would set canmount=noauto on {ds}"})
+        if promote:
+            ZELogger.log({"level": "INFO", "message": f"Would promote {promote}"})
+        return
+
+    if automount:
+        disable_children_automount(automount, verbose)
+
+    if promote:
+        promote_boot_environment(promote, verbose)
+
+
+def activate_pool(boot_environment_root: str,
+                  be_requested: str,
+                  verbose: Optional[bool],
+                  noop: Optional[bool]):
+    """
+    Activate be_requested among the datasets under boot_environment_root,
+    the boot environment root of one pool.
+    """
+    be_child_datasets_list = None
+    try:
+        be_child_datasets_list = [line[0] for line in zedenv.lib.be.zfs_list(
+            boot_environment_root, recursive=True, columns=["name"], zfs_types=["filesystem"])]
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to list datasets under {boot_environment_root}\n{e}\n"
+        }, exit_on_error=True)
+
+    activate_datasets(be_child_datasets_list,
+                      be_requested,
+                      boot_environment_root,
+                      verbose,
+                      noop)
 
 
 def zedenv_activate(boot_environment: str,
@@ -207,7 +259,7 @@ def zedenv_activate(boot_environment: str,
     current_be = None
     try:
         current_be = pyzfscmds.utility.dataset_child_name(
-            zedenv.lib.be.bootfs_for_pool(zpool))
+            zedenv.lib.be.bootfs_for_pool(zpool), check_exists=False)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -247,10 +299,10 @@ def zedenv_activate(boot_environment: str,
                            "implemented.\n"
             }, verbose)
 
-    if not pyzfscmds.utility.dataset_exists(be_requested):
+    if not zedenv.lib.be.dataset_exists(be_requested):
         ds_is_clone = None
         try:
-            ds_is_clone = pyzfscmds.utility.is_clone(be_requested)
+            ds_is_clone = zedenv.lib.be.is_clone(be_requested)
         except RuntimeError:
             ZELogger.log({
                 "level": "EXCEPTION",
@@ -274,56 +326,23 @@ def zedenv_activate(boot_environment: str,
             "message": f"Boot Environment {boot_environment} is already active.\n"
         }, verbose)
     else:
-        # Set bootfs on dataset
-        dataset_mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(be_requested)
+        dataset_mountpoint = zedenv.lib.be.dataset_mountpoint(be_requested)
         activate_boot_environment(
             be_requested, dataset_mountpoint, verbose, noop, bootloader_plugin)
 
-    be_child_datasets = None
-    try:
-        be_child_datasets = pyzfscmds.cmd.zfs_list(boot_environment_root,
-                                                   recursive=True,
-                                                   columns=["name"],
-                                                   zfs_types=["filesystem"])
-    except RuntimeError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to list datasets under {boot_environment_root}\n{e}\n"
-        }, exit_on_error=True)
-
-    be_child_datasets_list = [line for line in be_child_datasets.splitlines()]
-    if not noop:
-        disable_children_automount(be_child_datasets_list,
-                                   be_requested,
-                                   boot_environment_root,
-                                   verbose)
-
-        apply_settings_to_child_datasets(be_child_datasets_list, be_requested, verbose)
-
-    # Repeat this for the boot dataset if a separate ZFS boot pool is used
+    # Repeat this for the boot dataset if a separate ZFS boot pool is used,
+    # the pools don't depend on each other
+    steps = [lambda: activate_pool(boot_environment_root, be_requested, verbose, noop)]
     if zedenv.lib.be.extra_bpool():
         boot_environment_boot = zedenv.lib.be.root('/boot')
-        boot_child_datasets = None
         be_boot_requested = f"{boot_environment_boot}/zedenv-{boot_environment}"
-        try:
-            boot_child_datasets = pyzfscmds.cmd.zfs_list(
-                boot_environment_boot, recursive=True, columns=["name"], zfs_types=["filesystem"])
-        except RuntimeError as e:
-            ZELogger.log({
-                "level": "EXCEPTION",
-                "message": f"Failed to list datasets under {boot_environment_boot}\n{e}\n"
-            }, exit_on_error=True)
+        steps.append(lambda: activate_pool(
+            boot_environment_boot, be_boot_requested, verbose, noop))
+    zedenv.lib.runner.join(steps, serial=noop)
 
-        be_boot_child_datasets_list = [line for line in boot_child_datasets.splitlines()]
-        if not noop:
-            disable_children_automount(
-                be_boot_child_datasets_list,
-                be_boot_requested,
-                boot_environment_boot,
-                verbose)
-
-            apply_settings_to_child_datasets(
-                be_boot_child_datasets_list, be_boot_requested, verbose)
+    if not noop and current_be != be_requested:
+        # Set bootfs on dataset
+        set_bootfs(be_requested)
 
     if bootloader_plugin:
         try:
@@ -3,16 +3,16 @@ import errno
 import sys
 import re
 
-from typing import Optional
+from typing import List, Optional
 
 import click
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility as zfs_utility
 
 import zedenv.lib.be
 import zedenv.lib.check
 import zedenv.lib.configure
+import zedenv.lib.inventory
+import zedenv.lib.runner
 from zedenv.lib.logger import ZELogger
 
 
@@ -24,13 +24,15 @@ def get_clones(root_dataset: str,
     clone_data = []
     list_dataset = None  # Dataset we are listing clones under
     snap_suffix = None
+    snapshot_taken = True
     if existing:
         existing_dataset = f"{parent_dataset}/{existing}"
         if zfs_utility.is_snapshot(existing_dataset):
             snap_suffix = existing_dataset.rsplit('@', 1)[-1]
+            snapshot_taken = False
             list_dataset = zfs_utility.snapshot_parent_dataset(existing_dataset)
         else:
-            if zfs_utility.dataset_exists(existing_dataset):
+            if zedenv.lib.be.dataset_exists(existing_dataset):
                 snap_suffix = zedenv.lib.be.snapshot(existing, parent_dataset)
                 list_dataset = f"{parent_dataset}/{existing}"
             else:
@@ -39,37 +41,23 @@ def get_clones(root_dataset: str,
                     "message": f"The dataset {existing_dataset} doesn't exist."
                 }, exit_on_error=True)
     else:
-        snap_suffix = zedenv.lib.be.snapshot(zfs_utility.dataset_child_name(root_dataset),
-                                             parent_dataset)
+        root_name = zfs_utility.dataset_child_name(root_dataset, check_exists=False)
+        snap_suffix = zedenv.lib.be.snapshot(root_name, parent_dataset)
         list_dataset = root_dataset
 
-    clones = None
     try:
-        clones = pyzfscmds.cmd.zfs_list(list_dataset, recursive=True, columns=["name"])
-    except RuntimeError:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to list datasets under {root_dataset}."
-        }, exit_on_error=True)
-
-    for c in [line for line in clones.splitlines()]:
-        if zfs_utility.dataset_exists(f"{c}@{snap_suffix}", zfs_type="snapshot"):
-            if c == list_dataset:
-                child = ""
-            else:
-                child = zfs_utility.dataset_child_name(c)
-            clone_props = zedenv.lib.be.properties(
-                c, [["canmount", "noauto"]])
-            clone_data.append({
-                "snapshot": f"{c}@{snap_suffix}",
-                "properties": clone_props,
-                "datasetchild": child
-            })
-        else:
-            ZELogger.log({
-                "level": "EXCEPTION",
-                "message": f"Failed to find snapshot {c}@{snap_suffix}."
-            }, exit_on_error=True)
+        clone_data = zedenv.lib.be.clone_plan(list_dataset, snap_suffix, [["canmount", "noauto"]])
+    except RuntimeError as e:
+        if snapshot_taken:
+            # Remove the recursive snapshot taken for it again, children first
+            try:
+                snapshots = zedenv.lib.inventory.inventory().children(
+                    list_dataset, zfs_type='snapshot')
+                zedenv.lib.be.zfs_destroy_all(
+                    [s for s in reversed(snapshots) if s.endswith(f"@{snap_suffix}")])
+            except RuntimeError as err:
+                ZELogger.log({"level": "ERROR", "message": f"{err}"})
+        ZELogger.log({"level": "EXCEPTION", "message": f"{e}"}, exit_on_error=True)
 
     return clone_data
 
@@ -81,6 +69,29 @@ def show_source_properties(property_list, verbose):
     ZELogger.verbose_log({"level": "INFO", "message": ""}, verbose)
 
 
+def create_clones(clone_sets: List[tuple]):
+    """
+    Create the clones of each pool, given as (clones, created_snapshots, message),
+    concurrently. If any pool fails, the clones made in the others and their
+    snapshots are destroyed again, so no half of the boot environment is left behind.
+    """
+    results = zedenv.lib.runner.gather(
+        [lambda c=c, s=s: zedenv.lib.be.zfs_clones(c, s) for c, s, _ in clone_sets])
+    if not zedenv.lib.runner.failures(results):
+        return
+
+    for (clones, snapshots, message), result in zip(clone_sets, results):
+        if isinstance(result, RuntimeError):
+            ZELogger.log({"level": "ERROR", "message": f"{message}\n{result}"})
+            continue
+        try:
+            zedenv.lib.be.zfs_destroy_all([c[1] for c in reversed(clones)] + snapshots)
+        except RuntimeError as e:
+            ZELogger.log({"level": "ERROR", "message": f"{e}"})
+
+    ZELogger.log({"level": "EXCEPTION", "message": "Stopping creation.\n"}, exit_on_error=True)
+
+
 def zedenv_create(parent_dataset: str,
                   root_dataset: str,
                   boot_environment: str,
@@ -112,8 +123,8 @@ def zedenv_create(parent_dataset: str,
     zpool = zedenv.lib.be.dataset_pool(root_dataset)
     current_be = None
     try:
-        current_be = pyzfscmds.utility.dataset_child_name(
-            zedenv.lib.be.bootfs_for_pool(zpool))
+        current_be = zfs_utility.dataset_child_name(
+            zedenv.lib.be.bootfs_for_pool(zpool), check_exists=False)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -131,7 +142,7 @@ def zedenv_create(parent_dataset: str,
             "message": f"Using plugin {bootloader}\n"
         }, verbose)
 
-    if zfs_utility.dataset_exists(boot_environment_dataset):
+    if zedenv.lib.be.dataset_exists(boot_environment_dataset):
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Failed to create {boot_environment_dataset}, already exists."
@@ -144,49 +155,52 @@ def zedenv_create(parent_dataset: str,
         "message": f"Getting properties of {boot_environment_dataset} for clones {clone_sources}\n"
     }, verbose)
 
+    # Snapshots taken for this boot environment are removed again if it fails
+    created_snapshots = []
+    if not (existing and zfs_utility.is_snapshot(f"{parent_dataset}/{existing}")):
+        created_snapshots = [source['snapshot'] for source in clone_sources]
+
+    root_clones = []
     for source in clone_sources:
         if source['datasetchild'] == '':
             be_clone = f"{boot_environment_dataset}"
         else:
             be_clone = f"{boot_environment_dataset}/{source['datasetchild']}"
+        root_clones.append((source['snapshot'], be_clone, source['properties']))
 
-        try:
-            pyzfscmds.cmd.zfs_clone(source['snapshot'], be_clone, properties=source['properties'])
-        except RuntimeError:
-            ZELogger.log({
-                "level": "EXCEPTION",
-                "message": (f"Failed to create {boot_environment_dataset}",
-                            f" from {source['snapshot']}")
-            }, exit_on_error=True)
+    clone_sets = [(root_clones, created_snapshots,
+                   f"Failed to create {boot_environment_dataset}.")]
 
     # Clone the dataset for the kernel and ramdisk files if a separate ZFS boot pool is used
     if zedenv.lib.be.extra_bpool():
-        boot_dataset = pyzfscmds.system.agnostic.mountpoint_dataset('/boot')
+        boot_dataset = zedenv.lib.be.mountpoint_dataset('/boot')
         clone_sources = get_clones(boot_dataset, existing)
         ZELogger.verbose_log({
             "level": "INFO",
             "message": f"Getting properties of {boot_dataset} for clones {clone_sources}\n"
         }, verbose)
 
+        boot_snapshots = []
+        if not (existing and zfs_utility.is_snapshot(f"{parent_dataset}/{existing}")):
+            boot_snapshots = [source['snapshot'] for source in clone_sources]
+
+        boot_clones = []
         for source in clone_sources:
             m = re.search(r"(.*)/zedenv-", boot_dataset)
             if m:
                 boot_clone = f"{m.group(1)}/zedenv-{boot_environment}"
-                try:
-                    pyzfscmds.cmd.zfs_clone(
-                        source['snapshot'], boot_clone, properties=source['properties'])
-                except RuntimeError:
-                    ZELogger.log({
-                        "level": "EXCEPTION",
-                        "message": (f"Failed to create {boot_clone}",
-                                    f" from {source['snapshot']}")
-                    }, exit_on_error=True)
+                boot_clones.append((source['snapshot'], boot_clone, source['properties']))
             else:
                 ZELogger.log({
                     "level": "EXCEPTION",
                     "message": f"Failed to determine a valid path from '{boot_dataset}'"
                 }, exit_on_error=True)
 
+        clone_sets.append((boot_clones, boot_snapshots,
+                           f"Failed to create the boot dataset of {boot_environment}."))
+
+    create_clones(clone_sets)
+
     if bootloader_plugin:
         try:
             bootloader_plugin.post_create()
@@ -231,7 +245,7 @@ def cli(boot_environment: str, verbose: Optional[bool],
         with zedenv.lib.check.Pidfile():
 
             boot_environment_root = zedenv.lib.be.root()
-            root_dataset = pyzfscmds.system.agnostic.mountpoint_dataset("/")
+            root_dataset = zedenv.lib.be.mountpoint_dataset("/")
 
             bootloader_set = zedenv.lib.be.get_property(
                 boot_environment_root, "org.zedenv:bootloader")
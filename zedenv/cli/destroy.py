@@ -1,78 +1,59 @@
 """List boot environments cli"""
 import errno
+import fnmatch
 import re
 import sys
 import datetime
 
 import click
 
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility as zfs_utility
 
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 import zedenv.lib.configure
 import zedenv.lib.be
 import zedenv.lib.check
+import zedenv.lib.clones
+import zedenv.lib.inventory
+import zedenv.lib.runner
 from zedenv.lib.logger import ZELogger
 import zedenv.lib.system
 
 
-def get_promote_snapshots(be_pool: str, destroy_dataset: str) -> list:
+def get_clone_graph(destroy_dataset: str,
+                    graphs: Optional[Dict[str, zedenv.lib.clones.CloneGraph]] = None
+                    ) -> zedenv.lib.clones.CloneGraph:
     """
-    Look for clone we need to promote because they're dependent on snapshots
+    Clone graph of the boot environment root containing destroy_dataset,
+    taken from graphs if given, so a plan of several destroys builds it once.
     """
-    promote_snaps = None
-    try:
-        promote_snaps = pyzfscmds.cmd.zfs_list(
-            be_pool, recursive=True,
-            columns=['name', 'origin'], zfs_types=['filesystem', 'snapshot', 'volume'])
-    except RuntimeError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to list snapshots for promote in '{be_pool}'.\n{e}"
-        }, exit_on_error=True)
-
-    split_promote_snaps = zedenv.lib.be.split_zfs_output(promote_snaps)
+    root = zfs_utility.dataset_parent(destroy_dataset)
+    if graphs is not None and root in graphs:
+        return graphs[root]
 
-    target = re.compile(r'\b' + destroy_dataset + r'(@|/.*@).*' + r'\b')
-    return [ds[0] for ds in split_promote_snaps if target.match(ds[1])]
-
-
-def get_origin_snapshots(destroy_dataset: str) -> list:
-    origin_all_snaps = None
+    graph = None
     try:
-        origin_all_snaps = pyzfscmds.cmd.zfs_list(
-            destroy_dataset, recursive=True,
-            columns=['origin'], zfs_types=['filesystem', 'snapshot', 'volume'])
+        graph = zedenv.lib.clones.CloneGraph(root)
     except RuntimeError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to list origin snapshots for '{destroy_dataset}'.\n{e}"
-        }, exit_on_error=True)
+        ZELogger.log({"level": "EXCEPTION", "message": f"{e}"}, exit_on_error=True)
 
-    split_snaps = zedenv.lib.be.split_zfs_output(origin_all_snaps)
-    return [ds[0].rstrip() for ds in split_snaps if ds[0].rstrip() != '-']
+    if graphs is not None:
+        graphs[root] = graph
 
+    return graph
 
-def get_clone_origin(destroy_dataset: str) -> Optional[str]:
-    # Get origin snapshots
 
-    origin_property = None
-    try:
-        origin_property = pyzfscmds.cmd.zfs_get(destroy_dataset,
-                                                columns=['value'],
-                                                properties=['origin'])
-    except RuntimeError as e:
+def get_clone_origin(destroy_dataset: str) -> Optional[str]:
+    # Get origin snapshot and creation time, parsable values need no locale handling
+    origin_property = zedenv.lib.be.get_property(destroy_dataset, 'origin')
+    creation_property = zedenv.lib.be.get_property(destroy_dataset, 'creation')
+    if origin_property is None or creation_property is None:
         ZELogger.log({
             "level": "EXCEPTION",
-            "message": f"Failed to get origin of {destroy_dataset}\n{e}\n"
+            "message": f"Failed to get origin of {destroy_dataset}\n"
         }, exit_on_error=True)
 
-    # Remove any newline chars
-    origin_property = origin_property.rstrip()
-
     origin_datetime = None
     try:
         origin_datetime = zedenv.lib.system.parse_time(origin_property)
@@ -80,97 +61,137 @@ def get_clone_origin(destroy_dataset: str) -> Optional[str]:
         try:
             origin_datetime = zedenv.lib.system.parse_time(
                 origin_property.split('@')[1])
-        except ValueError:
+        except (ValueError, IndexError):
             ZELogger.log({
                 "level": "EXCEPTION",
                 "message": f"Failed to parse time from origin {origin_property}\n"
             }, exit_on_error=True)
 
-    creation_property = None
-    try:
-        creation_property = pyzfscmds.cmd.zfs_get(destroy_dataset,
-                                                  columns=['value'],
-                                                  properties=['creation'],
-                                                  env_variables_override={"LC_ALL": "C"})
-    except RuntimeError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to get creation of {creation_property}\n{e}\n"
-        }, exit_on_error=True)
-
-    creation_property = creation_property.rstrip()
-
-    creation_datetime = None
-    try:
-        creation_datetime = zedenv.lib.system.parse_time(creation_property,
-                                                         fmt="%a %b %d %H:%M %Y")
-    except ValueError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to parse time from origin {origin_property}\n{e}"
-        }, exit_on_error=True)
+    # Creation was previously compared at the minute resolution 'zfs get' displays
+    creation_datetime = datetime.datetime.fromtimestamp(
+        creation_property).replace(second=0, microsecond=0)
 
     return origin_property if origin_datetime != creation_datetime else None
 
 
-def promote_origins(destroy_dataset, be_pool, origin_snaps, noop, verbose):
+def promote_origins(graph, origin_snaps, noop, verbose):
     # promote dependents of origins used by destroy_dataset
-    origins = None
-    try:
-        origins = pyzfscmds.cmd.zfs_list(
-            be_pool, recursive=True,
-            columns=['name', 'origin'], zfs_types=['filesystem', 'snapshot', 'volume'])
-    except RuntimeError:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to list origins of '{destroy_dataset}'.\n"
-        }, exit_on_error=True)
-    origins_list = zedenv.lib.be.split_zfs_output(origins)
-
     for ors in origin_snaps:
-        for ol in origins_list:
-            if ors == ol[1].rstrip():
-                if not noop:
-                    try:
-                        pyzfscmds.cmd.zfs_promote(ol[0].rstrip())
-                    except RuntimeError:
-                        ZELogger.log({
-                            "level": "EXCEPTION",
-                            "message": f"Failed to promote {ol[0].rstrip()}\n"
-                        }, exit_on_error=True)
+        for dependent in graph.dependents(ors):
+            if not noop:
+                try:
+                    zedenv.lib.be.zfs_promote(dependent)
+                except RuntimeError:
+                    ZELogger.log({
+                        "level": "EXCEPTION",
+                        "message": f"Failed to promote {dependent}\n"
+                    }, exit_on_error=True)
+            ZELogger.verbose_log(
+                {"level": "INFO", "message": f"Promoted {dependent}.\n"}, verbose)
+
+
+def destroy_origin_snapshots(destroy_dataset, graph, origin_snaps, noop, verbose,
+                             deferred: Optional[list] = None):
+    # destroy origin snapshots used by destroy_dataset, that nothing else depends on,
+    # or add them to deferred to be destroyed later together with those of other targets
+    for snap in origin_snaps:
+        if graph.orphaned(snap, destroy_dataset):
+            if deferred is not None:
+                deferred.append(snap)
+            elif not noop:
+                try:
+                    zedenv.lib.be.zfs_destroy_snapshot(snap)
+                except RuntimeError:
+                    ZELogger.log({
+                        "level": "EXCEPTION",
+                        "message": f"Failed to destroy {snap}\n"
+                    }, exit_on_error=True)
+            if deferred is None:
                 ZELogger.verbose_log(
-                    {"level": "INFO", "message": f"Promoted {ol[0].rstrip()}.\n"}, verbose)
+                    {"level": "INFO", "message": f"Destroyed {snap}.\n"}, verbose)
+
 
+def confirm_origin_destroy(target: str, clone_origin: str, noconfirm: Optional[bool]) -> bool:
+    destroy_origin_snapshot = True
+    if not noconfirm:
+        click.echo(f"The origin snapshot '{clone_origin.split('@')[1]}' "
+                   f"for the boot environment '{target}' "
+                   f"still exists, do you want to destroy it? "
+                   f"This action will be permanent.\n")
+        destroy_origin_snapshot = click.confirm(f"Destroy '{clone_origin}'?")
+        click.echo()
+
+    if not destroy_origin_snapshot:
+        click.echo(
+            f"The origin snapshot '{clone_origin.split('@')[1]}' will be kept.")
+
+    return destroy_origin_snapshot
+
+
+def confirm_dataset_origin(target: str, dataset: str, noconfirm: Optional[bool]) -> bool:
+    """
+    Ask whether the origin snapshot of dataset should be destroyed with it,
+    True if it isn't a clone.
+    """
+    clone_origin = get_clone_origin(dataset) if zedenv.lib.be.is_clone(dataset) else None
+    return not clone_origin or confirm_origin_destroy(target, clone_origin, noconfirm)
+
+
+def destroy_program_usable(dataset: str, graph: zedenv.lib.clones.CloneGraph) -> bool:
+    """
+    Whether the destroy_be channel program can destroy dataset. 'zfs destroy'
+    unmounts first, a channel program can't, and it doesn't promote, promoting
+    moves origins so which ones are left over is only known afterwards.
+    """
+    return not zedenv.lib.be.mounted_datasets(dataset) and not graph.dependent_clones(dataset)
+
+
+def destroy_program(dataset: str,
+                    graph: zedenv.lib.clones.CloneGraph,
+                    destroy_origin_snapshot: bool,
+                    verbose: Optional[bool],
+                    deferred_origins: Optional[list] = None) -> bool:
+    """
+    Destroy the boot environment, and with destroy_origin_snapshot the origin
+    snapshots nothing else depends on, atomically with the destroy_be channel
+    program. Returns False if channel programs can't be run, the step by step
+    path is then taken instead.
+    """
+    origin_snaps = []
+    if destroy_origin_snapshot:
+        origin_snaps = [snap for snap in graph.origin_snapshots(dataset)
+                        if graph.orphaned(snap, dataset)]
+    if deferred_origins is not None:
+        deferred_origins.extend(origin_snaps)
+        origin_snaps = []
 
-def destroy_origin_snapshots(destroy_dataset, be_pool, origin_snaps, noop, verbose):
-    # destroy origin snapshots used by destroy_dataset
-    snapshots = None
     try:
-        snapshots = pyzfscmds.cmd.zfs_list(be_pool,
-                                           recursive=True,
-                                           columns=['name'],
-                                           zfs_types=['snapshot'])
-    except RuntimeError:
+        result = zedenv.lib.be.run_channel_program(
+            zedenv.lib.be.dataset_pool(dataset), "destroy_be", [dataset] + origin_snaps)
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION", "message": f"Failed to destroy {dataset}\n{e}"
+        }, exit_on_error=True)
+    if result is None:
+        return False
+
+    failed = result.get('failed') or {}
+    if failed:
         ZELogger.log({
             "level": "EXCEPTION",
-            "message": f"Failed to list origins snapshots of '{destroy_dataset}'.\n"
+            "message": f"Failed to destroy {dataset}, the following failed:\n" + "".join(
+                f"  {ds}: error {failed[ds]}\n" for ds in sorted(failed))
         }, exit_on_error=True)
-    snapshots_list = zedenv.lib.be.split_zfs_output(snapshots)
 
-    for ors in origin_snaps:
-        for ol in snapshots_list:
-            snap = ol[0].rstrip()
-            if ors == snap:
-                if not noop:
-                    try:
-                        pyzfscmds.cmd.zfs_destroy_snapshot(snap)
-                    except RuntimeError:
-                        ZELogger.log({
-                            "level": "EXCEPTION",
-                            "message": f"Failed to destroy {snap}\n"
-                        }, exit_on_error=True)
-                ZELogger.verbose_log(
-                    {"level": "INFO", "message": f"Destroyed {snap}.\n"}, verbose)
+    for ds in sorted(result.get('destroyed') or {}):
+        ZELogger.verbose_log({"level": "INFO", "message": f"Destroyed {ds}.\n"}, verbose)
+    for snap in sorted(result.get('kept') or {}):
+        ZELogger.log({
+            "level": "WARNING",
+            "message": f"Kept the origin snapshot {snap}, it could not be destroyed.\n"
+        })
+
+    return True
 
 
 def destroy_element(target: str,
@@ -178,12 +199,13 @@ def destroy_element(target: str,
                     is_snapshot: bool,
                     verbose: Optional[bool],
                     noconfirm: Optional[bool],
-                    noop: Optional[bool]):
-    pool = zedenv.lib.be.dataset_pool(dataset)
+                    noop: Optional[bool],
+                    deferred_origins: Optional[list] = None,
+                    graphs: Optional[Dict[str, zedenv.lib.clones.CloneGraph]] = None):
     if is_snapshot:
         if not noop:
             try:
-                pyzfscmds.cmd.zfs_destroy_snapshot(dataset)
+                zedenv.lib.be.zfs_destroy_snapshot(dataset)
             except RuntimeError as e:
                 ZELogger.log({
                     "level": "EXCEPTION",
@@ -192,9 +214,18 @@ def destroy_element(target: str,
         ZELogger.verbose_log(
             {"level": "INFO", "message": f"Destroyed '{dataset}"}, verbose)
     else:
-        destroy_origin_snapshot = True
-        origin_snaps = None
-        if pyzfscmds.utility.is_clone(dataset):
+        graph = get_clone_graph(dataset, graphs)
+        # Asked once, the step by step path reuses the answer if the program can't be run
+        destroy_origin_snapshot = None
+        if not noop and destroy_program_usable(dataset, graph):
+            destroy_origin_snapshot = confirm_dataset_origin(target, dataset, noconfirm)
+            if destroy_program(dataset, graph, destroy_origin_snapshot, verbose,
+                               deferred_origins=deferred_origins):
+                graph.remove(dataset)
+                return
+
+        origin_snaps = []
+        if zedenv.lib.be.is_clone(dataset):
             ZELogger.verbose_log({
                 "level": "INFO",
                 "message": (f"Boot environment '{target}' is a clone.\n"
@@ -202,12 +233,12 @@ def destroy_element(target: str,
             }, verbose)
 
             # Get and promote snapshots
-            promote_snaps = get_promote_snapshots(pool, dataset)
+            promote_snaps = graph.dependent_clones(dataset)
 
             for ds in promote_snaps:
                 if not noop:
                     try:
-                        pyzfscmds.cmd.zfs_promote(ds)
+                        zedenv.lib.be.zfs_promote(ds)
                     except RuntimeError as e:
                         ZELogger.log({
                             "level": "EXCEPTION",
@@ -217,62 +248,49 @@ def destroy_element(target: str,
                         ZELogger.verbose_log(
                             {"level": "INFO", "message": f"Promoted {ds}.\n"}, verbose)
 
-            """
-            Find destroyable:
-            There's probably a better way to match snapshots that can be destroyed,
-            for now this will do
-            """
-            origin_snaps = get_origin_snapshots(dataset)
-            clone_origin = get_clone_origin(dataset)
-            if clone_origin:
-                if not noconfirm:
-                    click.echo(f"The origin snapshot '{clone_origin.split('@')[1]}' "
-                               f"for the boot environment '{target}' "
-                               f"still exists, do you want to destroy it? "
-                               f"This action will be permanent.\n")
-                    destroy_origin_snapshot = click.confirm(f"Destroy '{clone_origin}'?")
-                    click.echo()
-
-                if not destroy_origin_snapshot:
-                    click.echo(
-                        f"The origin snapshot '{clone_origin.split('@')[1]}' will be kept.")
+            if promote_snaps and not noop:
+                # Promoting moved snapshots and origins
+                try:
+                    graph.refresh()
+                except RuntimeError as e:
+                    ZELogger.log({"level": "EXCEPTION", "message": f"{e}"}, exit_on_error=True)
+
+            origin_snaps = graph.origin_snapshots(dataset)
+            if destroy_origin_snapshot is None:
+                destroy_origin_snapshot = confirm_dataset_origin(target, dataset, noconfirm)
 
         # Destroy the boot environment
         if not noop:
             try:
-                pyzfscmds.cmd.zfs_destroy(dataset,
+                zedenv.lib.be.zfs_destroy(dataset,
                                           recursive_children=True)
             except RuntimeError:
                 ZELogger.log({
                     "level": "EXCEPTION",
                     "message": f"Failed to destroy {dataset}\n"
                 }, exit_on_error=True)
+            graph.remove(dataset)
 
         try:
             # TODO: Why is this necessary?
-            is_still_clone = pyzfscmds.utility.is_clone(dataset)
+            is_still_clone = zedenv.lib.be.is_clone(dataset)
         except RuntimeError:
             is_still_clone = False
 
         if is_still_clone:
-            promote_origins(dataset, pool, origin_snaps, noop, verbose)
+            promote_origins(graph, origin_snaps, noop, verbose)
 
         if destroy_origin_snapshot:
-            destroy_origin_snapshots(dataset, pool, origin_snaps, noop, verbose)
+            destroy_origin_snapshots(dataset, graph, origin_snaps, noop, verbose,
+                                     deferred=deferred_origins)
 
 
-def zedenv_destroy(target: str,
-                   be_root: str,
-                   root_dataset: str,
-                   bootloader: Optional[str],
-                   verbose: Optional[bool],
-                   noconfirm: Optional[bool],
-                   noop: Optional[bool]):
+def check_destroy_target(target: str, be_root: str) -> Optional[str]:
     """
-    Put actual function to be called in this separate function to allow easier testing.
+    Exit if target doesn't exist or is in use, returns the active boot environment.
     """
     destroy_dataset = f"{be_root}/{target}"
-    ds_is_snapshot = pyzfscmds.utility.is_snapshot(destroy_dataset)
+    ds_is_snapshot = zfs_utility.is_snapshot(destroy_dataset)
     be_pool = zedenv.lib.be.dataset_pool(
         destroy_dataset,
         zfs_type='filesystem' if not ds_is_snapshot else 'snapshot')
@@ -284,10 +302,9 @@ def zedenv_destroy(target: str,
         }, exit_on_error=True)
 
     current_be = None
-    zpool = zedenv.lib.be.dataset_pool(destroy_dataset)
     try:
-        current_be = pyzfscmds.utility.dataset_child_name(
-            zedenv.lib.be.bootfs_for_pool(zpool))
+        current_be = zfs_utility.dataset_child_name(
+            zedenv.lib.be.bootfs_for_pool(be_pool), check_exists=False)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -300,17 +317,51 @@ def zedenv_destroy(target: str,
             "message": f"Cannot destroy current active environment '{target}'."
         }, exit_on_error=True)
 
-    if pyzfscmds.system.agnostic.dataset_mountpoint(destroy_dataset) == "/":
+    if zedenv.lib.be.dataset_mountpoint(destroy_dataset) == "/":
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Cannot destroy current root dataset environment '{target}'."
         }, exit_on_error=True)
 
-    if not noconfirm:
-        click.confirm(f"Do you really want to destroy '{target}'?\n"
-                      "This action will be permanent.\n\n"
-                      f"Destroy '{destroy_dataset}'?", abort=True)
-        click.echo()
+    return current_be
+
+
+def boot_pool_dataset(target: str) -> Optional[str]:
+    """
+    Dataset for the kernel and ramdisk files of target if a separate ZFS boot pool is used.
+    """
+    if not zedenv.lib.be.extra_bpool():
+        return None
+
+    boot_dataset = zedenv.lib.be.mountpoint_dataset("/boot")
+    m = re.search(r"(.*)/zedenv-", boot_dataset)
+    if not m:
+        ZELogger.log({
+            "level": "WARNING",
+            "message": (f"Failed to determine a valid path from '{boot_dataset}'")
+        })
+        return None
+
+    return f"{m.group(1)}/zedenv-{target}"
+
+
+def destroy_boot_environment(target: str,
+                             be_root: str,
+                             current_be: Optional[str],
+                             bootloader: Optional[str],
+                             verbose: Optional[bool],
+                             noconfirm: Optional[bool],
+                             noop: Optional[bool],
+                             deferred_origins: Optional[list] = None,
+                             graphs: Optional[Dict[str, zedenv.lib.clones.CloneGraph]] = None,
+                             confirmed: bool = False):
+    """
+    Destroy a boot environment or snapshot and its boot dataset. With
+    confirmed the destroy of its origin snapshots was already confirmed
+    as part of a plan, and isn't asked about again.
+    """
+    destroy_dataset = f"{be_root}/{target}"
+    ds_is_snapshot = zfs_utility.is_snapshot(destroy_dataset)
 
     bootloader_set = zedenv.lib.be.get_property(destroy_dataset, "org.zedenv:bootloader")
     if not bootloader and bootloader_set:
@@ -325,22 +376,22 @@ def zedenv_destroy(target: str,
             "message": f"Using plugin {bootloader}\n"
         }, verbose)
 
-    # Destroy the root boot environment
-    destroy_element(target, destroy_dataset, ds_is_snapshot, verbose, noconfirm, noop)
-
-    # Destroy the dataset for the kernel and ramdisk files if a separate ZFS boot pool is used
-    if zedenv.lib.be.extra_bpool():
-        boot_dataset = pyzfscmds.system.agnostic.mountpoint_dataset("/boot")
-        m = re.search(r"(.*)/zedenv-", boot_dataset)
-        if m:
-            destroy_dataset = f"{m.group(1)}/zedenv-{target}"
-            ds_is_snapshot = pyzfscmds.utility.is_snapshot(destroy_dataset)
-            destroy_element(target, destroy_dataset, ds_is_snapshot, verbose, noconfirm, noop)
-        else:
-            ZELogger.log({
-                "level": "WARNING",
-                "message": (f"Failed to determine a valid path from '{boot_dataset}'")
-            })
+    origins_confirmed = noconfirm or confirmed
+
+    # Destroy the root boot environment, and its boot dataset alongside
+    steps = [lambda: destroy_element(target, destroy_dataset, ds_is_snapshot,
+                                     verbose, origins_confirmed, noop,
+                                     deferred_origins=deferred_origins, graphs=graphs)]
+
+    boot_dataset = boot_pool_dataset(target)
+    if boot_dataset:
+        steps.append(lambda: destroy_element(target, boot_dataset,
+                                             zfs_utility.is_snapshot(boot_dataset),
+                                             verbose, origins_confirmed, noop,
+                                             deferred_origins=deferred_origins, graphs=graphs))
+
+    # Confirming the destroy of an origin prompts, one pool at a time then
+    zedenv.lib.runner.join(steps, serial=noop or not origins_confirmed)
 
     if bootloader:
         try:
@@ -357,8 +408,160 @@ def zedenv_destroy(target: str,
     }, verbose)
 
 
+def zedenv_destroy(target: str,
+                   be_root: str,
+                   root_dataset: str,
+                   bootloader: Optional[str],
+                   verbose: Optional[bool],
+                   noconfirm: Optional[bool],
+                   noop: Optional[bool]):
+    """
+    Put actual function to be called in this separate function to allow easier testing.
+    """
+    current_be = check_destroy_target(target, be_root)
+
+    if not noconfirm:
+        click.confirm(f"Do you really want to destroy '{target}'?\n"
+                      "This action will be permanent.\n\n"
+                      f"Destroy '{be_root}/{target}'?", abort=True)
+        click.echo()
+
+    destroy_boot_environment(target, be_root, current_be, bootloader, verbose, noconfirm, noop)
+
+
+def match_targets(be_root: str, patterns: List[str], regex: Optional[bool]) -> List[str]:
+    """
+    Boot environments and snapshots matching any of patterns, shell globs, or
+    regular expressions matching the whole name with regex. Patterns containing
+    '@' match snapshots, the others boot environments.
+    """
+    names = zedenv.lib.be.boot_environment_names(be_root)
+    targets = []
+    for pattern in patterns:
+        if regex:
+            try:
+                expression = re.compile(pattern)
+            except re.error as e:
+                ZELogger.log({
+                    "level": "EXCEPTION",
+                    "message": f"Invalid regular expression '{pattern}'\n{e}\n"
+                }, exit_on_error=True)
+            matches = [n for n in names if expression.fullmatch(n)]
+        else:
+            matches = [n for n in names if fnmatch.fnmatchcase(n, pattern)]
+
+        matches = [n for n in matches if ("@" in n) == ("@" in pattern)]
+        if not matches:
+            ZELogger.log({
+                "level": "EXCEPTION",
+                "message": f"The destroy target {pattern} does not exist."
+            }, exit_on_error=True)
+
+        targets.extend(n for n in matches if n not in targets)
+
+    return targets
+
+
+def plan_origins(graph: zedenv.lib.clones.CloneGraph, datasets: List[str]) -> List[str]:
+    """
+    Origin snapshots of datasets outside of all of them, that have no
+    clones left once they're all destroyed.
+    """
+    def planned(name: str) -> bool:
+        return any(zedenv.lib.inventory.inside(name, ds) for ds in datasets)
+
+    origins = [s for ds in datasets for s in graph.origin_snapshots(ds) if not planned(s)]
+    return [s for s in dict.fromkeys(origins) if all(planned(c) for c in graph.dependents(s))]
+
+
+def zedenv_destroy_targets(targets: List[str],
+                           be_root: str,
+                           root_dataset: str,
+                           bootloader: Optional[str],
+                           verbose: Optional[bool],
+                           noconfirm: Optional[bool],
+                           noop: Optional[bool]):
+    """
+    Destroy several boot environments and snapshots as one plan. Boot
+    environments are destroyed clones first, so none of them is promoted
+    out of the way of another, and snapshots are destroyed with one call
+    per dataset, as are the origin snapshots left without clones at the end.
+    """
+    if len(targets) == 1:
+        zedenv_destroy(targets[0], be_root, root_dataset, bootloader, verbose, noconfirm, noop)
+        return
+
+    current_be = None
+    for target in targets:
+        current_be = check_destroy_target(target, be_root)
+
+    environments = [t for t in targets if "@" not in t]
+    # Snapshots of boot environments being destroyed go with them
+    snapshots = [t for t in targets
+                 if "@" in t and t.split("@")[0] not in environments]
+
+    # One clone graph per boot environment root serves the whole plan
+    graphs: Dict[str, zedenv.lib.clones.CloneGraph] = {}
+    graph = get_clone_graph(f"{be_root}/{targets[0].split('@')[0]}", graphs)
+    datasets = [f"{be_root}/{t}" for t in environments]
+
+    if not noconfirm:
+        listing = "".join(f"  {t}\n" for t in environments + snapshots)
+        origins = plan_origins(graph, datasets)
+        if origins:
+            listing += "and the origin snapshots no other boot environment depends on:\n"
+            listing += "".join(f"  {s[len(be_root) + 1:]}\n" for s in origins)
+        click.confirm(f"Do you really want to destroy the following?\n{listing}"
+                      "This action will be permanent.\n\n"
+                      f"Destroy {len(environments) + len(snapshots)} targets?", abort=True)
+        click.echo()
+
+    if snapshots:
+        snapnames = [f"{be_root}/{t}" for t in snapshots]
+        for t in snapshots:
+            boot_dataset = boot_pool_dataset(t)
+            if boot_dataset and zedenv.lib.be.dataset_exists(boot_dataset, zfs_type='snapshot'):
+                snapnames.append(boot_dataset)
+
+        if not noop:
+            try:
+                zedenv.lib.be.zfs_destroy_snapshots(snapnames)
+            except RuntimeError as e:
+                ZELogger.log({
+                    "level": "EXCEPTION",
+                    "message": f"Snapshot may be origin for other boot environment.\n{e}"
+                }, exit_on_error=True)
+        for snap in snapnames:
+            ZELogger.verbose_log({"level": "INFO", "message": f"Destroyed '{snap}"}, verbose)
+
+    if not environments:
+        return
+
+    deferred_origins: list = []
+    for dataset in graph.destroy_order(datasets):
+        destroy_boot_environment(dataset[len(be_root) + 1:], be_root, current_be,
+                                 bootloader, verbose, noconfirm, noop,
+                                 deferred_origins=deferred_origins, graphs=graphs,
+                                 confirmed=True)
+
+    # Earlier origins may have gone with a boot environment destroyed after
+    origins = [s for s in dict.fromkeys(deferred_origins)
+               if zedenv.lib.be.dataset_exists(s, zfs_type='snapshot')]
+    if origins:
+        if not noop:
+            try:
+                zedenv.lib.be.zfs_destroy_snapshots(origins)
+            except RuntimeError as e:
+                ZELogger.log({
+                    "level": "EXCEPTION",
+                    "message": f"Failed to destroy origin snapshots\n{e}\n"
+                }, exit_on_error=True)
+        for snap in origins:
+            ZELogger.verbose_log({"level": "INFO", "message": f"Destroyed {snap}.\n"}, verbose)
+
+
 @click.command(name="destroy",
-               help="Destroy a boot environment or snapshot.")
+               help="Destroy boot environments or snapshots.")
 @click.option('--verbose', '-v',
               is_flag=True,
               help="Print verbose output.")
@@ -370,13 +573,17 @@ def zedenv_destroy(target: str,
               help="Print what would be destroyed but don't apply.")
 @click.option('--bootloader', '-b',
               help="Use bootloader type.")
-@click.argument('boot_environment')
-def cli(boot_environment: str,
+@click.option('--regex', '-r',
+              is_flag=True,
+              help="Match names with regular expressions instead of shell globs.")
+@click.argument('boot_environments', nargs=-1, required=True)
+def cli(boot_environments: Tuple[str],
         verbose: Optional[bool],
         bootloader: Optional[str],
         # unmount: Optional[bool],
         noconfirm: Optional[bool],
-        noop: Optional[bool]):
+        noop: Optional[bool],
+        regex: Optional[bool]):
     try:
         zedenv.lib.check.startup_check()
     except RuntimeError as err:
@@ -392,13 +599,14 @@ def cli(boot_environment: str,
             if not bootloader and bootloader_set:
                 bootloader = bootloader_set if bootloader_set != '-' else None
 
-            zedenv_destroy(boot_environment,
-                           boot_environment_root,
-                           pyzfscmds.system.agnostic.mountpoint_dataset("/"),
-                           bootloader,
-                           verbose,
-                           noconfirm,
-                           noop)
+            zedenv_destroy_targets(match_targets(boot_environment_root,
+                                                 list(boot_environments), regex),
+                                   boot_environment_root,
+                                   zedenv.lib.be.mountpoint_dataset("/"),
+                                   bootloader,
+                                   verbose,
+                                   noconfirm,
+                                   noop)
 
     except IOError as e:
         if e[0] == errno.EPERM:
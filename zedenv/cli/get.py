@@ -3,9 +3,8 @@ Set boot environment properties cli
 """
 
 import click
-import pyzfscmds.cmd
 import pyzfscmds.system.agnostic
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable
 
 import zedenv.configuration
 import zedenv.lib.be
@@ -28,16 +27,14 @@ def format_get(get_line: list,
 
 
 def get_set_properties(property_index: int,
-                       props: Optional[list],
+                       props: Iterable[list],
                        recursive: Optional[bool]) -> List[Dict]:
     """
-    Get currently set zedenv props and return a list of dicts as:
+    Get currently set zedenv props from split scripted output and return a list of dicts as:
     [{ "property": ..., "value": ..., "name": ...}]
     """
     prop_table = []
-    for pl in props:
-        split_prop = pl.split()
-
+    for split_prop in props:
         if split_prop[property_index].startswith("org.zedenv"):
 
             prop_dict = {
@@ -70,26 +67,23 @@ def zedenv_get(zedenv_properties: Optional[list],
             property_index = property_index + 1
             columns.insert(0, "name")  # Include dataset if recursive
 
-        props = None
+        set_properties_dicts = None
         try:
-            props = pyzfscmds.cmd.zfs_get(be_root,
+            props = zedenv.lib.be.zfs_get(be_root,
                                           properties=zedenv_props,
-                                          scripting=scripting,
                                           recursive=recursive,
                                           columns=columns,
                                           zfs_types=['filesystem'])
+            # Filtered as lines are read
+            set_properties_dicts = get_set_properties(property_index, props, recursive)
         except RuntimeError as err:
             ZELogger.log({
                 "level": "EXCEPTION",
                 "message": f"Failed to get zedenv properties\n{err}\n"
             }, exit_on_error=True)
 
-        prop_list = props.splitlines()
-
         if not scripting:
-            set_properties.append(prop_list[0].split())  # Title
-
-        set_properties_dicts = get_set_properties(property_index, prop_list, recursive)
+            set_properties.append([c.upper() for c in columns])  # Title
 
         # Add properties that are currently set
         for item in set_properties_dicts:
@@ -1,10 +1,11 @@
 """List boot environments cli"""
 
 import click
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility as zfs_utility
 import zedenv.lib.be
 import zedenv.lib.check
+import zedenv.lib.space
+import zedenv.lib.system
 from typing import Optional, List
 from zedenv.lib.logger import ZELogger
 
@@ -24,13 +25,21 @@ def format_boot_environment(be_list_line: list,
 
 def configure_boot_environment_list(be_root: str,
                                     columns: list,
-                                    scripting: Optional[bool]) -> list:
+                                    scripting: Optional[bool],
+                                    spaceused: Optional[bool] = False) -> list:
     """
     Converts a list of boot environments with their properties to be printed
     to a list of column separated strings.
     """
     boot_environments = zedenv.lib.be.list_boot_environments(be_root, columns)
 
+    # Space is calculated from the same listing, see zedenv.lib.space
+    be_space = zedenv.lib.space.boot_environment_space(be_root) if spaceused else {}
+
+    # Boot environments share a pool, look up the active datasets once
+    root_dataset = zedenv.lib.be.mountpoint_dataset("/")
+    bootfs = zedenv.lib.be.bootfs_for_pool(be_root.split("/")[0])
+
     """
     Add an active column.
     The other columns were ZFS properties, and the active column is not,
@@ -42,19 +51,19 @@ def configure_boot_environment_list(be_root: str,
     for env in boot_environments:
         if not zfs_utility.is_snapshot(env['name']):
             # Add name column
-            boot_environment_entry = [zfs_utility.dataset_child_name(env['name'])]
+            boot_environment_entry = [zfs_utility.dataset_child_name(
+                env['name'], check_exists=False)]
 
             # Add active column
             active = ""
-            if pyzfscmds.system.agnostic.mountpoint_dataset("/") == env['name']:
+            if root_dataset == env['name']:
                 active = "N"
-            if zedenv.lib.be.bootfs_for_pool(
-                    zedenv.lib.be.dataset_pool(env['name'])) == env['name']:
+            if bootfs == env['name']:
                 active += "R"
             boot_environment_entry.append(active)
 
             # Add mountpoint
-            dataset_mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(env['name'])
+            dataset_mountpoint = zedenv.lib.be.dataset_mountpoint(env['name'])
             if dataset_mountpoint:
                 boot_environment_entry.append(dataset_mountpoint)
             else:
@@ -74,12 +83,22 @@ def configure_boot_environment_list(be_root: str,
 
             # Add creation
             if 'creation' in env:
-                boot_environment_entry.append(env['creation'])
+                boot_environment_entry.append(
+                    zedenv.lib.system.format_creation(env['creation']))
+
+            # Add space columns, exact bytes if scripting
+            if spaceused:
+                for sc in zedenv.lib.space.space_columns:
+                    space = be_space.get(env['name'], {}).get(sc)
+                    boot_environment_entry.append(
+                        str(space) if scripting else zedenv.lib.system.format_size(space))
 
             unformatted_boot_environments.append(boot_environment_entry)
 
     columns.insert(1, 'active')
     columns.insert(2, 'mountpoint')
+    if spaceused:
+        columns.extend(zedenv.lib.space.space_columns)
 
     # Set minimum column width to name of column plus one
     widths = [len(l) + 1 for l in columns]
@@ -121,10 +140,6 @@ def zedenv_list(verbose: Optional[bool],
 
     columns = ["name"]
 
-    # TODO: Complete
-    # if spaceused:
-    #     columns.extend(["used", "usedds", "usedbysnapshots", "usedrefreserv", "refer"])
-
     """
     TODO:
     if all_datasets:
@@ -137,7 +152,7 @@ def zedenv_list(verbose: Optional[bool],
 
     columns.append("creation")
 
-    boot_environments = configure_boot_environment_list(be_root, columns, scripting)
+    boot_environments = configure_boot_environment_list(be_root, columns, scripting, spaceused)
 
     for list_output in boot_environments:
         ZELogger.log({"level": "INFO", "message": list_output})
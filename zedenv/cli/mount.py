@@ -3,20 +3,22 @@
 import os
 import tempfile
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 import click
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility as zfs_utility
 
 import zedenv.lib.be
 import zedenv.lib.check
-import zedenv.lib.system
+import zedenv.lib.runner
 from zedenv.lib.logger import ZELogger
 
 
-def mount_children(child_datasets: list, mountpoint: str, verbose: bool):
+def child_mounts(child_datasets: list, mountpoint: str, verbose: bool) -> List[tuple]:
+    """
+    Where each child dataset goes below mountpoint, as (dataset, mountpoint).
+    """
+    mounts = []
     for cd in child_datasets:
         if cd['mountpoint'] == "none" or cd['mountpoint'] == "legacy":
             ZELogger.verbose_log({
@@ -26,27 +28,76 @@ def mount_children(child_datasets: list, mountpoint: str, verbose: bool):
             }, verbose)
         else:
             if cd['source'] == 'local':
-                child = pyzfscmds.utility.dataset_child_name(cd['name'], check_exists=False)
+                child = zfs_utility.dataset_child_name(cd['name'], check_exists=False)
                 new_mount = os.path.join(mountpoint, child.lstrip('/'))
             else:
                 new_mount = os.path.join(mountpoint, cd['mountpoint'].lstrip('/'))
+            mounts.append((cd['name'], os.path.normpath(new_mount)))
 
-            if not os.path.exists(new_mount):
-                os.makedirs(new_mount)
+    return mounts
 
-            try:
-                zedenv.lib.system.zfs_manual_mount(cd['name'], new_mount)
-            except RuntimeError as e:
-                ZELogger.log({
-                    "level": "EXCEPTION",
-                    "message": f"Failed mounting child dataset to '{new_mount}'.\n{e}"
-                }, exit_on_error=True)
+
+def mount_tiers(mounts: List[tuple]) -> List[List[tuple]]:
+    """
+    Group mounts by depth of their mountpoint, shallowest first. A mount only
+    depends on the mounts above its mountpoint, so those in a tier are independent.
+    """
+    tiers: Dict[int, List[tuple]] = {}
+    for dataset, mountpoint in mounts:
+        tiers.setdefault(mountpoint.count(os.sep), []).append((dataset, mountpoint))
+
+    return [tiers[depth] for depth in sorted(tiers)]
+
+
+def mount_child(dataset: str, mountpoint: str):
+    os.makedirs(mountpoint, exist_ok=True)
+    try:
+        zedenv.lib.be.zfs_mount(dataset, mountpoint=mountpoint)
+    except RuntimeError as e:
+        raise RuntimeError(f"Failed mounting child dataset to '{mountpoint}'.\n{e}")
+
+
+def unmount_mounted(mounted: List[tuple], verbose: bool):
+    """
+    Unmount what was mounted, deepest first, failures are only reported.
+    """
+    for dataset, mountpoint in reversed(mounted):
+        try:
+            zedenv.lib.be.zfs_unmount(dataset, mountpoint=mountpoint)
+        except RuntimeError as e:
+            ZELogger.log({
+                "level": "WARNING",
+                "message": f"Failed unmounting '{mountpoint}' while cleaning up.\n{e}"
+            })
+        else:
             ZELogger.verbose_log({
-                "level": "INFO",
-                "message": f"Mounted dataset {cd['name']} to '{new_mount}'.\n"
+                "level": "INFO", "message": f"Unmounted '{mountpoint}'.\n"
             }, verbose)
 
 
+def mount_children(child_datasets: list, mountpoint: str, verbose: bool):
+    """
+    Mount children tier by tier, the mounts of a tier concurrently. If any
+    fails, the children already mounted are unmounted again and RuntimeError raised.
+    """
+    mounted: List[tuple] = []
+    for tier in mount_tiers(child_mounts(child_datasets, mountpoint, verbose)):
+        results = zedenv.lib.runner.gather(
+            [lambda d=d, m=m: mount_child(d, m) for d, m in tier])
+
+        for (dataset, new_mount), result in zip(tier, results):
+            if not isinstance(result, RuntimeError):
+                mounted.append((dataset, new_mount))
+                ZELogger.verbose_log({
+                    "level": "INFO",
+                    "message": f"Mounted dataset {dataset} to '{new_mount}'.\n"
+                }, verbose)
+
+        if zedenv.lib.runner.log_failures(results):
+            unmount_mounted(mounted, verbose)
+            raise RuntimeError("Failed mounting child datasets.\n")
+
+
 def zedenv_mount(boot_environment: str, mountpoint: Optional[str],
                  verbose: bool, be_root: str, check_bpool: bool = True):
     """
@@ -86,7 +137,7 @@ def zedenv_mount(boot_environment: str, mountpoint: Optional[str],
     be_dataset = f"{be_root}/{boot_environment}"
 
     try:
-        zedenv.lib.system.zfs_manual_mount(be_dataset, mountpoint)
+        zedenv.lib.be.zfs_mount(be_dataset, mountpoint=mountpoint)
     except RuntimeError as e:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -105,7 +156,11 @@ def zedenv_mount(boot_environment: str, mountpoint: Optional[str],
             "level": "INFO",
             "message": f"Mounting children of '{boot_environment}'.\n"
         }, verbose)
-        mount_children(child_datasets, mountpoint, verbose)
+        try:
+            mount_children(child_datasets, mountpoint, verbose)
+        except RuntimeError as e:
+            unmount_mounted([(be_dataset, mountpoint)], verbose)
+            ZELogger.log({"level": "EXCEPTION", "message": f"{e}"}, exit_on_error=True)
 
     if check_bpool:
         # If a separate ZFS boot pool is used
@@ -114,7 +169,7 @@ def zedenv_mount(boot_environment: str, mountpoint: Optional[str],
             boot_environment_boot = zedenv.lib.be.root('/boot')
             be_boot_requested = f"{boot_environment_boot}/zedenv-{boot_environment}"
             try:
-                zedenv.lib.system.zfs_manual_mount(be_boot_requested, f"{mountpoint}/boot")
+                zedenv.lib.be.zfs_mount(be_boot_requested, mountpoint=f"{mountpoint}/boot")
             except RuntimeError as e:
                 ZELogger.log({
                     "level": "WARNING",
@@ -136,10 +191,10 @@ def cli(boot_environment: str, mountpoint: Optional[list], verbose: Optional[boo
         ZELogger.log({"level": "EXCEPTION", "message": err}, exit_on_error=True)
 
     be_root = zedenv.lib.be.root()
-    dataset_mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(
+    dataset_mountpoint = zedenv.lib.be.dataset_mountpoint(
         f"{be_root}/{boot_environment}")
 
-    if not pyzfscmds.utility.dataset_exists(f"{be_root}/{boot_environment}"):
+    if not zedenv.lib.be.dataset_exists(f"{be_root}/{boot_environment}"):
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Boot environment doesn't exist {boot_environment}.\n"
@@ -0,0 +1,255 @@
+"""Prune boot environments cli"""
+import errno
+from typing import Dict, List, Optional, Set, Tuple
+
+import click
+
+import zedenv.cli.destroy
+import zedenv.lib.be
+import zedenv.lib.check
+import zedenv.lib.prune
+import zedenv.lib.space
+import zedenv.lib.system
+from zedenv.lib.logger import ZELogger
+
+
+def prune_settings(be_root: str) -> Tuple[Dict[str, str], Set[str]]:
+    """
+    Rule values set on be_root and the pinned boot environments,
+    read with one 'zfs get' of be_root and the boot environments in it.
+    """
+    properties = [zedenv.lib.prune.rule_property(r) for r in zedenv.lib.prune.rule_properties]
+    values = {}
+    pinned = set()
+    try:
+        for name, prop, value, source in zedenv.lib.be.zfs_get(
+                be_root, depth=1, columns=["name", "property", "value", "source"],
+                properties=properties + [zedenv.lib.prune.pinned_property],
+                zfs_types=['filesystem']):
+            if name == be_root and prop in properties:
+                values[zedenv.lib.prune.rule_properties[properties.index(prop)]] = value
+            elif prop == zedenv.lib.prune.pinned_property and source == "local" and value == "yes":
+                pinned.add(name)
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to get prune rules of {be_root}\n{e}\n"
+        }, exit_on_error=True)
+
+    return values, pinned
+
+
+def zedenv_prune(be_root: str,
+                 root_dataset: Optional[str],
+                 bootloader: Optional[str],
+                 rule_overrides: Dict[str, Optional[str]],
+                 verbose: Optional[bool],
+                 noconfirm: Optional[bool],
+                 noop: Optional[bool]):
+    values, pinned = prune_settings(be_root)
+    values.update({r: v for r, v in rule_overrides.items() if v is not None})
+
+    rules = None
+    try:
+        rules = zedenv.lib.prune.parse_rules(values)
+    except ValueError as e:
+        ZELogger.log({"level": "EXCEPTION", "message": f"{e}\n"}, exit_on_error=True)
+
+    if all(v is None for v in rules.values()):
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": ("No prune rules are set, set one of "
+                        f"{', '.join(zedenv.lib.prune.rule_property(r) for r in rules)} "
+                        "with 'zedenv set', or give it as an option.\n")
+        }, exit_on_error=True)
+
+    boot_environments = [
+        be for be in zedenv.lib.be.list_boot_environments(be_root, ['name', 'type', 'creation'])
+        if be['type'] == 'filesystem']
+
+    active = None
+    try:
+        active = zedenv.lib.be.bootfs_for_pool(be_root.split("/")[0])
+    except RuntimeError:
+        ZELogger.verbose_log({
+            "level": "INFO", "message": "No bootfs set, no boot environment is active.\n"
+        }, verbose)
+
+    protected = {active: "active", root_dataset: "current"}
+    protected.update({p: "pinned" for p in pinned if p not in protected})
+
+    keep = zedenv.lib.prune.retained(boot_environments, rules)
+    prune = []
+    for be in boot_environments:
+        if be['name'] in protected:
+            ZELogger.verbose_log({
+                "level": "INFO",
+                "message": f"Keeping {be['name']}, it is {protected[be['name']]}.\n"
+            }, verbose)
+        elif be['name'] in keep:
+            ZELogger.verbose_log({
+                "level": "INFO", "message": f"Keeping {be['name']}, kept by rules.\n"
+            }, verbose)
+        else:
+            prune.append(be['name'])
+
+    if not prune:
+        ZELogger.log({"level": "INFO", "message": "No boot environments to prune.\n"})
+        return
+
+    # Space freed by destroying each alone, shared space may be freed as well
+    be_space = zedenv.lib.space.boot_environment_space(be_root)
+    reclaimed = sum(be_space.get(name, {}).get('exclusive', 0) for name in prune)
+
+    for name in prune:
+        size = zedenv.lib.system.format_size(be_space.get(name, {}).get('exclusive'))
+        ZELogger.log({
+            "level": "INFO",
+            "message": f"{'Would destroy' if noop else 'Destroying'} {name} ({size})"
+        })
+
+    if noop:
+        ZELogger.log({
+            "level": "INFO",
+            "message": f"Would reclaim at least {zedenv.lib.system.format_size(reclaimed)}.\n"
+        })
+        return
+
+    zedenv.cli.destroy.zedenv_destroy_targets([name[len(be_root) + 1:] for name in prune],
+                                              be_root,
+                                              root_dataset,
+                                              bootloader,
+                                              verbose,
+                                              noconfirm,
+                                              noop)
+
+    ZELogger.log({
+        "level": "INFO",
+        "message": f"Reclaimed at least {zedenv.lib.system.format_size(reclaimed)}.\n"
+    })
+
+
+def zedenv_prune_orphans(roots: List[str],
+                         verbose: Optional[bool],
+                         noconfirm: Optional[bool],
+                         noop: Optional[bool]):
+    """
+    Destroy the snapshots zedenv created below roots that no clone depends on,
+    with one 'zfs destroy dataset@a,b,c' per dataset.
+    """
+    orphaned = zedenv.lib.prune.orphaned_snapshots(roots)
+    if not orphaned:
+        ZELogger.log({"level": "INFO", "message": "No orphaned snapshots to destroy.\n"})
+        return
+
+    # Space used by each alone, data shared between them is freed as well
+    reclaimed = sum(snap['used'] for snap in orphaned)
+
+    for snap in orphaned:
+        ZELogger.log({
+            "level": "INFO",
+            "message": (f"{'Would destroy' if noop else 'Destroying'} {snap['name']} "
+                        f"({zedenv.lib.system.format_size(snap['used'])})")
+        })
+
+    if noop:
+        ZELogger.log({
+            "level": "INFO",
+            "message": f"Would reclaim at least {zedenv.lib.system.format_size(reclaimed)}.\n"
+        })
+        return
+
+    if not noconfirm:
+        click.confirm(f"Destroy {len(orphaned)} orphaned snapshots?\n"
+                      "This action will be permanent.\n", abort=True)
+        click.echo()
+
+    try:
+        zedenv.lib.be.zfs_destroy_snapshots([snap['name'] for snap in orphaned])
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to destroy orphaned snapshots\n{e}\n"
+        }, exit_on_error=True)
+
+    ZELogger.log({
+        "level": "INFO",
+        "message": f"Reclaimed at least {zedenv.lib.system.format_size(reclaimed)}.\n"
+    })
+
+
+@click.command(name="prune",
+               help="Destroy boot environments not kept by the retention rules.")
+@click.option('--verbose', '-v',
+              is_flag=True,
+              help="Print verbose output.")
+@click.option('--noconfirm', '-y',
+              is_flag=True,
+              help="Destroy without prompt asking for confirmation.")
+@click.option('--noop', '-n',
+              is_flag=True,
+              help="Print what would be destroyed and the space reclaimed but don't apply.")
+@click.option('--bootloader', '-b',
+              help="Use bootloader type.")
+@click.option('--orphans', '-o',
+              is_flag=True,
+              help="Destroy snapshots zedenv created that no clone depends on instead.")
+@click.option('--keep-last',
+              help="Keep the newest N boot environments.")
+@click.option('--max-age',
+              help="Keep boot environments younger than this, e.g. 12h, 30d or 2w.")
+@click.option('--keep-daily',
+              help="Keep the newest boot environment of each of the last N days.")
+@click.option('--keep-weekly',
+              help="Keep the newest boot environment of each of the last N weeks.")
+def cli(verbose: Optional[bool],
+        noconfirm: Optional[bool],
+        noop: Optional[bool],
+        bootloader: Optional[str],
+        orphans: Optional[bool],
+        keep_last: Optional[str],
+        max_age: Optional[str],
+        keep_daily: Optional[str],
+        keep_weekly: Optional[str]):
+    try:
+        zedenv.lib.check.startup_check()
+    except RuntimeError as err:
+        ZELogger.log({"level": "EXCEPTION", "message": err}, exit_on_error=True)
+
+    try:
+        with zedenv.lib.check.Pidfile():
+
+            boot_environment_root = zedenv.lib.be.root()
+
+            if orphans:
+                roots = [boot_environment_root]
+                if zedenv.lib.be.extra_bpool():
+                    roots.append(zedenv.lib.be.root("/boot"))
+                zedenv_prune_orphans(roots, verbose, noconfirm, noop)
+                return
+
+            bootloader_set = zedenv.lib.be.get_property(
+                boot_environment_root, "org.zedenv:bootloader")
+            if not bootloader and bootloader_set:
+                bootloader = bootloader_set if bootloader_set != '-' else None
+
+            zedenv_prune(boot_environment_root,
+                         zedenv.lib.be.mountpoint_dataset("/"),
+                         bootloader,
+                         {"keep-last": keep_last, "max-age": max_age,
+                          "keep-daily": keep_daily, "keep-weekly": keep_weekly},
+                         verbose,
+                         noconfirm,
+                         noop)
+
+    except IOError as e:
+        if e[0] == errno.EPERM:
+            ZELogger.log({
+                "level": "EXCEPTION", "message":
+                    "You need root permissions to prune"
+            }, exit_on_error=True)
+    except zedenv.lib.check.ProcessRunningException as pr:
+        ZELogger.log({
+            "level": "EXCEPTION", "message":
+                f"Already running zedenv.\n {pr}"
+        }, exit_on_error=True)
@@ -2,15 +2,43 @@
 import errno
 
 import click
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
 import pyzfscmds.utility as zfs_utility
 
 import zedenv.lib.be
 import zedenv.lib.check
 import zedenv.lib.configure
+import zedenv.lib.runner
 from zedenv.lib.logger import ZELogger
-from typing import Optional
+from typing import List, Optional
+
+
+def rename_datasets(renames: List[tuple]):
+    """
+    Make (dataset, new_dataset) renames, in different pools, concurrently.
+    If any fails the others are renamed back, so the boot environment is
+    left as it was.
+    """
+    results = zedenv.lib.runner.gather(
+        [lambda o=o, n=n: zedenv.lib.be.zfs_rename(o, n) for o, n in renames])
+    if not zedenv.lib.runner.failures(results):
+        return
+
+    for (old_dataset, new_dataset), result in zip(renames, results):
+        if isinstance(result, RuntimeError):
+            ZELogger.log({
+                "level": "ERROR",
+                "message": f"Failed to rename '{old_dataset}' to '{new_dataset}'.\n{result}"
+            })
+            continue
+        try:
+            zedenv.lib.be.zfs_rename(new_dataset, old_dataset)
+        except RuntimeError as e:
+            ZELogger.log({
+                "level": "ERROR",
+                "message": f"Failed to rename '{new_dataset}' back to '{old_dataset}'.\n{e}"
+            })
+
+    ZELogger.log({"level": "EXCEPTION", "message": "Stopping rename.\n"}, exit_on_error=True)
 
 
 def zedenv_rename(be_root: str,
@@ -25,8 +53,8 @@ def zedenv_rename(be_root: str,
     zpool = zedenv.lib.be.dataset_pool(old_be_dataset)
     current_be = None
     try:
-        current_be = pyzfscmds.utility.dataset_child_name(
-            zedenv.lib.be.bootfs_for_pool(zpool))
+        current_be = zfs_utility.dataset_child_name(
+            zedenv.lib.be.bootfs_for_pool(zpool), check_exists=False)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -44,9 +72,9 @@ def zedenv_rename(be_root: str,
             "message": f"Using plugin {bootloader}\n"
         }, verbose)
 
-    dataset_mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(old_be_dataset)
+    dataset_mountpoint = zedenv.lib.be.dataset_mountpoint(old_be_dataset)
 
-    if pyzfscmds.utility.dataset_exists(new_be_dataset):
+    if zedenv.lib.be.dataset_exists(new_be_dataset):
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Boot environment '{new_boot_environment}' already exists.\n"
@@ -71,25 +99,14 @@ def zedenv_rename(be_root: str,
             "message": f"Dataset is mounted to '{dataset_mountpoint}', unmount and try again\n"
         }, exit_on_error=True)
 
-    try:
-        pyzfscmds.cmd.zfs_rename(old_be_dataset, new_be_dataset)
-    except RuntimeError as err:
-        ZELogger.log({"level": "EXCEPTION", "message": err}, exit_on_error=True)
-
-    # Rename the boot dataset if a separate ZFS boot pool is used
+    renames = [(old_be_dataset, new_be_dataset)]
+    # Rename the boot dataset too if a separate ZFS boot pool is used
     if zedenv.lib.be.extra_bpool():
         be_boot = zedenv.lib.be.root('/boot')
-        old_be_boot_dataset = f"{be_boot}/zedenv-{boot_environment}"
-        new_be_boot_dataset = f"{be_boot}/zedenv-{new_boot_environment}"
-        try:
-            pyzfscmds.cmd.zfs_rename(old_be_boot_dataset, new_be_boot_dataset)
-        except RuntimeError as e:
-            ZELogger.log({
-                "level": "EXCEPTION",
-                "message": (f"Failed to rename the boot dataset '{old_be_boot_dataset}' to"
-                            f" '{new_be_boot_dataset}'. The following error occured:\n\n{e}"
-                            "\nStopping rename.\n")
-            }, exit_on_error=True)
+        renames.append((f"{be_boot}/zedenv-{boot_environment}",
+                        f"{be_boot}/zedenv-{new_boot_environment}"))
+
+    rename_datasets(renames)
 
     if bootloader_plugin:
         try:
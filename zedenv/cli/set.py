@@ -5,7 +5,6 @@ from typing import Optional
 import click
 
 import pyzfscmds.system.agnostic
-import pyzfscmds.cmd
 
 import zedenv.lib.be
 import zedenv.lib.check
@@ -14,15 +13,15 @@ from zedenv.lib.logger import ZELogger
 
 def zedenv_set(verbose: Optional[bool], zedenv_properties: Optional[list], be_root: str):
 
-    for prop in zedenv_properties:
-        try:
-            pyzfscmds.cmd.zfs_set(be_root, prop)
-        except RuntimeError:
-            ZELogger.log({
-                "level": "EXCEPTION",
-                "message": f"Failed to set zedenv property '{prop}'\n"
-            }, exit_on_error=True)
+    try:
+        zedenv.lib.be.zfs_set_properties(be_root, list(zedenv_properties))
+    except RuntimeError as e:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to set zedenv properties\n{e}\n"
+        }, exit_on_error=True)
 
+    for prop in zedenv_properties:
         if verbose:
             ZELogger.verbose_log({
                 "level": "INFO",
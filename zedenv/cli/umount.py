@@ -1,65 +1,126 @@
 """List boot environments cli"""
 
-import sys
+import os
+import platform
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 import click
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
-import pyzfscmds.utility as zfs_utility
 
 import zedenv.lib.be
 import zedenv.lib.check
+import zedenv.lib.runner
 import zedenv.lib.system
 from zedenv.lib.logger import ZELogger
 
 
-def zedenv_umount(boot_environment: str, verbose: bool, be_root: str):
-    boot_environment_dataset = f"{be_root}/{boot_environment}"
-    child_datasets_unformatted = None
+def unmount_tiers(mounts: List[dict]) -> List[List[dict]]:
+    """
+    Group mounts by depth of their mountpoint, deepest first.
+    Mounts in a tier are siblings, none is mounted inside another.
+    """
+    tiers: Dict[int, List[dict]] = {}
+    for m in mounts:
+        tiers.setdefault(os.path.normpath(m['mountpoint']).count(os.sep), []).append(m)
+
+    return [tiers[depth] for depth in sorted(tiers, reverse=True)]
+
+
+def recursive_unmount_safe(mounts: List[dict], boot_environment_dataset: str,
+                           boot_dataset: Optional[str], mountpoint: str) -> bool:
+    """
+    Whether one 'umount -R' can be used, on Linux when everything mounted
+    below the boot environment is part of it or its boot dataset. 'umount -R'
+    also takes non-ZFS mounts below it, such as /dev, /proc and /sys bound
+    for a chroot, and through mount propagation possibly the host's own, so
+    the whole mount table is read for those.
+    """
+    if platform.system().lower() != "linux":
+        return False
+
+    for m in mounts:
+        if m['dataset'] in (boot_environment_dataset, boot_dataset):
+            continue
+        if not m['dataset'].startswith(f"{boot_environment_dataset}/"):
+            return False
+
     try:
-        child_datasets_unformatted = pyzfscmds.cmd.zfs_list(boot_environment_dataset,
-                                                            sort_properties_descending=['name'],
-                                                            recursive=True,
-                                                            columns=['name'])
+        system_mounts = zedenv.lib.system.mount_table()
+    except RuntimeError:
+        return False
+
+    below = f"{mountpoint.rstrip('/')}/"
+    return not any(m['fstype'] != "zfs" and (
+        m['mountpoint'] in (mountpoint, below) or m['mountpoint'].startswith(below))
+        for m in system_mounts)
+
+
+def unmount(m: dict):
+    try:
+        zedenv.lib.be.zfs_unmount(m['dataset'], mountpoint=m['mountpoint'])
     except RuntimeError as e:
-        ZELogger.log({
-            "level": "EXCEPTION",
-            "message": f"Failed to get list of datasets for '{boot_environment}'.\n{e}"
-        }, exit_on_error=True)
+        raise RuntimeError(f"Failed Un-mounting {m['dataset']} from '{m['mountpoint']}'.\n{e}")
+
+
+def zedenv_umount(boot_environment: str, verbose: bool, be_root: str,
+                  recursive: Optional[bool] = False):
+    """
+    Unmount a boot environment and everything mounted below it, found with one
+    read of the mount table. Mounts are unmounted deepest first, those at the
+    same depth concurrently, or with recursive by one 'umount -R' where safe.
+    """
+    boot_environment_dataset = f"{be_root}/{boot_environment}"
+    mountpoint = zedenv.lib.be.dataset_mountpoint(boot_environment_dataset)
+    if not mountpoint:
+        ZELogger.verbose_log({
+            "level": "INFO",
+            "message": f"Boot environment {boot_environment} wasn't mounted, won't unmount.\n"
+        }, verbose)
+        return
+
+    # Includes the boot pool dataset mounted at '{mountpoint}/boot' if a separate pool is used
+    mounts = zedenv.lib.be.mounts_below(mountpoint)
 
-    mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(boot_environment_dataset)
-    if mountpoint:
-        # If a separate ZFS boot pool is used, start with unmounting the corresponding boot dataset
+    if recursive:
+        boot_dataset = None
         if zedenv.lib.be.extra_bpool():
-            try:
-                zedenv.lib.system.umount(f"{mountpoint}/boot")
-            except RuntimeError as e:
-                ZELogger.log({
-                    "level": "EXCEPTION",
-                    "message": f"Failed Un-mounting boot dataset from '{mountpoint}/boot'.\n{e}"
-                }, exit_on_error=True)
+            boot_dataset = f"{zedenv.lib.be.root('/boot')}/zedenv-{boot_environment}"
 
-    for d in zedenv.lib.be.split_zfs_output(child_datasets_unformatted):
-        mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(d[0])
-        if mountpoint:
+        if recursive_unmount_safe(mounts, boot_environment_dataset, boot_dataset, mountpoint):
             try:
-                zedenv.lib.system.umount(mountpoint)
+                zedenv.lib.be.zfs_unmount(boot_environment_dataset,
+                                          mountpoint=mountpoint, recursive=True)
             except RuntimeError as e:
                 ZELogger.log({
                     "level": "EXCEPTION",
-                    "message": f"Failed Un-mounting child dataset from '{mountpoint}'.\n{e}"
+                    "message": f"Failed Un-mounting '{mountpoint}' recursively.\n{e}"
                 }, exit_on_error=True)
             ZELogger.verbose_log({
                 "level": "INFO",
-                "message": f"Unmounted {d[0]} from {mountpoint}.\n"
-            }, verbose)
-        else:
-            ZELogger.verbose_log({
-                "level": "INFO",
-                "message": f"Child dataset {d[0]} wasn't mounted, won't unmount.\n"
+                "message": f"Unmounted everything below {mountpoint}.\n"
             }, verbose)
+            return
+
+        ZELogger.verbose_log({
+            "level": "INFO",
+            "message": "Can't unmount recursively, unmounting one at a time.\n"
+        }, verbose)
+
+    for tier in unmount_tiers(mounts):
+        results = zedenv.lib.runner.gather([lambda m=m: unmount(m) for m in tier])
+
+        for m, result in zip(tier, results):
+            if not isinstance(result, RuntimeError):
+                ZELogger.verbose_log({
+                    "level": "INFO",
+                    "message": f"Unmounted {m['dataset']} from {m['mountpoint']}.\n"
+                }, verbose)
+
+        if zedenv.lib.runner.log_failures(results):
+            ZELogger.log({
+                "level": "EXCEPTION",
+                "message": f"Failed to unmount boot environment '{boot_environment}'.\n"
+            }, exit_on_error=True)
 
 
 @click.command(name="umount",
@@ -67,18 +128,21 @@ def zedenv_umount(boot_environment: str, verbose: bool, be_root: str):
 @click.option('--verbose', '-v',
               is_flag=True,
               help="Print verbose output.")
+@click.option('--recursive', '-R',
+              is_flag=True,
+              help="On Linux, unmount everything with one 'umount -R' where safe.")
 @click.argument('boot_environment')
-def cli(boot_environment: str, verbose: Optional[bool]):
+def cli(boot_environment: str, verbose: Optional[bool], recursive: Optional[bool]):
     try:
         zedenv.lib.check.startup_check()
     except RuntimeError as err:
         ZELogger.log({"level": "EXCEPTION", "message": err}, exit_on_error=True)
 
     be_root = zedenv.lib.be.root()
-    dataset_mountpoint = pyzfscmds.system.agnostic.dataset_mountpoint(
+    dataset_mountpoint = zedenv.lib.be.dataset_mountpoint(
         f"{be_root}/{boot_environment}")
 
-    if not pyzfscmds.utility.dataset_exists(f"{be_root}/{boot_environment}"):
+    if not zedenv.lib.be.dataset_exists(f"{be_root}/{boot_environment}"):
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Boot environment doesn't exist {boot_environment}.\n"
@@ -96,4 +160,4 @@ def cli(boot_environment: str, verbose: Optional[bool]):
             "message": f"Boot environment already un-mounted\n"
         }, exit_on_error=True)
 
-    zedenv_umount(boot_environment, verbose, be_root)
+    zedenv_umount(boot_environment, verbose, be_root, recursive)
@@ -2,4 +2,14 @@ from typing import Tuple
 
 allowed_properties: Tuple[dict] = (
     {"property": 'bootloader', "description": "Set a bootloader plugin.", "default": ""},
+    {"property": 'prune-keep-last',
+     "description": "Prune keeps the newest N boot environments.", "default": ""},
+    {"property": 'prune-max-age',
+     "description": "Prune keeps boot environments younger than this, e.g. 30d.", "default": ""},
+    {"property": 'prune-keep-daily',
+     "description": "Prune keeps the newest boot environment of the last N days.", "default": ""},
+    {"property": 'prune-keep-weekly',
+     "description": "Prune keeps the newest boot environment of the last N weeks.", "default": ""},
+    {"property": 'pinned',
+     "description": "Set to 'yes' on a boot environment to never prune it.", "default": "no"},
 )
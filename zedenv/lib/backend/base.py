@@ -0,0 +1,146 @@
+"""
+Interface every ZFS backend implements
+"""
+
+from typing import Iterable, List, Optional
+
+
+class ChannelProgramUnsupported(RuntimeError):
+    """
+    Channel programs can't be run here at all, as opposed to a program that
+    ran and failed, possibly after it made some of its changes.
+    """
+
+
+class Backend(object):
+    """
+    Runs ZFS operations for zedenv.
+
+    Listings return rows of column values as strings, the way 'zfs list -Hp'
+    prints them, converting values is left to zedenv.lib.be.zfs_value. Rows
+    may be streamed, so a failed listing can raise while it is iterated.
+    Every failure raises RuntimeError.
+    """
+
+    name = None
+
+    # Whether channel_program can be tried at all
+    channel_programs = False
+
+    def zfs_list(self, target: Optional[str] = None,
+                 recursive: bool = False,
+                 depth: Optional[int] = None,
+                 columns: Optional[List[str]] = None,
+                 zfs_types: Optional[List[str]] = None,
+                 sort_properties_ascending: Optional[List[str]] = None,
+                 sort_properties_descending: Optional[List[str]] = None) -> Iterable[List[str]]:
+        """
+        List datasets, by default filesystems and volumes, name column only.
+        """
+        raise NotImplementedError()
+
+    def zfs_get(self, target: str,
+                properties: Optional[List[str]] = None,
+                recursive: bool = False,
+                depth: Optional[int] = None,
+                columns: Optional[List[str]] = None,
+                source: Optional[List[str]] = None,
+                zfs_types: Optional[List[str]] = None) -> Iterable[List[str]]:
+        """
+        Get properties, by default all, with columns name, property, value and source.
+        """
+        raise NotImplementedError()
+
+    def zfs_set(self, target: str, prop: str):
+        """
+        Set a property given as 'property=value'.
+        """
+        raise NotImplementedError()
+
+    def zfs_set_properties(self, target: str, properties: List[str]):
+        """
+        Set several properties given as 'property=value' in one operation.
+        Backends that can't batch them set them one at a time.
+        """
+        for prop in properties:
+            self.zfs_set(target, prop)
+
+    def zfs_set_datasets(self, targets: List[str], properties: List[str]):
+        """
+        Set the same properties on several datasets in one operation.
+        """
+        for target in targets:
+            self.zfs_set_properties(target, properties)
+
+    def zfs_snapshot(self, dataset: str, snapname: str, recursive: bool = False):
+        raise NotImplementedError()
+
+    def zfs_clone(self, snapname: str, dataset: str, properties: Optional[List[str]] = None):
+        """
+        Clone a snapshot, properties are given as 'property=value'.
+        """
+        raise NotImplementedError()
+
+    def zfs_promote(self, dataset: str):
+        raise NotImplementedError()
+
+    def zfs_rename(self, dataset: str, new_dataset: str):
+        raise NotImplementedError()
+
+    def zfs_destroy(self, target: str, recursive: bool = False):
+        """
+        Destroy a dataset or a snapshot, with recursive also destroy
+        children and snapshots of a dataset.
+        """
+        raise NotImplementedError()
+
+    def zfs_destroy_snapshots(self, dataset: str, snapnames: List[str]):
+        """
+        Destroy several snapshots of one dataset in one operation,
+        like 'zfs destroy dataset@a,b,c'.
+        """
+        for snapname in snapnames:
+            self.zfs_destroy(f"{dataset}@{snapname}")
+
+    def zfs_mount(self, dataset: str, mountpoint: Optional[str] = None):
+        """
+        Mount a dataset at its mountpoint property, or temporarily at mountpoint.
+        """
+        raise NotImplementedError()
+
+    def zfs_unmount(self, dataset: str, mountpoint: Optional[str] = None,
+                    recursive: bool = False):
+        """
+        Unmount a dataset, or whatever is mounted at mountpoint. With recursive,
+        also everything mounted below mountpoint, in one call where the system
+        can, 'umount -R' on Linux.
+        """
+        raise NotImplementedError()
+
+    def zpool_get(self, pool: Optional[str] = None,
+                  properties: Optional[List[str]] = None) -> Iterable[List[str]]:
+        """
+        Get pool properties, rows of name, property and value.
+        """
+        raise NotImplementedError()
+
+    def zpool_set(self, pool: str, prop: str):
+        raise NotImplementedError()
+
+    def channel_program(self, pool: str, program: str,
+                        args: Optional[List[str]] = None, readonly: bool = False) -> dict:
+        """
+        Run the Lua channel program in file program on a pool, returning the
+        table it returns. Backends that can't run channel programs raise
+        ChannelProgramUnsupported, callers then take their fallback path. A
+        program that fails raises RuntimeError.
+        """
+        raise ChannelProgramUnsupported(
+            f"Channel programs are not supported by the {self.name} backend\n")
+
+    def mount_table(self) -> List[dict]:
+        """
+        Mounted ZFS datasets, in mount order, e.g.:
+        [{'dataset': 'zpool/ROOT/default', 'mountpoint': '/'}, ...]
+        """
+        raise NotImplementedError()
@@ -0,0 +1,191 @@
+"""
+Backend running the zfs and zpool commands, listings are read as a stream
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+from typing import Iterable, Iterator, List, Optional
+
+import pyzfscmds.cmd
+
+import zedenv.lib.system
+from zedenv.lib.backend.base import Backend, ChannelProgramUnsupported
+
+
+def stream_command(call: List[str]) -> Iterator[List[str]]:
+    """
+    Run a scripted (-H) zfs or zpool command, yielding the columns of each line
+    as it is read from the pipe, so output is never held in memory as a whole.
+    Columns are split on tabs, values such as mountpoints may contain spaces.
+    Raises RuntimeError once the output ends if the command failed.
+    Errors go to a temporary file, a full stderr pipe would block the command
+    while stdout is still being read.
+    """
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        try:
+            process = subprocess.Popen(call, stdout=subprocess.PIPE, stderr=stderr,
+                                       universal_newlines=True)
+        except OSError as e:
+            raise RuntimeError(f"Failed to run '{' '.join(call)}'\n{e}\n")
+
+        finished = False
+        try:
+            for line in process.stdout:
+                yield line.rstrip("\n").split("\t")
+            finished = True
+        finally:
+            if not finished:
+                # Stopped early, nobody reads the rest of the output
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"Failed to run '{' '.join(call)}'\n{stderr.read()}")
+
+
+def list_arguments(flag: str, values: Optional[List[str]]) -> List[str]:
+    return [flag, ",".join(values)] if values else []
+
+
+class CommandBackend(Backend):
+    """
+    Each operation runs one zfs or zpool command.
+    """
+
+    name = "command"
+    channel_programs = True
+
+    def zfs_list(self, target: Optional[str] = None,
+                 recursive: bool = False,
+                 depth: Optional[int] = None,
+                 columns: Optional[List[str]] = None,
+                 zfs_types: Optional[List[str]] = None,
+                 sort_properties_ascending: Optional[List[str]] = None,
+                 sort_properties_descending: Optional[List[str]] = None) -> Iterable[List[str]]:
+        call = ["zfs", "list", "-H", "-p"]
+        if recursive:
+            call.append("-r")
+        if depth is not None:
+            call.extend(["-d", str(depth)])
+        call.extend(list_arguments("-o", columns or ["name"]))
+        call.extend(list_arguments("-t", zfs_types))
+        for prop in (sort_properties_ascending or []):
+            call.extend(["-s", prop])
+        for prop in (sort_properties_descending or []):
+            call.extend(["-S", prop])
+        if target is not None:
+            call.append(target)
+
+        return stream_command(call)
+
+    def zfs_get(self, target: str,
+                properties: Optional[List[str]] = None,
+                recursive: bool = False,
+                depth: Optional[int] = None,
+                columns: Optional[List[str]] = None,
+                source: Optional[List[str]] = None,
+                zfs_types: Optional[List[str]] = None) -> Iterable[List[str]]:
+        call = ["zfs", "get", "-H", "-p"]
+        if recursive:
+            call.append("-r")
+        if depth is not None:
+            call.extend(["-d", str(depth)])
+        call.extend(list_arguments("-o", columns or ["name", "property", "value", "source"]))
+        call.extend(list_arguments("-t", zfs_types))
+        call.extend(list_arguments("-s", source))
+        call.extend([",".join(properties or ["all"]), target])
+
+        return stream_command(call)
+
+    def zfs_set(self, target: str, prop: str):
+        pyzfscmds.cmd.zfs_set(target, prop)
+
+    def zfs_set_properties(self, target: str, properties: List[str]):
+        # One 'zfs set' applies all of them in a single transaction
+        list(stream_command(["zfs", "set"] + list(properties) + [target]))
+
+    def zfs_set_datasets(self, targets: List[str], properties: List[str]):
+        list(stream_command(["zfs", "set"] + list(properties) + list(targets)))
+
+    def zfs_snapshot(self, dataset: str, snapname: str, recursive: bool = False):
+        pyzfscmds.cmd.zfs_snapshot(dataset, snapname, recursive=recursive)
+
+    def zfs_clone(self, snapname: str, dataset: str, properties: Optional[List[str]] = None):
+        pyzfscmds.cmd.zfs_clone(snapname, dataset, properties=properties)
+
+    def zfs_promote(self, dataset: str):
+        pyzfscmds.cmd.zfs_promote(dataset)
+
+    def zfs_rename(self, dataset: str, new_dataset: str):
+        pyzfscmds.cmd.zfs_rename(dataset, new_dataset)
+
+    def zfs_destroy(self, target: str, recursive: bool = False):
+        if "@" in target:
+            pyzfscmds.cmd.zfs_destroy_snapshot(target)
+        else:
+            pyzfscmds.cmd.zfs_destroy(target, recursive_children=recursive)
+
+    def zfs_destroy_snapshots(self, dataset: str, snapnames: List[str]):
+        list(stream_command(["zfs", "destroy", f"{dataset}@{','.join(snapnames)}"]))
+
+    def zfs_mount(self, dataset: str, mountpoint: Optional[str] = None):
+        if mountpoint:
+            zedenv.lib.system.zfs_manual_mount(dataset, mountpoint)
+        else:
+            pyzfscmds.cmd.zfs_mount(dataset)
+
+    def zfs_unmount(self, dataset: str, mountpoint: Optional[str] = None,
+                    recursive: bool = False):
+        if mountpoint and recursive:
+            zedenv.lib.system.umount(mountpoint, call_args=["-R"])
+        elif mountpoint:
+            zedenv.lib.system.umount(mountpoint)
+        else:
+            pyzfscmds.cmd.zfs_unmount(dataset)
+
+    def zpool_get(self, pool: Optional[str] = None,
+                  properties: Optional[List[str]] = None) -> Iterable[List[str]]:
+        call = ["zpool", "get", "-H", "-o", "name,property,value",
+                ",".join(properties or ["all"])]
+        if pool is not None:
+            call.append(pool)
+
+        return stream_command(call)
+
+    def zpool_set(self, pool: str, prop: str):
+        pyzfscmds.cmd.zpool_set(pool, prop)
+
+    def channel_program(self, pool: str, program: str,
+                        args: Optional[List[str]] = None, readonly: bool = False) -> dict:
+        if os.geteuid() != 0:
+            # 'zfs program' is only allowed for root, don't run it to find out
+            raise ChannelProgramUnsupported("Channel programs can only be run as root\n")
+
+        call = ["zfs", "program", "-j"]
+        if readonly:
+            call.append("-n")
+        call.extend([pool, program] + (args or []))
+
+        try:
+            result = subprocess.run(call, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+        except OSError as e:
+            raise ChannelProgramUnsupported(f"Failed to run '{' '.join(call)}'\n{e}\n")
+        if result.returncode != 0:
+            if "unrecognized command 'program'" in result.stderr:
+                # zfs older than 0.8
+                raise ChannelProgramUnsupported(
+                    f"Failed to run '{' '.join(call)}'\n{result.stderr}")
+            raise RuntimeError(f"Failed to run '{' '.join(call)}'\n{result.stderr}")
+
+        try:
+            return json.loads(result.stdout)["return"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise RuntimeError(f"Unexpected output from '{' '.join(call)}'\n{e}\n")
+
+    def mount_table(self) -> List[dict]:
+        return zedenv.lib.system.zfs_mount_table()
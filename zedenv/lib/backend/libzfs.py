@@ -0,0 +1,234 @@
+"""
+Backend calling libzfs_core through the pyzfs bindings, no fork per operation
+"""
+
+import os
+from typing import Iterable, List, Optional
+
+import zedenv.lib.backend.command
+from zedenv.lib.backend.base import Backend
+
+try:
+    import libzfs_core
+    import libzfs_core.exceptions
+except ImportError:
+    libzfs_core = None
+
+
+def available() -> bool:
+    return libzfs_core is not None
+
+
+def decode(value):
+    """
+    Convert the bytes in an nvlist returned by libzfs_core to strings.
+    """
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, dict):
+        return {decode(k): decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+class LibZFSCoreBackend(Backend):
+    """
+    Snapshot, clone, promote, rename, destroy and property changes are made
+    with libzfs_core ioctls. Anything libzfs_core has no call for, listing,
+    reading properties and mounting, goes to the fallback backend, the
+    command backend by default.
+    """
+
+    name = "libzfs_core"
+    channel_programs = True
+
+    # Properties libzfs_core accepts as strings, index properties
+    # like canmount need the value translated first
+    index_properties = {
+        "canmount": {"off": 0, "on": 1, "noauto": 2},
+    }
+    string_properties = ("mountpoint",)
+
+    def __init__(self, fallback: Optional[Backend] = None):
+        if libzfs_core is None:
+            raise RuntimeError("The libzfs_core python bindings (pyzfs) are not installed\n")
+
+        self.fallback = fallback or zedenv.lib.backend.command.CommandBackend()
+
+    def native_properties(self, properties: List[str]) -> Optional[dict]:
+        """
+        Convert 'property=value' strings to a libzfs_core property dict,
+        None if any of them can't be passed natively.
+        """
+        native = {}
+        for p in properties:
+            prop, value = p.split("=", 1)
+            if ":" in prop or prop in self.string_properties:
+                native[prop.encode()] = value.encode()
+            elif value in self.index_properties.get(prop, {}):
+                native[prop.encode()] = self.index_properties[prop][value]
+            else:
+                return None
+
+        return native
+
+    def zfs_list(self, target: Optional[str] = None, **kwargs) -> Iterable[List[str]]:
+        return self.fallback.zfs_list(target, **kwargs)
+
+    def zfs_get(self, target: str, **kwargs) -> Iterable[List[str]]:
+        return self.fallback.zfs_get(target, **kwargs)
+
+    def zfs_set(self, target: str, prop: str):
+        native = self.native_properties([prop])
+        if native is None or not libzfs_core.is_supported(libzfs_core.lzc_set_props):
+            self.fallback.zfs_set(target, prop)
+            return
+
+        (name, value), = native.items()
+        try:
+            libzfs_core.lzc_set_props(target.encode(), name, value)
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to set '{prop}' on {target}\n{e}\n")
+
+    def zfs_set_properties(self, target: str, properties: List[str]):
+        native = self.native_properties(properties)
+        if native is None or len(native) > 1 or not libzfs_core.is_supported(
+                libzfs_core.lzc_set_props):
+            # lzc_set_props sets one property, 'zfs set' checks all of them first
+            self.fallback.zfs_set_properties(target, properties)
+            return
+
+        for name, value in native.items():
+            try:
+                libzfs_core.lzc_set_props(target.encode(), name, value)
+            except libzfs_core.exceptions.ZFSError as e:
+                raise RuntimeError(f"Failed to set '{name.decode()}' on {target}\n{e}\n")
+
+    def zfs_set_datasets(self, targets: List[str], properties: List[str]):
+        native = self.native_properties(properties)
+        if native is None or len(native) > 1:
+            # One command for all of them beats one per dataset
+            self.fallback.zfs_set_datasets(targets, properties)
+            return
+
+        for target in targets:
+            self.zfs_set_properties(target, properties)
+
+    def zfs_snapshot(self, dataset: str, snapname: str, recursive: bool = False):
+        sources = [dataset]
+        if recursive:
+            sources = [d[0] for d in self.fallback.zfs_list(
+                dataset, recursive=True, zfs_types=["filesystem", "volume"])]
+
+        if not libzfs_core.is_supported(libzfs_core.lzc_snapshot):
+            self.fallback.zfs_snapshot(dataset, snapname, recursive=recursive)
+            return
+
+        try:
+            # All snapshots are taken atomically in one transaction
+            libzfs_core.lzc_snapshot([f"{s}@{snapname}".encode() for s in sources])
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to snapshot {dataset}@{snapname}\n{e}\n")
+
+    def zfs_clone(self, snapname: str, dataset: str, properties: Optional[List[str]] = None):
+        native = self.native_properties(properties or [])
+        if native is None or not libzfs_core.is_supported(libzfs_core.lzc_clone):
+            self.fallback.zfs_clone(snapname, dataset, properties=properties)
+            return
+
+        try:
+            libzfs_core.lzc_clone(dataset.encode(), snapname.encode(), native)
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to clone {snapname} to {dataset}\n{e}\n")
+
+    def zfs_promote(self, dataset: str):
+        if not libzfs_core.is_supported(libzfs_core.lzc_promote):
+            self.fallback.zfs_promote(dataset)
+            return
+
+        try:
+            libzfs_core.lzc_promote(dataset.encode())
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to promote {dataset}\n{e}\n")
+
+    def zfs_rename(self, dataset: str, new_dataset: str):
+        if not libzfs_core.is_supported(libzfs_core.lzc_rename):
+            self.fallback.zfs_rename(dataset, new_dataset)
+            return
+
+        try:
+            libzfs_core.lzc_rename(dataset.encode(), new_dataset.encode())
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to rename {dataset} to {new_dataset}\n{e}\n")
+
+    def zfs_destroy(self, target: str, recursive: bool = False):
+        if recursive:
+            # 'zfs destroy -r' unmounts and orders children, libzfs_core doesn't
+            self.fallback.zfs_destroy(target, recursive=recursive)
+            return
+
+        snapshot = "@" in target
+        destroy = libzfs_core.lzc_destroy_snaps if snapshot else libzfs_core.lzc_destroy
+        if not libzfs_core.is_supported(destroy):
+            self.fallback.zfs_destroy(target)
+            return
+
+        try:
+            if snapshot:
+                destroy([target.encode()], defer=False)
+            else:
+                destroy(target.encode())
+        except libzfs_core.exceptions.DatasetBusy:
+            # Mounted, let zfs unmount it first
+            self.fallback.zfs_destroy(target)
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to destroy {target}\n{e}\n")
+
+    def zfs_destroy_snapshots(self, dataset: str, snapnames: List[str]):
+        if not libzfs_core.is_supported(libzfs_core.lzc_destroy_snaps):
+            self.fallback.zfs_destroy_snapshots(dataset, snapnames)
+            return
+
+        try:
+            libzfs_core.lzc_destroy_snaps(
+                [f"{dataset}@{s}".encode() for s in snapnames], defer=False)
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(
+                f"Failed to destroy {dataset}@{','.join(snapnames)}\n{e}\n")
+
+    def zfs_mount(self, dataset: str, mountpoint: Optional[str] = None):
+        self.fallback.zfs_mount(dataset, mountpoint=mountpoint)
+
+    def zfs_unmount(self, dataset: str, mountpoint: Optional[str] = None,
+                    recursive: bool = False):
+        self.fallback.zfs_unmount(dataset, mountpoint=mountpoint, recursive=recursive)
+
+    def zpool_get(self, pool: Optional[str] = None,
+                  properties: Optional[List[str]] = None) -> Iterable[List[str]]:
+        return self.fallback.zpool_get(pool, properties=properties)
+
+    def zpool_set(self, pool: str, prop: str):
+        self.fallback.zpool_set(pool, prop)
+
+    def channel_program(self, pool: str, program: str,
+                        args: Optional[List[str]] = None, readonly: bool = False) -> dict:
+        run = (libzfs_core.lzc_channel_program_nosync if readonly
+               else libzfs_core.lzc_channel_program)
+        if os.geteuid() != 0 or not libzfs_core.is_supported(run):
+            # The command backend knows when it can't be run at all
+            return self.fallback.channel_program(pool, program, args=args, readonly=readonly)
+
+        with open(program, "rb") as f:
+            source = f.read()
+
+        try:
+            result = run(pool.encode(), source,
+                         params={b"argv": [a.encode() for a in (args or [])]})
+        except libzfs_core.exceptions.ZFSError as e:
+            raise RuntimeError(f"Failed to run channel program {program} on {pool}\n{e}\n")
+
+        return decode(result).get("return")
+
+    def mount_table(self) -> List[dict]:
+        return self.fallback.mount_table()
@@ -0,0 +1,431 @@
+"""
+Backend keeping datasets in memory, used to test and benchmark without a pool
+"""
+
+import posixpath
+from typing import Dict, Iterable, List, Optional
+
+from zedenv.lib.backend.base import Backend
+
+
+class MemoryBackend(Backend):
+    """
+    Simulates the zfs and zpool commands on datasets held in dictionaries.
+
+    The rules zedenv depends on are followed, properties are inherited,
+    snapshots with dependent clones can't be destroyed and promote moves
+    snapshots to the clone. Datasets are added with create(), every
+    operation afterwards is recorded in 'calls' as (operation, target).
+    """
+
+    name = "memory"
+
+    readonly_properties = ("name", "type", "origin", "creation")
+    space_properties = ("used", "usedds", "usedbysnapshots", "usedrefreserv", "refer")
+    default_properties = {
+        "canmount": "on",
+        "atime": "on",
+        "compression": "off",
+        "readonly": "off",
+    }
+    default_pool_properties = {"bootfs": "-", "altroot": "-"}
+
+    def __init__(self):
+        self.datasets: Dict[str, dict] = {}
+        self.pools: Dict[str, Dict[str, str]] = {}
+        self.mounts: List[dict] = []
+        self.calls: List[tuple] = []
+        self._creation = 1526944000
+
+    # Setup
+
+    def create(self, name: str,
+               zfs_type: str = "filesystem",
+               origin: str = "-",
+               properties: Optional[dict] = None,
+               space: Optional[dict] = None):
+        """
+        Add a dataset, a name without '/' also creates the pool.
+        """
+        if name in self.datasets:
+            raise RuntimeError(f"cannot create '{name}': dataset already exists")
+
+        parent = name.split("@")[0] if "@" in name else posixpath.dirname(name)
+        if parent and parent not in self.datasets:
+            raise RuntimeError(f"cannot create '{name}': parent does not exist")
+
+        if not parent:
+            self.pools[name] = dict(self.default_pool_properties)
+
+        self._creation += 1
+        self.datasets[name] = {
+            "type": zfs_type,
+            "origin": origin,
+            "creation": self._creation,
+            "properties": dict(properties or {}),
+            "space": dict(space or {}),
+        }
+
+    def _check_exists(self, target: str, operation: str):
+        if target not in self.datasets:
+            raise RuntimeError(f"cannot {operation} '{target}': dataset does not exist")
+
+    def _descendants(self, dataset: str, depth: Optional[int] = None) -> List[str]:
+        """
+        The dataset and everything below it, depth counted as in 'zfs list -d'.
+        """
+        names = []
+        for name in self.datasets:
+            relative = name[len(dataset):]
+            if name.startswith(dataset) and relative[:1] in ("", "/", "@"):
+                fs_relative, snapshot_sep, _ = relative.partition("@")
+                if depth is None or fs_relative.count("/") + len(snapshot_sep) <= depth:
+                    names.append(name)
+
+        return names
+
+    def _order(self, name: str) -> tuple:
+        """
+        Order of 'zfs list', a dataset, its snapshots by creation, then children.
+        """
+        fs_name, snapshot_sep, snapname = name.partition("@")
+        return (fs_name.split("/"), len(snapshot_sep), self.datasets[name]["creation"], snapname)
+
+    def _property(self, name: str, prop: str) -> tuple:
+        """
+        Value and source of a property, as printed by 'zfs get -p'.
+        """
+        ds = self.datasets[name]
+        if prop == "name":
+            return name, "-"
+        if prop in ("type", "origin"):
+            return ds[prop], "-"
+        if prop == "creation":
+            return str(ds["creation"]), "-"
+        if prop == "clones":
+            if ds["type"] != "snapshot":
+                return "-", "-"
+            return ",".join(sorted(n for n, d in self.datasets.items()
+                                   if d["origin"] == name)), "-"
+        if prop in self.space_properties:
+            return str(ds["space"].get(prop, 0)), "-"
+        if prop in ds["properties"]:
+            return ds["properties"][prop], "local"
+
+        if ds["type"] == "snapshot":
+            if prop in ("mountpoint", "canmount"):
+                return "-", "-"
+            # Snapshots inherit from their dataset
+            ancestor = name.split("@")[0]
+        else:
+            ancestor = posixpath.dirname(name)
+
+        if prop == "mountpoint" or ":" in prop:
+            while ancestor:
+                local = self.datasets[ancestor]["properties"]
+                if prop in local:
+                    value = local[prop]
+                    if prop == "mountpoint" and value not in ("none", "legacy"):
+                        value = posixpath.join(value, name[len(ancestor):].lstrip("/"))
+                    return value, f"inherited from {ancestor}"
+                ancestor = posixpath.dirname(ancestor)
+
+            if prop == "mountpoint":
+                return f"/{name}", "default"
+            return "-", "-"
+
+        if prop in self.default_properties:
+            return self.default_properties[prop], "default"
+
+        return "-", "-"
+
+    def _all_properties(self, name: str) -> List[str]:
+        props = ["type", "creation", *self.space_properties, "origin", "mountpoint",
+                 *self.default_properties]
+        fs_name = name.split("@")[0]
+        for ancestor in [n for n in self.datasets if n == fs_name or name.startswith(f"{n}/")]:
+            props.extend(p for p in self.datasets[ancestor]["properties"] if p not in props)
+
+        return props
+
+    # Backend
+
+    def zfs_list(self, target: Optional[str] = None,
+                 recursive: bool = False,
+                 depth: Optional[int] = None,
+                 columns: Optional[List[str]] = None,
+                 zfs_types: Optional[List[str]] = None,
+                 sort_properties_ascending: Optional[List[str]] = None,
+                 sort_properties_descending: Optional[List[str]] = None) -> Iterable[List[str]]:
+        self.calls.append(("list", target))
+        zfs_types = zfs_types or ["filesystem", "volume"]
+
+        if target is not None:
+            self._check_exists(target, "list")
+
+        if target is not None and not recursive and depth is None:
+            names = [target]
+        else:
+            roots = [target] if target is not None else list(self.pools)
+            names = [n for r in roots for n in self._descendants(r, depth)
+                     if self.datasets[n]["type"] in zfs_types]
+
+        names.sort(key=self._order)
+        for prop in (sort_properties_ascending or []):
+            names.sort(key=lambda n: self._sort_value(n, prop))
+        for prop in (sort_properties_descending or []):
+            names.sort(key=lambda n: self._sort_value(n, prop), reverse=True)
+
+        return [[self._property(n, c)[0] for c in (columns or ["name"])] for n in names]
+
+    def _sort_value(self, name: str, prop: str) -> tuple:
+        value = self._property(name, prop)[0]
+        return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+    def zfs_get(self, target: str,
+                properties: Optional[List[str]] = None,
+                recursive: bool = False,
+                depth: Optional[int] = None,
+                columns: Optional[List[str]] = None,
+                source: Optional[List[str]] = None,
+                zfs_types: Optional[List[str]] = None) -> Iterable[List[str]]:
+        self.calls.append(("get", target))
+        self._check_exists(target, "get")
+        columns = columns or ["name", "property", "value", "source"]
+
+        if recursive or depth is not None:
+            names = sorted(self._descendants(target, depth), key=self._order)
+        else:
+            names = [target]
+        if zfs_types:
+            names = [n for n in names if self.datasets[n]["type"] in zfs_types]
+
+        rows = []
+        for name in names:
+            props = properties or ["all"]
+            if "all" in props:
+                props = self._all_properties(name)
+            for prop in props:
+                value, prop_source = self._property(name, prop)
+                category = "none" if prop_source == "-" else prop_source.split(" ")[0]
+                if source is None or category in source:
+                    row = {"name": name, "property": prop, "value": value, "source": prop_source}
+                    rows.append([row[c] for c in columns])
+
+        return rows
+
+    def zfs_set(self, target: str, prop: str):
+        self.zfs_set_properties(target, [prop])
+
+    def zfs_set_properties(self, target: str, properties: List[str]):
+        self.zfs_set_datasets([target], properties)
+
+    def zfs_set_datasets(self, targets: List[str], properties: List[str]):
+        self.calls.append(("set", " ".join(targets)))
+
+        # All are checked before any is set
+        for target in targets:
+            self._check_exists(target, "set property on")
+            for prop in properties:
+                name = prop.split("=", 1)[0]
+                if name in self.readonly_properties or name in self.space_properties:
+                    raise RuntimeError(
+                        f"cannot set property for '{target}': '{name}' is readonly")
+                if self.datasets[target]["type"] == "snapshot" and ":" not in name:
+                    raise RuntimeError(
+                        f"cannot set property for '{target}': this property can not be "
+                        "modified for snapshots")
+
+        for target in targets:
+            for prop in properties:
+                name, value = prop.split("=", 1)
+                self.datasets[target]["properties"][name] = value
+                if name == "mountpoint":
+                    self._move_mounts(target)
+
+    def _move_mounts(self, target: str):
+        # Mounts that follow the mountpoint property move with it
+        for mount in [m for m in self.mounts if not m["temporary"]]:
+            if mount["dataset"] in self._descendants(target):
+                mountpoint = self._property(mount["dataset"], "mountpoint")[0]
+                if mountpoint in ("none", "legacy"):
+                    self.mounts.remove(mount)
+                else:
+                    mount["mountpoint"] = mountpoint
+
+    def zfs_snapshot(self, dataset: str, snapname: str, recursive: bool = False):
+        self.calls.append(("snapshot", f"{dataset}@{snapname}"))
+        self._check_exists(dataset, "snapshot")
+
+        sources = self._descendants(dataset) if recursive else [dataset]
+        sources = sorted((s for s in sources if self.datasets[s]["type"] != "snapshot"),
+                         key=self._order)
+        for name in sources:
+            if f"{name}@{snapname}" in self.datasets:
+                raise RuntimeError(
+                    f"cannot create snapshot '{name}@{snapname}': dataset already exists")
+
+        for name in sources:
+            self.create(f"{name}@{snapname}", zfs_type="snapshot")
+
+    def zfs_clone(self, snapname: str, dataset: str, properties: Optional[List[str]] = None):
+        self.calls.append(("clone", dataset))
+        self._check_exists(snapname, "clone")
+        if self.datasets[snapname]["type"] != "snapshot":
+            raise RuntimeError(f"cannot clone '{snapname}': not a snapshot")
+
+        self.create(dataset,
+                    zfs_type=self.datasets[snapname.split("@")[0]]["type"],
+                    origin=snapname,
+                    properties=dict(p.split("=", 1) for p in (properties or [])),
+                    space={"refer": self.datasets[snapname]["space"].get("refer", 0)})
+
+    def zfs_promote(self, dataset: str):
+        self.calls.append(("promote", dataset))
+        self._check_exists(dataset, "promote")
+
+        origin = self.datasets[dataset]["origin"]
+        if origin == "-":
+            raise RuntimeError(f"cannot promote '{dataset}': not a cloned filesystem")
+
+        origin_dataset = origin.split("@")[0]
+        origin_creation = self.datasets[origin]["creation"]
+        snapshots = [n for n in self._descendants(origin_dataset, depth=1)
+                     if self.datasets[n]["type"] == "snapshot"]
+        moved = [n for n in snapshots if self.datasets[n]["creation"] <= origin_creation]
+
+        for name in moved:
+            if f"{dataset}@{name.split('@')[1]}" in self.datasets:
+                raise RuntimeError(
+                    f"cannot promote '{dataset}': snapshot {name.split('@')[1]} already exists")
+
+        origin_origin = self.datasets[origin_dataset]["origin"]
+        for name in moved:
+            self._rename_entry(name, f"{dataset}@{name.split('@')[1]}")
+
+        self.datasets[dataset]["origin"] = origin_origin
+        self.datasets[origin_dataset]["origin"] = f"{dataset}@{origin.split('@')[1]}"
+
+    def _rename_entry(self, name: str, new_name: str):
+        self.datasets[new_name] = self.datasets.pop(name)
+        for ds in self.datasets.values():
+            if ds["origin"] == name:
+                ds["origin"] = new_name
+        for mount in self.mounts:
+            if mount["dataset"] == name:
+                mount["dataset"] = new_name
+
+    def zfs_rename(self, dataset: str, new_dataset: str):
+        self.calls.append(("rename", dataset))
+        self._check_exists(dataset, "rename")
+        if new_dataset in self.datasets:
+            raise RuntimeError(f"cannot rename to '{new_dataset}': dataset already exists")
+
+        if "@" in dataset:
+            self._rename_entry(dataset, new_dataset)
+            return
+
+        if posixpath.dirname(new_dataset) not in self.datasets:
+            raise RuntimeError(f"cannot rename to '{new_dataset}': parent does not exist")
+
+        for name in self._descendants(dataset):
+            self._rename_entry(name, f"{new_dataset}{name[len(dataset):]}")
+
+    def zfs_destroy(self, target: str, recursive: bool = False):
+        self.calls.append(("destroy", target))
+        self._check_exists(target, "destroy")
+
+        victims = set(self._descendants(target)) if "@" not in target else {target}
+        if len(victims) > 1 and not recursive:
+            raise RuntimeError(f"cannot destroy '{target}': filesystem has children")
+
+        dependents = [n for n, ds in self.datasets.items()
+                      if ds["origin"] in victims and n not in victims]
+        if dependents:
+            raise RuntimeError(
+                f"cannot destroy '{target}': snapshot has dependent clones\n"
+                f"{', '.join(sorted(dependents))}")
+
+        self.mounts = [m for m in self.mounts if m["dataset"] not in victims]
+        for name in victims:
+            del self.datasets[name]
+
+    def zfs_destroy_snapshots(self, dataset: str, snapnames: List[str]):
+        target = f"{dataset}@{','.join(snapnames)}"
+        self.calls.append(("destroy", target))
+
+        victims = [f"{dataset}@{s}" for s in snapnames]
+        for name in victims:
+            self._check_exists(name, "destroy")
+            dependents = [n for n, ds in self.datasets.items() if ds["origin"] == name]
+            if dependents:
+                raise RuntimeError(
+                    f"cannot destroy '{name}': snapshot has dependent clones\n"
+                    f"{', '.join(sorted(dependents))}")
+
+        for name in victims:
+            del self.datasets[name]
+
+    def zfs_mount(self, dataset: str, mountpoint: Optional[str] = None):
+        self.calls.append(("mount", dataset))
+        self._check_exists(dataset, "mount")
+
+        if any(m["dataset"] == dataset for m in self.mounts):
+            raise RuntimeError(f"cannot mount '{dataset}': filesystem already mounted")
+
+        temporary = mountpoint is not None
+        if not temporary:
+            mountpoint = self._property(dataset, "mountpoint")[0]
+            if mountpoint in ("none", "legacy", "-"):
+                raise RuntimeError(f"cannot mount '{dataset}': no mountpoint set")
+            if self._property(dataset, "canmount")[0] == "off":
+                raise RuntimeError(
+                    f"cannot mount '{dataset}': 'canmount' property is set to 'off'")
+
+        self.mounts.append({"dataset": dataset, "mountpoint": mountpoint, "temporary": temporary})
+
+    def zfs_unmount(self, dataset: str, mountpoint: Optional[str] = None,
+                    recursive: bool = False):
+        self.calls.append(("unmount", mountpoint or dataset))
+
+        key, value = ("mountpoint", mountpoint) if mountpoint else ("dataset", dataset)
+        matching = [m for m in self.mounts if m[key] == value]
+        if not matching:
+            raise RuntimeError(f"cannot unmount '{value}': not currently mounted")
+
+        if recursive and mountpoint:
+            self.mounts = [m for m in self.mounts
+                           if not m["mountpoint"].startswith(f"{mountpoint.rstrip('/')}/")]
+        self.mounts.remove(matching[-1])
+
+    def zpool_get(self, pool: Optional[str] = None,
+                  properties: Optional[List[str]] = None) -> Iterable[List[str]]:
+        self.calls.append(("zpool get", pool))
+
+        if pool is not None and pool not in self.pools:
+            raise RuntimeError(f"cannot open '{pool}': no such pool")
+
+        rows = []
+        for name in ([pool] if pool is not None else sorted(self.pools)):
+            props = properties or ["all"]
+            if "all" in props:
+                props = list(self.pools[name])
+            rows.extend([name, p, self.pools[name].get(p, "-")] for p in props)
+
+        return rows
+
+    def zpool_set(self, pool: str, prop: str):
+        self.calls.append(("zpool set", pool))
+
+        if pool not in self.pools:
+            raise RuntimeError(f"cannot open '{pool}': no such pool")
+
+        name, value = prop.split("=", 1)
+        if name == "bootfs" and value not in self.datasets:
+            raise RuntimeError(f"cannot set property for '{pool}': '{value}' is an invalid name")
+
+        self.pools[pool][name] = value
+
+    def mount_table(self) -> List[dict]:
+        self.calls.append(("mount table", None))
+        return [{"dataset": m["dataset"], "mountpoint": m["mountpoint"]} for m in self.mounts]
@@ -3,38 +3,18 @@ Functions for common boot environment tasks
 """
 
 import datetime
-import pyzfscmds.check
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
+import os
 import pyzfscmds.utility as zfs_utility
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, Iterator
 
 import zedenv.lib.check
+import zedenv.lib.configure
+import zedenv.lib.inventory
+import zedenv.lib.runner
 import zedenv.lib.system
+from zedenv.lib.backend.base import ChannelProgramUnsupported
 from zedenv.lib.logger import ZELogger
 
-"""
-# TODO: Normalize based on size suffix.
-def normalize(value):
-    normalized = 1
-    return normalized
-"""
-
-"""
-# TODO: Write function to get size
-def size(boot_environment) -> int:
-    # Space calculation:
-    # https://github.com/vermaden/beadm/blob/
-    # 60f8d4de7b0a0a59360f631816d36cfefcc86b75/beadm#L389-L421
-
-    if not zfs_utility.is_clone(boot_environment):
-        used = pyzfscmds.cmd.zfs_get(boot_environment,
-                       properties=["used"],
-                       columns=["value"])
-
-    return 1
-"""
-
 
 def bootfs_for_pool(zpool: str) -> str:
     """
@@ -42,73 +22,149 @@ def bootfs_for_pool(zpool: str) -> str:
     :param zpool: Pool to get bootfs of.
     :return: The name of the 'bootfs' dataset.
     """
-    bootfs_list = None
-    try:
-        bootfs_list = pyzfscmds.cmd.zpool_get(pool=zpool,
-                                              scripting=True,
-                                              properties=["bootfs"],
-                                              columns=["value"])
-    except RuntimeError:
-        raise
+    bootfs = zedenv.lib.inventory.inventory().pool_property(zpool, "bootfs")
 
-    bootfs = [i.split()[0] for i in bootfs_list.splitlines() if i.split()[0] != "-"]
-    if not bootfs:
+    if bootfs is None or bootfs == "-" or bootfs == "":
         raise RuntimeError("No bootfs has been set on zpool")
 
-    return bootfs[0]
+    return bootfs
+
+
+def clone_properties(dataset_properties: list,
+                     appended_properties: Optional[list],
+                     altroot: Optional[str]) -> list:
+    """
+    Take [property, value] pairs and convert them to a list of property=value
+    strings, with appended properties replacing any existing value.
+    """
+    appended_properties = appended_properties or []
+    remove_props = [rp[0] for rp in appended_properties]
+    used_props = ["=".join(p) for p in dataset_properties if p[0] not in remove_props]
+
+    used_props.extend(["=".join(pa) for pa in appended_properties])
+
+    # Make sure that the mountpoint is correct even if we are in a chroot environment.
+    # In this case, the ZFS pool is mounted with an alternative root (e.g. to `/mnt`).
+    if altroot is None:
+        altroot = '-'
+
+    if altroot.strip() != '-':
+        # Search and remove the alternative root at the beginning of the mountpoint
+        for i, p in enumerate(used_props):
+            prop, val = p.split("=", 1)
+            if prop != "mountpoint":
+                continue
+
+            alt_len, mp_len = len(altroot), len(val)
+            if (mp_len >= alt_len) and (val[:alt_len] == altroot):
+                used_props[i] = "mountpoint=/" + val[alt_len:].lstrip("/")
+
+    return used_props
+
+
+def pool_altroot(dataset: str) -> Optional[str]:
+    altroot = None
+    try:
+        altroot = zedenv.lib.inventory.inventory().pool_property(
+            dataset.split("/")[0], "altroot")
+    except RuntimeError:
+        ZELogger.log({
+            "level": "EXCEPTION",
+            "message": f"Failed to get properties of '{dataset}'"
+        }, exit_on_error=True)
+
+    return altroot
 
 
 def properties(dataset, appended_properties: Optional[list]) -> list:
     dataset_properties = None
     try:
-        dataset_properties = pyzfscmds.cmd.zfs_get(dataset,
-                                                   columns=["property", "value"],
-                                                   source=["local", "received"],
-                                                   properties=["all"])
+        dataset_properties = list(zfs_get(dataset,
+                                          columns=["property", "value"],
+                                          source=["local", "received"],
+                                          properties=["all"]))
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Failed to get properties of '{dataset}'"
         }, exit_on_error=True)
 
+    return clone_properties(dataset_properties,
+                            appended_properties,
+                            pool_altroot(dataset))
+
+
+def subtree_properties(dataset: str, appended_properties: Optional[list]) -> Dict[str, list]:
     """
-    Take each line of output containing properties and convert
-    it to a list of property=value strings
+    Bulk variant of properties(), local and received properties of a dataset
+    and all of its children are read with one recursive 'zfs get'.
+    Returns property=value lists by dataset name.
     """
-    dp = [line.split() for line in dataset_properties.splitlines()]
-    remove_props = [rp[0] for rp in appended_properties]
-    used_props = ["=".join(p) for p in dp if p[0] not in remove_props]
-
-    used_props.extend(["=".join(pa) for pa in appended_properties])
+    inventory = zedenv.lib.inventory.inventory()
+    dataset_properties = {
+        n: [] for n in inventory.children(dataset, zfs_type=None)
+        if inventory.datasets[n]['type'] != 'snapshot'
+    }
 
-    # Make sure that the mountpoint is correct even if we are in a chroot environment.
-    # In this case, the ZFS pool is mounted with an alternative root (e.g. to `/mnt`).
-    rpool = zedenv.lib.be.dataset_pool(dataset)
-    altroot = None
     try:
-        altroot = pyzfscmds.cmd.zpool_get(
-            rpool, columns=["value"], properties=["altroot"])
+        for line in zfs_get(dataset,
+                            recursive=True,
+                            columns=["name", "property", "value"],
+                            source=["local", "received"],
+                            properties=["all"],
+                            zfs_types=["filesystem", "volume"]):
+            dataset_properties.setdefault(line[0], []).append(line[1:])
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
             "message": f"Failed to get properties of '{dataset}'"
         }, exit_on_error=True)
 
-    if altroot.strip() != '-':
-        # Search and remove the alternative root at the beginning of the mountpoint
-        for i, p in enumerate(used_props):
-            prop, val = p.split("=")
-            if prop != "mountpoint":
-                continue
+    # Each pool only needs its altroot once
+    altroots = {}
+    subtree_props = {}
+    for name, dp in dataset_properties.items():
+        pool = name.split("/")[0]
+        if pool not in altroots:
+            altroots[pool] = pool_altroot(name)
+        subtree_props[name] = clone_properties(dp, appended_properties, altroots[pool])
 
-            alt_len, mp_len = len(altroot), len(val)
-            if (mp_len >= alt_len) and (val[:alt_len] == altroot):
-                mountpoint = "mountpoint=/"
-                if mp_len != alt_len:
-                    mountpoint = mountpoint + val[alt_len:]
-                used_props[i] = mountpoint
+    return subtree_props
 
-    return used_props
+
+def clone_plan(source_dataset: str,
+               snap_suffix: str,
+               appended_properties: Optional[list] = None) -> List[dict]:
+    """
+    Plan the clones needed to copy a dataset and its children from the snapshots
+    named 'snap_suffix'. Children and snapshots come from the inventory and
+    properties from one recursive 'zfs get', so planning doesn't make a call per
+    child. Returns the clones parents first, e.g.:
+    [
+        {
+            'snapshot': 'zpool/ROOT/default/var@2018-05-21-16-150000',
+            'properties': ['mountpoint=/var', 'canmount=noauto'],
+            'datasetchild': 'var'
+        }, ...
+    ]
+    Raises RuntimeError naming any snapshots that are missing.
+    """
+    inventory = zedenv.lib.inventory.inventory()
+    subtree = inventory.children(source_dataset, zfs_type=None)
+    datasets = [n for n in subtree if inventory.datasets[n]['type'] != 'snapshot']
+    snapshots = {n for n in subtree if inventory.datasets[n]['type'] == 'snapshot'}
+
+    missing = [f"{d}@{snap_suffix}" for d in datasets if f"{d}@{snap_suffix}" not in snapshots]
+    if missing:
+        raise RuntimeError(f"Failed to find snapshot {', '.join(missing)}.")
+
+    dataset_properties = subtree_properties(source_dataset, appended_properties)
+
+    return [{
+        "snapshot": f"{d}@{snap_suffix}",
+        "properties": dataset_properties[d],
+        "datasetchild": d[len(source_dataset):].lstrip("/")
+    } for d in datasets]
 
 
 def snapshot(boot_environment_name,
@@ -133,14 +189,11 @@ def snapshot(boot_environment_name,
 
     dataset_name = f"{boot_environment_root}/{boot_environment_name}"
 
-    with zedenv.lib.system.setlocale():
-        suffix_time = datetime.datetime.now().strftime(snap_suffix_time_format)
+    suffix_time = datetime.datetime.now().strftime(snap_suffix_time_format)
     full_snap_suffix = f"{snap_prefix}-{suffix_time}" if snap_prefix else suffix_time
 
     try:
-        pyzfscmds.cmd.zfs_snapshot(dataset_name,
-                                   full_snap_suffix,
-                                   recursive=True)
+        zfs_snapshot(dataset_name, full_snap_suffix, recursive=True)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION",
@@ -154,11 +207,11 @@ def root(mount_dataset: str = "/") -> Optional[str]:
     """
     Root of boot environment datasets, e.g. zpool/ROOT
     """
-    mountpoint_dataset = pyzfscmds.system.agnostic.mountpoint_dataset(mount_dataset)
-    if mountpoint_dataset is None:
+    root_dataset = mountpoint_dataset(mount_dataset)
+    if root_dataset is None:
         return None
 
-    return zfs_utility.dataset_parent(mountpoint_dataset)
+    return zfs_utility.dataset_parent(root_dataset)
 
 
 def extra_bpool() -> bool:
@@ -167,22 +220,22 @@ def extra_bpool() -> bool:
 
 
 def mount_pool(mount_dataset: str = "/") -> Optional[str]:
-    mountpoint_dataset = pyzfscmds.system.agnostic.mountpoint_dataset(mount_dataset)
-    if mountpoint_dataset is None:
+    root_dataset = mountpoint_dataset(mount_dataset)
+    if root_dataset is None:
         return None
 
-    return mountpoint_dataset.split("/")[0]
+    return root_dataset.split("/")[0]
 
 
 def dataset_pool(dataset: str, zfs_type: str = 'filesystem') -> Optional[str]:
-    if dataset is None or not pyzfscmds.utility.dataset_exists(dataset, zfs_type=zfs_type):
+    if dataset is None or not dataset_exists(dataset, zfs_type=zfs_type):
         return None
 
     return dataset.split("/")[0]
 
 
 def is_current_boot_environment(boot_environment: str) -> bool:
-    root_dataset = pyzfscmds.system.agnostic.mountpoint_dataset("/")
+    root_dataset = mountpoint_dataset("/")
 
     be_root = root()
     if be_root is None or not (root_dataset == f"{be_root}/{boot_environment}"):
@@ -196,9 +249,101 @@ def is_active_boot_environment(boot_environment_dataset: str, zpool: str) -> boo
     return bootfs_for_pool(zpool) == boot_environment_dataset
 
 
-def split_zfs_output(zfs_list: str) -> list:
-    property_list = [line for line in zfs_list.splitlines()]
-    return [line.split() for line in property_list]
+"""
+Properties that are integers in parsable (-p) output
+"""
+numeric_properties = (
+    "creation", "used", "usedbydataset", "usedds", "usedbysnapshots", "usedsnap",
+    "usedbyrefreservation", "usedrefreserv", "usedbychildren", "usedchild",
+    "referenced", "refer", "available", "avail", "written", "logicalused",
+    "logicalreferenced", "quota", "refquota", "reservation", "refreservation"
+)
+
+
+def zfs_value(prop: str, value: str):
+    """
+    Convert a parsable (-p) value to its type, numeric properties become int,
+    or None if unset, clones becomes a list of names.
+    """
+    if prop == "clones":
+        return [c for c in value.split(",") if c not in ("", "-")]
+
+    if prop in numeric_properties:
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    return value
+
+
+def zfs_records(rows: Iterable[List[str]], columns: List[str]) -> Iterator[dict]:
+    """
+    Typed records from listing rows, converted one at a time as rows arrive.
+    Rows that don't have a value for every column are skipped.
+    """
+    for values in rows:
+        if len(values) == len(columns):
+            yield {c: zfs_value(c, v) for c, v in zip(columns, values)}
+
+
+programs_folder = os.path.join(os.path.dirname(__file__), 'programs')
+
+
+def channel_program(name: str) -> str:
+    """
+    Path of a channel program bundled with zedenv.
+    """
+    return os.path.join(programs_folder, f"{name}.lua")
+
+
+def run_channel_program(zpool: str, name: str, args: List[str],
+                        readonly: bool = False) -> Optional[dict]:
+    """
+    Run a bundled channel program, returning what it returns, or None if
+    channel programs can't be run here so callers can take their fallback path.
+    A program that ran and failed raises RuntimeError, it may have made some
+    of its changes, so falling back could act on a pool it didn't plan for.
+    """
+    backend = zedenv.lib.configure.get_backend()
+    if not backend.channel_programs:
+        return None
+
+    try:
+        result = backend.channel_program(zpool, channel_program(name), args=args,
+                                         readonly=readonly)
+    except ChannelProgramUnsupported:
+        return None
+    finally:
+        if not readonly:
+            zedenv.lib.inventory.inventory().invalidate(mounts=True)
+
+    return result if isinstance(result, dict) else None
+
+
+def channel_inventory(dataset: str, columns: List[str]) -> Optional[Dict[str, dict]]:
+    """
+    Typed records of a dataset and everything below it, read in a single
+    transaction by the read-only inventory channel program. Each record also
+    has 'user', the org.zedenv user properties of the dataset.
+
+    Returns None if the backend can't run channel programs, callers then
+    fall back to 'zfs list'.
+    """
+    result = run_channel_program(dataset.split("/")[0], "inventory", [dataset], readonly=True)
+    if result is None:
+        return None
+
+    records = {}
+    for name, ds in result.items():
+        record = {c: zfs_value(c, str(ds.get(c, "-"))) for c in columns}
+        record['name'] = name
+        if 'clones' in columns:
+            record['clones'] = sorted(ds.get('clones') or {})
+        record['user'] = {p: str(v) for p, v in (ds.get('user') or {}).items()}
+        records[name] = record
+
+    return records
 
 
 def list_child_mountpoints(boot_environment_dataset: str) -> List[dict]:
@@ -214,99 +359,342 @@ def list_child_mountpoints(boot_environment_dataset: str) -> List[dict]:
         ...
     ]
 
+    Name, mountpoint and source of every child come from one recursive 'zfs get'.
     """
+    child_mountpoints = []
     try:
-        child_mountpoints_unformatted = pyzfscmds.cmd.zfs_list(boot_environment_dataset,
-                                                               recursive=True,
-                                                               columns=['name', 'mountpoint'])
+        for d in zfs_get(boot_environment_dataset,
+                         recursive=True,
+                         columns=['name', 'value', 'source'],
+                         properties=['mountpoint'],
+                         zfs_types=['filesystem']):
+            if d[0] != boot_environment_dataset:
+                child_mountpoints.append({
+                    'name': d[0],
+                    'mountpoint': d[1],
+                    'source': d[2]
+                })
     except RuntimeError:
         raise
 
-    child_mountpoints = []
-    for d in split_zfs_output(child_mountpoints_unformatted):
-        if d[0] != boot_environment_dataset:
-            try:
-                mount_type = pyzfscmds.cmd.zfs_get(
-                    d[0], columns=['source'], properties=['mountpoint'])
-            except RuntimeError:
-                raise
-            child_mountpoints.append({
-                'name': d[0],
-                'mountpoint': d[1],
-                'source': mount_type.rstrip()
-            })
-
     return child_mountpoints
 
 
-def list_boot_environments(target: str, columns: list) -> List[Dict[str, str]]:
+def list_boot_environments(target: str, columns: list) -> List[dict]:
     """
-    Returns a list of dictionaries with properties by name
+    Returns a list of dictionaries with properties by name, oldest first.
+    Read from the inventory, so the cost doesn't grow with the number of
+    boot environments. Space usage is calculated in zedenv.lib.space.
     E.g.:
     [
         {
             'name': 'vault/ROOT/default-2@2018-05-21-161500',
-            'creation': 'Mon-May-21-16:15-2018'
+            'creation': 1526944500
         }, ...
     ]
-
-    TODO:
-    Space Used:
-    By Snapshot = used
-    By Other:
-        Space = usedds + usedrefreserv
-          If all prior BE destroyed (full space):
-            Space += usedbysnapshots
     """
-    list_output = None
+    inventory = zedenv.lib.inventory.inventory()
+    names = None
     try:
-        list_output = pyzfscmds.cmd.zfs_list(target, recursive=True, depth=1,
-                                             zfs_types=["filesystem", "snapshot", "volume"],
-                                             sort_properties_ascending=["creation"],
-                                             columns=columns)
+        names = inventory.children(target, zfs_type=None, depth=1)
     except RuntimeError:
         ZELogger.log({
             "level": "EXCEPTION", "message": f"Failed to get properties of '{target}'"
         }, exit_on_error=True)
 
+    datasets = [inventory.datasets[n] for n in names if n != target]
+    datasets.sort(key=lambda ds: ds['creation'])
+
+    return [{c: ds[c] for c in columns} for ds in datasets]
+
+
+def boot_environment_names(target: str) -> List[str]:
     """
-    Take each line of output containing properties and convert
-    it to a list of property=value strings
+    Names of the boot environments in target and their snapshots, relative
+    to target, e.g. ['default', 'default@2018-05-21-161500', 'test'].
     """
+    names = []
+    for name in zedenv.lib.inventory.inventory().children(target, zfs_type=None, depth=2):
+        relative = name[len(target) + 1:]
+        if name[len(target):].startswith("/") and "/" not in relative:
+            names.append(relative)
 
-    split_property_list = split_zfs_output(list_output)
+    return names
 
-    # Get all properties except date, then add date converted to string
-    full_property_list = []
-    date_length = 5         # Num items from date in array
 
-    # Put each property in dict, with creation time put in separately due to being split
-    for line in split_property_list:
-        if line[0] != target:
-            line_item = {}
+def get_property(boot_environment_dataset: str, prop: str):
+    return zedenv.lib.inventory.inventory().get_property(boot_environment_dataset, prop)
 
-            if "creation" in columns:
-                line_columns = line[:-date_length]
-                line_date = "-".join(line[len(line) - date_length:])
-                line_item['creation'] = line_date
-            else:
-                line_columns = line
 
-            for i, it in enumerate(line_columns):
-                if columns[i] != 'creation':
-                    line_item[columns[i]] = it
+def dataset_exists(dataset: str, zfs_type: str = 'filesystem') -> bool:
+    return zedenv.lib.inventory.inventory().dataset_exists(dataset, zfs_type=zfs_type)
 
-            full_property_list.append(line_item)
 
-    return full_property_list
+def is_clone(dataset: str) -> bool:
+    return zedenv.lib.inventory.inventory().is_clone(dataset)
 
 
-def get_property(boot_environment_dataset: str, prop: str):
+def dataset_mountpoint(dataset: str) -> Optional[str]:
+    return zedenv.lib.inventory.inventory().dataset_mountpoint(dataset)
+
+
+def mountpoint_dataset(mountpoint: str) -> Optional[str]:
+    return zedenv.lib.inventory.inventory().mountpoint_dataset(mountpoint)
+
+
+def mounted_datasets(dataset: str) -> List[str]:
+    """
+    The dataset and those below it that are currently mounted.
+    """
+    return [m['dataset'] for m in zedenv.lib.inventory.inventory().mounts
+            if m['dataset'] == dataset or m['dataset'].startswith(f"{dataset}/")]
+
+
+def mounts_below(mountpoint: str) -> List[dict]:
+    """
+    ZFS mounts at mountpoint and below it, in mount order, from the mount table.
+    """
+    below = f"{mountpoint.rstrip('/')}/"
+    return [m for m in zedenv.lib.inventory.inventory().mounts
+            if m['mountpoint'] in (mountpoint, below) or m['mountpoint'].startswith(below)]
+
+
+"""
+ZFS calls through the configured backend, mutating calls are kept
+in sync with the inventory
+"""
+
+
+def zfs_list(target: Optional[str] = None, **kwargs) -> Iterable[List[str]]:
+    return zedenv.lib.configure.get_backend().zfs_list(target, **kwargs)
+
+
+def zfs_get(target: str, **kwargs) -> Iterable[List[str]]:
+    return zedenv.lib.configure.get_backend().zfs_get(target, **kwargs)
+
+
+def zfs_set(dataset: str, prop: str):
     try:
-        prop = pyzfscmds.cmd.zfs_get(boot_environment_dataset,
-                                     columns=["value"],
-                                     properties=[prop]).rstrip()
+        zedenv.lib.configure.get_backend().zfs_set(dataset, prop)
     except RuntimeError:
-        return None
+        zedenv.lib.inventory.inventory().invalidate()
+        raise
+
+    name, value = prop.split("=", 1)
+    zedenv.lib.inventory.inventory().set_property(dataset, name, value)
+    if name == "mountpoint":
+        zedenv.lib.inventory.inventory().invalidate(datasets=False, mounts=True)
+
+
+def zfs_set_properties(dataset: str, properties: List[str]):
+    """
+    Set several properties on a dataset in one transaction, either all of them
+    are set or none are. The RuntimeError raised names the property the backend
+    rejected, or all of them if its error doesn't say which.
+    """
+    try:
+        zedenv.lib.configure.get_backend().zfs_set_properties(dataset, properties)
+    except RuntimeError as e:
+        zedenv.lib.inventory.inventory().invalidate()
+        failed = [p for p in properties if f"'{p.split('=', 1)[0]}'" in str(e)] or properties
+        raise RuntimeError("Failed to set {} on {}\n{}".format(
+            ", ".join(f"'{p}'" for p in failed), dataset, e))
+
+    for prop in properties:
+        name, value = prop.split("=", 1)
+        zedenv.lib.inventory.inventory().set_property(dataset, name, value)
+        if name == "mountpoint":
+            zedenv.lib.inventory.inventory().invalidate(datasets=False, mounts=True)
+
+
+# Datasets per 'zfs set' when setting a property on many, keeps the command line short
+set_batch_size = 100
+
+
+def zfs_set_datasets(datasets: List[str], prop: str):
+    """
+    Set a property on several datasets, with one 'zfs set' per batch. If a
+    batch fails its datasets are set one at a time, so the RuntimeError raised
+    names the dataset that failed.
+    """
+    name, value = prop.split("=", 1)
+    for start in range(0, len(datasets), set_batch_size):
+        batch = datasets[start:start + set_batch_size]
+        try:
+            zedenv.lib.configure.get_backend().zfs_set_datasets(batch, [prop])
+        except RuntimeError:
+            zedenv.lib.inventory.inventory().invalidate()
+            for dataset in batch:
+                try:
+                    zfs_set(dataset, prop)
+                except RuntimeError as e:
+                    raise RuntimeError(f"Failed to set '{prop}' on {dataset}\n{e}")
+            continue
+
+        for dataset in batch:
+            zedenv.lib.inventory.inventory().set_property(dataset, name, value)
+        if name == "mountpoint":
+            zedenv.lib.inventory.inventory().invalidate(datasets=False, mounts=True)
+
+
+def zpool_set(zpool: str, prop: str):
+    try:
+        zedenv.lib.configure.get_backend().zpool_set(zpool, prop)
+    except RuntimeError:
+        zedenv.lib.inventory.inventory().invalidate(datasets=False, pools=True)
+        raise
 
-    return prop
+    name, value = prop.split("=", 1)
+    zedenv.lib.inventory.inventory().set_pool_property(zpool, name, value)
+
+
+def zfs_snapshot(dataset: str, snapname: str, recursive: bool = False):
+    try:
+        zedenv.lib.configure.get_backend().zfs_snapshot(dataset, snapname, recursive=recursive)
+    except RuntimeError:
+        zedenv.lib.inventory.inventory().invalidate()
+        raise
+
+    zedenv.lib.inventory.inventory().add_snapshots(dataset, snapname, recursive=recursive)
+
+
+def zfs_clone(snapname: str, dataset: str, properties: Optional[list] = None):
+    try:
+        zedenv.lib.configure.get_backend().zfs_clone(snapname, dataset, properties=properties)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate()
+
+
+def zfs_promote(dataset: str):
+    try:
+        zedenv.lib.configure.get_backend().zfs_promote(dataset)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate()
+
+
+def zfs_rename(dataset: str, new_dataset: str):
+    try:
+        zedenv.lib.configure.get_backend().zfs_rename(dataset, new_dataset)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate(mounts=True)
+
+
+def zfs_destroy(dataset: str, recursive_children: bool = False):
+    try:
+        zedenv.lib.configure.get_backend().zfs_destroy(dataset, recursive=recursive_children)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate(mounts=True)
+
+
+def zfs_destroy_snapshot(snapname: str):
+    try:
+        zedenv.lib.configure.get_backend().zfs_destroy(snapname)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate()
+
+
+def zfs_destroy_snapshots(snapnames: List[str]):
+    """
+    Destroy snapshots with one operation per dataset, 'zfs destroy dataset@a,b,c'.
+    """
+    by_dataset: Dict[str, List[str]] = {}
+    for snapname in snapnames:
+        dataset, snapshot = snapname.split("@")
+        by_dataset.setdefault(dataset, []).append(snapshot)
+
+    try:
+        for dataset, snapshots in by_dataset.items():
+            zedenv.lib.configure.get_backend().zfs_destroy_snapshots(dataset, snapshots)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate()
+
+
+def zfs_destroy_all(names: List[str]):
+    """
+    Destroy datasets and snapshots in the order given, children before their
+    parents. Names in one pool are destroyed in a single transaction by the
+    destroy channel program where the backend can run it, otherwise one at a time.
+    Either way a failed destroy doesn't stop the others or undo those made,
+    every failure is raised together at the end.
+    """
+    by_pool: Dict[str, List[str]] = {}
+    for name in names:
+        by_pool.setdefault(name.split("/")[0].split("@")[0], []).append(name)
+
+    failed: List[str] = []
+    errors: List[RuntimeError] = []
+    for zpool, pool_names in by_pool.items():
+        program_failed = run_channel_program(zpool, "destroy", pool_names)
+        if program_failed is None:
+            for name in pool_names:
+                try:
+                    zfs_destroy(name)
+                except RuntimeError as e:
+                    errors.append(e)
+        else:
+            failed.extend(sorted(program_failed))
+
+    message = "".join(str(e) for e in errors)
+    if failed:
+        message += f"Failed to destroy {', '.join(failed)}\n"
+    if message:
+        raise RuntimeError(message)
+
+
+def clone_tiers(clones: List[tuple]) -> List[List[tuple]]:
+    """
+    Group (snapshot, dataset, properties) clones by depth of the dataset,
+    parents first. A clone only needs its parent to exist, so those in a
+    tier are independent of each other.
+    """
+    tiers: Dict[int, List[tuple]] = {}
+    for clone in clones:
+        tiers.setdefault(clone[1].count("/"), []).append(clone)
+
+    return [tiers[depth] for depth in sorted(tiers)]
+
+
+def zfs_clones(clones: List[tuple], created_snapshots: Optional[List[str]] = None):
+    """
+    Create clones, given as (snapshot, dataset, properties) parents first.
+    The clones of a tier are created concurrently. If one fails, the clones
+    already made and any snapshots listed in created_snapshots are destroyed
+    again, as far as they can be, and RuntimeError raised.
+    """
+    created: List[str] = []
+    for tier in clone_tiers(clones):
+        results = zedenv.lib.runner.gather(
+            [lambda s=s, d=d, p=p: zfs_clone(s, d, properties=p) for s, d, p in tier])
+
+        created.extend(c[1] for c, r in zip(tier, results) if not isinstance(r, RuntimeError))
+        errors = zedenv.lib.runner.failures(results)
+        if errors:
+            message = "".join(str(e) for e in errors)
+            try:
+                zfs_destroy_all(list(reversed(created)) + (created_snapshots or []))
+            except RuntimeError as rollback_error:
+                raise RuntimeError(f"{message}\nFailed to remove the partially created clones "
+                                   f"{', '.join(created)}\n{rollback_error}")
+            raise RuntimeError(message)
+
+
+def zfs_mount(dataset: str, mountpoint: Optional[str] = None):
+    """
+    Mount a dataset, temporarily at mountpoint if given.
+    """
+    try:
+        zedenv.lib.configure.get_backend().zfs_mount(dataset, mountpoint=mountpoint)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate(datasets=False, mounts=True)
+
+
+def zfs_unmount(dataset: str, mountpoint: Optional[str] = None, recursive: bool = False):
+    """
+    Unmount a dataset, or what is mounted at mountpoint if given,
+    and with recursive everything mounted below it.
+    """
+    try:
+        zedenv.lib.configure.get_backend().zfs_unmount(
+            dataset, mountpoint=mountpoint, recursive=recursive)
+    finally:
+        zedenv.lib.inventory.inventory().invalidate(datasets=False, mounts=True)
@@ -2,10 +2,6 @@
 Startup checks
 """
 
-import pyzfscmds.check
-import pyzfscmds.cmd
-import pyzfscmds.system.agnostic
-
 import zedenv.lib.be
 from zedenv.lib.logger import ZELogger
 
@@ -14,14 +10,16 @@ import os
 
 def startup_check():
     try:
-        pyzfscmds.check.is_root_on_zfs()
+        root_dataset = zedenv.lib.be.mountpoint_dataset("/")
     except RuntimeError:
+        root_dataset = None
+
+    if root_dataset is None:
         raise RuntimeError(
             f"System is not booting off a ZFS root dataset.\n")
 
     try:
-        zedenv.lib.be.bootfs_for_pool(
-            pyzfscmds.system.agnostic.mountpoint_dataset("/").split("/")[0])
+        zedenv.lib.be.bootfs_for_pool(root_dataset.split("/")[0])
     except RuntimeError as err:
         raise RuntimeError(f"Couldn't get bootfs property of pool.\n{err}\n")
 
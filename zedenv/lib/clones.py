@@ -0,0 +1,133 @@
+"""
+Clone and origin relations of boot environments, used to plan destroys
+"""
+
+import posixpath
+from typing import Dict, List
+
+import zedenv.lib.inventory
+from zedenv.lib.inventory import inside
+
+
+class CloneGraph:
+    """
+    Graph of origin snapshots and their clones for the datasets below a boot
+    environment root, built from the inventory's listing of the root, so it
+    doesn't grow with the rest of the pool. Clones outside the root are still
+    found, a snapshot's 'clones' property names them wherever they are.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # dataset -> origin snapshot, for clones only
+        self.origins: Dict[str, str] = {}
+        # snapshot -> clones of it
+        self.clones: Dict[str, List[str]] = {}
+        # dataset -> snapshots of it
+        self.snapshots: Dict[str, List[str]] = {}
+        # dataset -> child datasets
+        self.children: Dict[str, List[str]] = {}
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Read the graph again, after a promote moved snapshots and origins.
+        """
+        for part in (self.origins, self.clones, self.snapshots, self.children):
+            part.clear()
+
+        inventory = zedenv.lib.inventory.inventory()
+        try:
+            # Read once, another thread may invalidate the inventory meanwhile
+            datasets = inventory.scope(self.root)
+        except RuntimeError as e:
+            raise RuntimeError(f"Failed to list clones under {self.root}.\n{e}\n")
+
+        for name in sorted(n for n in datasets if inside(n, self.root)):
+            ds = datasets[name]
+            if ds['type'] == 'snapshot':
+                self.snapshots.setdefault(name.split("@")[0], []).append(name)
+                self.clones[name] = ds['clones']
+            else:
+                self.children.setdefault(posixpath.dirname(name), []).append(name)
+                if ds['origin'] != '-':
+                    self.origins[name] = ds['origin']
+
+    def remove(self, dataset: str):
+        """
+        Drop a destroyed dataset, its children and their snapshots, so the
+        graph still holds for the next destroy of a plan without reading it again.
+        """
+        for ds in self.subtree(dataset):
+            for snapshot in self.snapshots.pop(ds, []):
+                self.clones.pop(snapshot, None)
+            self.origins.pop(ds, None)
+            self.children.pop(ds, None)
+
+        parent = posixpath.dirname(dataset)
+        if parent in self.children:
+            self.children[parent] = [c for c in self.children[parent] if c != dataset]
+        self.clones = {snapshot: [c for c in clones if not inside(c, dataset)]
+                       for snapshot, clones in self.clones.items()}
+
+    def subtree(self, dataset: str) -> List[str]:
+        """
+        The dataset and the datasets below it, parents first.
+        """
+        datasets = [dataset]
+        for ds in datasets:
+            datasets.extend(self.children.get(ds, []))
+        return datasets
+
+    def dependent_clones(self, dataset: str) -> List[str]:
+        """
+        Clones outside of dataset that depend on snapshots of it or its
+        children, and have to be promoted before it can be destroyed.
+        """
+        return [clone
+                for ds in self.subtree(dataset)
+                for snapshot in self.snapshots.get(ds, [])
+                for clone in self.clones[snapshot]
+                if not inside(clone, dataset)]
+
+    def origin_snapshots(self, dataset: str) -> List[str]:
+        """
+        Snapshots outside of dataset that it or its children were cloned from.
+        """
+        return [self.origins[ds] for ds in self.subtree(dataset)
+                if ds in self.origins and not inside(self.origins[ds], dataset)]
+
+    def dependents(self, snapshot: str) -> List[str]:
+        return self.clones.get(snapshot, [])
+
+    def orphaned(self, snapshot: str, dataset: str) -> bool:
+        """
+        Whether snapshot, under the root, has no clones left once dataset is destroyed.
+        """
+        return snapshot in self.clones and all(
+            inside(clone, dataset) for clone in self.clones[snapshot])
+
+    def destroy_order(self, datasets: List[str]) -> List[str]:
+        """
+        Order datasets so each comes before the datasets it was cloned from.
+        Destroyed in that order, none of them has to be promoted out of the
+        way of another, only clones left outside of all of them are.
+        """
+        ordered: List[str] = []
+        visited = set()
+
+        def visit(dataset: str):
+            if dataset in visited:
+                return
+            visited.add(dataset)
+            for clone in self.dependent_clones(dataset):
+                for ds in datasets:
+                    if inside(clone, ds):
+                        visit(ds)
+            ordered.append(dataset)
+
+        for dataset in datasets:
+            visit(dataset)
+
+        return ordered
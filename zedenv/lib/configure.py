@@ -1,8 +1,71 @@
+import os
 import pkg_resources
 import platform
 
+from typing import Optional
+
+import zedenv.lib.backend.libzfs
+import zedenv.lib.inventory
+from zedenv.lib.backend.base import Backend
+from zedenv.lib.backend.command import CommandBackend
+from zedenv.lib.backend.libzfs import LibZFSCoreBackend
+from zedenv.lib.backend.memory import MemoryBackend
 from zedenv.lib.logger import ZELogger
 
+"""
+Backends shipped with zedenv, others can be added under 'zedenv.backends' entry points
+"""
+builtin_backends = {
+    "command": CommandBackend,
+    "libzfs_core": LibZFSCoreBackend,
+    "memory": MemoryBackend,
+}
+
+_backend: Optional[Backend] = None
+
+
+def get_backends():
+    backends = dict(builtin_backends)
+
+    for entry_point in pkg_resources.iter_entry_points('zedenv.backends'):
+        backends[entry_point.name] = entry_point.load()
+
+    return backends
+
+
+def default_backend() -> str:
+    """
+    libzfs_core when the pyzfs bindings are installed, otherwise the zfs commands.
+    """
+    return "libzfs_core" if zedenv.lib.backend.libzfs.available() else "command"
+
+
+def get_backend() -> Backend:
+    """
+    Backend used for every ZFS operation, chosen once per invocation
+    with the ZEDENV_BACKEND environment variable, or set_backend().
+    """
+    global _backend
+    if _backend is None:
+        name = os.environ.get("ZEDENV_BACKEND", default_backend())
+        backends = get_backends()
+        if name not in backends:
+            raise RuntimeError(f"ZFS backend '{name}' does not exist, "
+                               f"available backends: {', '.join(sorted(backends))}\n")
+        _backend = backends[name]()
+
+    return _backend
+
+
+def set_backend(backend: Optional[Backend]):
+    """
+    Use a backend instance, or None to choose again on next use.
+    Cached state from the previous backend is dropped.
+    """
+    global _backend
+    _backend = backend
+    zedenv.lib.inventory.reset()
+
 
 # Import plugins
 def get_plugins():
@@ -0,0 +1,349 @@
+"""
+Invocation scoped inventory of ZFS datasets, pools and mounts
+"""
+
+import posixpath
+import threading
+import time
+from typing import Dict, List, Optional
+
+import zedenv.lib.be
+import zedenv.lib.configure
+import zedenv.lib.runner
+
+
+def inside(name: str, dataset: str) -> bool:
+    """
+    Whether name is dataset, a child of it, or a snapshot of either.
+    """
+    return name == dataset or name.startswith((f"{dataset}/", f"{dataset}@"))
+
+
+class Inventory:
+    """
+    In memory view of the boot environment datasets, pools and ZFS mounts.
+
+    Each part is filled on first use, a recursive 'zfs list' of each
+    boot environment root, a 'zpool get' and a read of the mount table.
+    Lookups are then answered from dictionaries. Mutating calls in
+    zedenv.lib.be update or invalidate it.
+
+    Only the boot environment roots are listed, the parents of the datasets
+    mounted at / and /boot and of the root pool's bootfs, so memory doesn't
+    grow with the rest of the pools. A lookup outside of them lists the
+    subtree of that dataset, which is kept along with the roots.
+
+    Where the backend can run channel programs, datasets are instead read by
+    the inventory program, one transaction per root, which also returns the
+    org.zedenv user properties so they need no 'zfs get'.
+
+    Operations running concurrently share it. Changes to the cached
+    dictionaries are made under a lock, and they are replaced rather than
+    changed in place, so a lookup holding one is never changed under it.
+    """
+
+    dataset_columns = ["name", "type", "origin", "mountpoint", "canmount", "creation",
+                       "used", "usedds", "usedbysnapshots", "usedrefreserv", "refer", "clones"]
+    # Columns children inherit, setting them can change the whole subtree
+    inherited_columns = ["mountpoint"]
+    pool_properties = ["bootfs", "altroot"]
+
+    def __init__(self):
+        self._datasets: Optional[Dict[str, dict]] = None
+        # Subtrees in _datasets
+        self._listed: List[str] = []
+        # Subtrees looked up outside of the roots, listed again after invalidate
+        self._scopes: List[str] = []
+        self._pools: Optional[Dict[str, Dict[str, str]]] = None
+        self._mounts: Optional[List[dict]] = None
+        self._properties: Dict[tuple, Optional[str]] = {}
+        self._user_properties: Dict[str, Dict[str, str]] = {}
+        self._channel_programs = True
+        self._lock = threading.RLock()
+
+    def roots(self) -> List[str]:
+        """
+        Boot environment roots, the parents of the datasets mounted at /
+        and /boot and of the bootfs of the root pool.
+        """
+        parents = []
+        for mountpoint in ("/", "/boot"):
+            dataset = self.mountpoint_dataset(mountpoint)
+            if dataset is not None:
+                parents.append(posixpath.dirname(dataset))
+        if parents:
+            bootfs = self.pool_property(parents[0].split("/")[0], "bootfs")
+            if bootfs not in (None, "-", ""):
+                parents.append(posixpath.dirname(bootfs))
+
+        return [p for p in dict.fromkeys(parents) if p]
+
+    @property
+    def datasets(self) -> Dict[str, dict]:
+        """
+        Records of the datasets, snapshots and volumes listed so far by name.
+        """
+        # Read into a local, another thread may invalidate the cache meanwhile
+        datasets = self._datasets
+        if datasets is not None:
+            return datasets
+
+        with self._lock:
+            datasets = self._datasets
+            if datasets is None:
+                roots = []
+                for root in self.roots() + self._scopes:
+                    if not any(inside(root, r) for r in roots):
+                        roots = [r for r in roots if not inside(r, root)] + [root]
+                datasets = {}
+                user_properties = {}
+                # Roots are in different pools or subtrees, read independently
+                for records in zedenv.lib.runner.run(
+                        [lambda root=root: self._list(root, missing=root in self._scopes)
+                         for root in roots]):
+                    for name, ds in records.items():
+                        user = ds.pop('user', None)
+                        if user is not None:
+                            user_properties[name] = user
+                        datasets[name] = ds
+                self._user_properties = user_properties
+                self._listed = roots
+                self._datasets = datasets
+
+        return datasets
+
+    def _list(self, root: str, missing: bool = False) -> Dict[str, dict]:
+        """
+        Records of root and everything below it, read by the inventory
+        channel program where it can be run, by 'zfs list' otherwise.
+        With missing a root that can't be listed has no records.
+        """
+        if self._channel_programs and zedenv.lib.configure.get_backend().channel_programs:
+            try:
+                records = zedenv.lib.be.channel_inventory(root, self.dataset_columns)
+                if records is not None:
+                    return records
+                # Not supported, don't try again this invocation
+                self._channel_programs = False
+            except RuntimeError:
+                # The program is read-only, 'zfs list' reads the same
+                pass
+
+        try:
+            dataset_list = zedenv.lib.configure.get_backend().zfs_list(
+                root, recursive=True, columns=self.dataset_columns,
+                zfs_types=["filesystem", "snapshot", "volume"])
+            return {ds['name']: ds
+                    for ds in zedenv.lib.be.zfs_records(dataset_list, self.dataset_columns)}
+        except RuntimeError as e:
+            if missing:
+                return {}
+            raise RuntimeError(f"Failed to list datasets.\n{e}\n")
+
+    def scope(self, dataset: str) -> Dict[str, dict]:
+        """
+        The datasets, with the subtree of dataset listed first if it's
+        outside of everything listed so far.
+        """
+        name = dataset.split("@")[0]
+        with self._lock:
+            datasets = self.datasets
+            if any(inside(name, root) for root in self._listed):
+                return datasets
+
+            records = self._list(name, missing=True)
+            datasets = dict(datasets)
+            user_properties = dict(self._user_properties)
+            for record_name, ds in records.items():
+                user = ds.pop('user', None)
+                if user is not None:
+                    user_properties[record_name] = user
+                datasets[record_name] = ds
+            self._scopes.append(name)
+            self._listed = self._listed + [name]
+            self._user_properties = user_properties
+            self._datasets = datasets
+
+        return datasets
+
+    @property
+    def pools(self) -> Dict[str, Dict[str, str]]:
+        pools = self._pools
+        if pools is None:
+            pools = {}
+            try:
+                for values in zedenv.lib.configure.get_backend().zpool_get(
+                        properties=self.pool_properties):
+                    if len(values) == 3:
+                        pools.setdefault(values[0], {})[values[1]] = values[2]
+            except RuntimeError as e:
+                raise RuntimeError(f"Failed to get pool properties.\n{e}\n")
+            self._pools = pools
+
+        return pools
+
+    @property
+    def mounts(self) -> List[dict]:
+        mounts = self._mounts
+        if mounts is None:
+            mounts = zedenv.lib.configure.get_backend().mount_table()
+            self._mounts = mounts
+
+        return mounts
+
+    def dataset_exists(self, dataset: str, zfs_type: Optional[str] = 'filesystem') -> bool:
+        ds = self.scope(dataset).get(dataset)
+        return ds is not None and (zfs_type is None or ds['type'] == zfs_type)
+
+    def is_clone(self, dataset: str) -> bool:
+        datasets = self.scope(dataset)
+        if dataset not in datasets:
+            raise RuntimeError(f"Dataset {dataset} does not exist.\n")
+
+        return datasets[dataset]['origin'] != '-'
+
+    def children(self, dataset: str,
+                 zfs_type: Optional[str] = 'filesystem',
+                 depth: Optional[int] = None) -> List[str]:
+        """
+        Names of the dataset and every dataset below it, sorted by name.
+        Depth is counted the same way as 'zfs list -d', snapshots are one
+        level below their dataset.
+        """
+        datasets = self.scope(dataset)
+        names = []
+        for name in datasets:
+            relative = name[len(dataset):]
+            if name.startswith(dataset) and relative[:1] in ("", "/", "@"):
+                fs_relative, snapshot_sep, _ = relative.partition("@")
+                name_depth = fs_relative.count("/") + (1 if snapshot_sep else 0)
+                if depth is None or name_depth <= depth:
+                    names.append(name)
+
+        return sorted(n for n in names
+                      if zfs_type is None or datasets[n]['type'] == zfs_type)
+
+    def pool_property(self, zpool: str, prop: str) -> Optional[str]:
+        return self.pools.get(zpool, {}).get(prop)
+
+    def get_property(self, dataset: str, prop: str):
+        """
+        Get a dataset property, columns of the inventory are answered directly,
+        anything else is fetched once and remembered.
+        """
+        datasets = self.scope(dataset)
+        if prop in self.dataset_columns and dataset in datasets:
+            return datasets[dataset][prop]
+
+        user_properties = self._user_properties
+        if prop.startswith("org.zedenv") and dataset in user_properties:
+            return user_properties[dataset].get(prop, "-")
+
+        properties = self._properties
+        if (dataset, prop) in properties:
+            return properties[(dataset, prop)]
+
+        try:
+            value = zedenv.lib.be.zfs_value(
+                prop, list(zedenv.lib.configure.get_backend().zfs_get(
+                    dataset, columns=["value"], properties=[prop]))[0][0])
+        except (RuntimeError, IndexError):
+            value = None
+        with self._lock:
+            self._properties[(dataset, prop)] = value
+
+        return value
+
+    def dataset_mountpoint(self, dataset: str) -> Optional[str]:
+        """
+        Where a dataset is currently mounted, None if not mounted.
+        """
+        return next((m['mountpoint'] for m in self.mounts if m['dataset'] == dataset), None)
+
+    def mountpoint_dataset(self, mountpoint: str) -> Optional[str]:
+        """
+        The ZFS dataset mounted at a location, None if it isn't a ZFS mount.
+        """
+        return next((m['dataset'] for m in self.mounts if m['mountpoint'] == mountpoint), None)
+
+    def set_property(self, dataset: str, prop: str, value: str):
+        """
+        Record a property change made on a dataset.
+        """
+        value = zedenv.lib.be.zfs_value(prop, value)
+        with self._lock:
+            self._properties = {k: v for k, v in self._properties.items() if k[1] != prop}
+
+            user_properties = self._user_properties
+            if dataset in user_properties and ":" in prop:
+                if any(name.startswith(f"{dataset}/") for name in user_properties):
+                    # Inherited by children, read them again
+                    self._user_properties = {}
+                else:
+                    self._user_properties = {
+                        **user_properties, dataset: {**user_properties[dataset], prop: value}}
+
+            datasets = self._datasets
+            if datasets is not None and prop in self.dataset_columns:
+                if prop in self.inherited_columns and any(
+                        name.startswith(f"{dataset}/") for name in datasets):
+                    # Inherited values of children may have changed
+                    self._datasets = None
+                elif dataset in datasets:
+                    self._datasets = {**datasets, dataset: {**datasets[dataset], prop: value}}
+
+    def add_snapshots(self, dataset: str, snapname: str, recursive: bool = False):
+        """
+        Record a snapshot of a dataset, and of its children if recursive.
+        """
+        with self._lock:
+            if self._datasets is None:
+                return
+
+            sources = self.children(dataset, zfs_type=None) if recursive else [dataset]
+            datasets = dict(self._datasets)
+            creation = int(time.time())
+            for name in sources:
+                if name in datasets and datasets[name]['type'] != 'snapshot':
+                    datasets[f"{name}@{snapname}"] = dict(
+                        {c: zedenv.lib.be.zfs_value(c, '-') for c in self.dataset_columns},
+                        name=f"{name}@{snapname}", type='snapshot', creation=creation)
+            self._datasets = datasets
+
+    def set_pool_property(self, zpool: str, prop: str, value: str):
+        with self._lock:
+            pools = self._pools
+            if pools is not None:
+                self._pools = {**pools, zpool: {**pools.get(zpool, {}), prop: value}}
+
+    def invalidate(self, datasets: bool = True, pools: bool = False, mounts: bool = False):
+        with self._lock:
+            if datasets:
+                self._datasets = None
+                self._properties = {}
+                self._user_properties = {}
+            if pools:
+                self._pools = None
+            if mounts:
+                self._mounts = None
+
+
+_inventory: Optional[Inventory] = None
+
+
+def inventory() -> Inventory:
+    """
+    Inventory shared by the whole invocation.
+    """
+    global _inventory
+    if _inventory is None:
+        _inventory = Inventory()
+    return _inventory
+
+
+def reset():
+    """
+    Drop all cached state, the next lookup reloads from the system.
+    """
+    global _inventory
+    _inventory = None
@@ -0,0 +1,16 @@
+-- Destroy the datasets and snapshots given as arguments, in order, in a
+-- single transaction. Children have to be given before their parents.
+-- Returns the names that could not be destroyed with their error code.
+
+args = ...
+argv = args["argv"]
+
+failed = {}
+for i, name in ipairs(argv) do
+    local err = zfs.sync.destroy(name)
+    if err ~= 0 then
+        failed[name] = err
+    end
+end
+
+return failed
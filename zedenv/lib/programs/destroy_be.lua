@@ -0,0 +1,110 @@
+-- Destroy a boot environment dataset and everything below it in a single
+-- transaction. Any further arguments are origin snapshots to destroy
+-- afterwards, they are kept if anything still depends on them.
+-- Clones outside of the boot environment are not promoted, if a snapshot of
+-- it has one nothing is changed; the caller promotes them step by step.
+-- Every destroy that can be checked before the others are made is checked
+-- first, if one of them would fail nothing is changed.
+-- Returns the names destroyed and kept, and the names that failed with their
+-- error code. A failure leaves the boot environment as it was, unless a
+-- destroy the checks can't cover fails once others were made.
+
+args = ...
+argv = args["argv"]
+root = argv[1]
+
+-- Error code for a snapshot with a clone outside of the boot environment
+EBUSY = 16
+
+destroyed = {}
+kept = {}
+failed = {}
+
+function inside(name)
+    local prefix = string.sub(name, 1, #root + 1)
+    return name == root or prefix == root .. "/" or prefix == root .. "@"
+end
+
+function list(iterator, name)
+    local names = {}
+    for child in iterator(name) do
+        table.insert(names, child)
+    end
+    return names
+end
+
+function result()
+    return {destroyed = destroyed, kept = kept, failed = failed}
+end
+
+-- Filesystems, each before its children
+datasets = {}
+function collect(name)
+    table.insert(datasets, name)
+    for child in zfs.list.children(name) do
+        collect(child)
+    end
+end
+collect(root)
+
+-- Checks see the pool as it is now, so only destroys that don't wait on
+-- another change can be checked: snapshots without clones and datasets
+-- without children or snapshots.
+for i, ds in ipairs(datasets) do
+    local snapshots = list(zfs.list.snapshots, ds)
+    for j, snapshot in ipairs(snapshots) do
+        local clones = list(zfs.list.clones, snapshot)
+        for k, clone in ipairs(clones) do
+            if not inside(clone) then
+                failed[clone] = EBUSY
+            end
+        end
+        if #clones == 0 then
+            local err = zfs.check.destroy(snapshot)
+            if err ~= 0 then
+                failed[snapshot] = err
+            end
+        end
+    end
+    if #snapshots == 0 and #list(zfs.list.children, ds) == 0 then
+        local err = zfs.check.destroy(ds)
+        if err ~= 0 then
+            failed[ds] = err
+        end
+    end
+end
+
+if next(failed) ~= nil then
+    return result()
+end
+
+for i = #datasets, 1, -1 do
+    for j, snapshot in ipairs(list(zfs.list.snapshots, datasets[i])) do
+        local err = zfs.sync.destroy(snapshot)
+        if err ~= 0 then
+            failed[snapshot] = err
+            return result()
+        end
+        destroyed[snapshot] = true
+    end
+    local err = zfs.sync.destroy(datasets[i])
+    if err ~= 0 then
+        failed[datasets[i]] = err
+        return result()
+    end
+    destroyed[datasets[i]] = true
+end
+
+-- The boot environment is gone, an origin that can't be destroyed is kept
+for i = 2, #argv do
+    local snapshot = argv[i]
+    if zfs.exists(snapshot) then
+        if #list(zfs.list.clones, snapshot) == 0 and zfs.sync.destroy(snapshot) == 0 then
+            destroyed[snapshot] = true
+        else
+            kept[snapshot] = true
+        end
+    end
+end
+
+return result()
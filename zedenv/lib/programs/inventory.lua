@@ -0,0 +1,85 @@
+-- Read-only inventory of a dataset and everything below it, run with
+-- 'zfs program -n'. Returns a table keyed by dataset, snapshot and volume
+-- name with the properties zedenv reads, the clones of each snapshot and
+-- the org.zedenv user properties of each dataset. An empty table if the
+-- dataset doesn't exist.
+
+args = ...
+argv = args["argv"]
+
+-- Inventory column and the property it is read from
+dataset_properties = {
+    origin = "origin",
+    mountpoint = "mountpoint",
+    canmount = "canmount",
+    creation = "creation",
+    used = "used",
+    usedds = "usedbydataset",
+    usedbysnapshots = "usedbysnapshots",
+    usedrefreserv = "usedbyrefreservation",
+    refer = "referenced",
+}
+
+snapshot_properties = {
+    creation = "creation",
+    used = "used",
+    refer = "referenced",
+}
+
+-- Renamed in OpenZFS 2.0
+user_properties = zfs.list.user_properties or zfs.list.properties
+
+-- Not valid for volumes, reading them would abort the program
+filesystem_properties = {
+    mountpoint = true,
+    canmount = true,
+}
+
+function describe(name, properties)
+    local ds = {}
+    ds["type"] = zfs.get_prop(name, "type")
+    for column, prop in pairs(properties) do
+        local value = nil
+        if ds["type"] == "filesystem" or not filesystem_properties[prop] then
+            value = zfs.get_prop(name, prop)
+        end
+        if value == nil or value == "" then
+            value = "-"
+        end
+        ds[column] = value
+    end
+    return ds
+end
+
+function walk(name, result)
+    local ds = describe(name, dataset_properties)
+    ds["user"] = {}
+    for prop, value in user_properties(name) do
+        if string.sub(prop, 1, 10) == "org.zedenv" then
+            ds["user"][prop] = value
+        end
+    end
+    result[name] = ds
+
+    for snapshot in zfs.list.snapshots(name) do
+        local snap = describe(snapshot, snapshot_properties)
+        snap["clones"] = {}
+        for clone in zfs.list.clones(snapshot) do
+            snap["clones"][clone] = true
+        end
+        result[snapshot] = snap
+    end
+
+    for child in zfs.list.children(name) do
+        walk(child, result)
+    end
+
+    return result
+end
+
+-- Nothing to list, rather than aborting the program
+if not zfs.exists(argv[1]) then
+    return {}
+end
+
+return walk(argv[1], {})
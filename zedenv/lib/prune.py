@@ -0,0 +1,130 @@
+"""
+Retention rules deciding which boot environments prune destroys
+
+Rules are read from org.zedenv:prune-* properties on the boot environment
+root, a boot environment is kept if any rule keeps it:
+    keep-last:   The newest N boot environments.
+    max-age:     Boot environments younger than the age, e.g. 12h, 30d or 2w.
+    keep-daily:  The newest boot environment of each of the last N days with one.
+    keep-weekly: The newest boot environment of each of the last N weeks with one.
+
+Snapshots zedenv took to clone boot environments from are found here as well,
+once no clone depends on them they only hold space.
+"""
+
+import datetime
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+import zedenv.lib.inventory
+import zedenv.lib.system
+
+rule_properties = ["keep-last", "max-age", "keep-daily", "keep-weekly"]
+pinned_property = "org.zedenv:pinned"
+
+age_units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def rule_property(rule: str) -> str:
+    return f"org.zedenv:prune-{rule}"
+
+
+def parse_age(age: str) -> int:
+    """
+    Convert an age like '12h' or '30d' to seconds, a number alone is in days.
+    """
+    m = re.fullmatch(r"(\d+)([smhdw]?)", age.strip())
+    if not m:
+        raise ValueError(f"Invalid age '{age}', expected a number with unit s, m, h, d or w")
+
+    return int(m.group(1)) * age_units[m.group(2) or "d"]
+
+
+def parse_rules(values: Dict[str, Optional[str]]) -> Dict[str, Optional[int]]:
+    """
+    Rules from property values by rule name, unset values are None or '-'.
+    Ages are converted to seconds, raises ValueError for invalid values.
+    """
+    rules = {}
+    for rule in rule_properties:
+        value = values.get(rule)
+        if value is None or value in ("-", ""):
+            rules[rule] = None
+        elif rule == "max-age":
+            rules[rule] = parse_age(str(value))
+        else:
+            try:
+                rules[rule] = int(value)
+            except ValueError:
+                raise ValueError(f"Invalid value '{value}' for {rule}, expected a number")
+            if rules[rule] < 0:
+                raise ValueError(f"Invalid value '{value}' for {rule}, expected a number")
+
+    return rules
+
+
+def newest_per_period(boot_environments: List[dict], count: int, period) -> Iterable[str]:
+    """
+    Newest boot environment of each of the last count periods containing one,
+    boot_environments sorted newest first.
+    """
+    periods = []
+    for be in boot_environments:
+        key = period(datetime.datetime.fromtimestamp(be['creation']))
+        if key not in periods:
+            if len(periods) == count:
+                break
+            periods.append(key)
+            yield be['name']
+
+
+def retained(boot_environments: List[dict],
+             rules: Dict[str, Optional[int]],
+             now: Optional[float] = None) -> Set[str]:
+    """
+    Names of boot environments, dicts with 'name' and 'creation', kept by the rules.
+    """
+    now = datetime.datetime.now().timestamp() if now is None else now
+    newest = sorted(boot_environments, key=lambda be: be['creation'], reverse=True)
+
+    keep = set()
+    if rules.get("keep-last") is not None:
+        keep.update(be['name'] for be in newest[:rules["keep-last"]])
+    if rules.get("max-age") is not None:
+        keep.update(be['name'] for be in newest if now - be['creation'] < rules["max-age"])
+    if rules.get("keep-daily") is not None:
+        keep.update(newest_per_period(newest, rules["keep-daily"], lambda d: d.date()))
+    if rules.get("keep-weekly") is not None:
+        keep.update(newest_per_period(newest, rules["keep-weekly"],
+                                      lambda d: d.isocalendar()[:2]))
+
+    return keep
+
+
+def created_snapshot(snapname: str) -> bool:
+    """
+    Whether a snapshot name is one zedenv.lib.be.snapshot gives, a creation time.
+    """
+    try:
+        zedenv.lib.system.parse_time(snapname.split("@")[1])
+    except (ValueError, IndexError):
+        return False
+
+    return True
+
+
+def orphaned_snapshots(roots: List[str]) -> List[dict]:
+    """
+    Snapshots zedenv created of the boot environments below roots, and their
+    children, that no clone depends on. Found in the inventory listing in one
+    pass, records have 'name' and 'used', sorted by name.
+    """
+    inventory = zedenv.lib.inventory.inventory()
+    orphaned = []
+    for root in roots:
+        for name in inventory.children(root, zfs_type='snapshot'):
+            ds = inventory.datasets[name]
+            if not name.startswith(f"{root}@") and created_snapshot(name) and not ds['clones']:
+                orphaned.append({'name': name, 'used': ds['used'] or 0})
+
+    return orphaned
@@ -0,0 +1,127 @@
+"""
+Run independent ZFS and mount operations concurrently
+
+Operations are blocking calls, backend calls or the commands behind them,
+run from an asyncio event loop on a pool of threads, so no more than a
+limited number run at once. Results and errors are returned in the order
+the operations were given, not the order they finished, so what is
+reported doesn't depend on timing.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+from typing import Any, Callable, List, Optional
+
+from zedenv.lib.logger import ZELogger
+
+default_limit = 8
+
+
+def concurrency() -> int:
+    """
+    Operations run at once, set with the ZEDENV_JOBS environment variable.
+    """
+    try:
+        limit = int(os.environ.get("ZEDENV_JOBS", default_limit))
+    except ValueError:
+        limit = default_limit
+
+    return max(limit, 1)
+
+
+async def gather_calls(loop: asyncio.AbstractEventLoop,
+                       executor: concurrent.futures.Executor,
+                       functions: List[Callable[[], Any]]) -> list:
+    return await asyncio.gather(*[loop.run_in_executor(executor, f) for f in functions],
+                                return_exceptions=True)
+
+
+def gather(functions: List[Callable[[], Any]], limit: Optional[int] = None) -> list:
+    """
+    Call functions concurrently and return their results in order. A function
+    that raised RuntimeError has the exception in place of its result, so the
+    caller knows which succeeded. Anything else is raised once all finished.
+    """
+    limit = limit or concurrency()
+    if len(functions) < 2 or limit == 1:
+        results = []
+        for f in functions:
+            try:
+                results.append(f())
+            except RuntimeError as e:
+                results.append(e)
+        return results
+
+    loop = asyncio.new_event_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=limit)
+    try:
+        results = loop.run_until_complete(gather_calls(loop, executor, functions))
+    finally:
+        executor.shutdown(wait=True)
+        loop.close()
+
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, RuntimeError):
+            raise result
+
+    return results
+
+
+def failures(results: list) -> List[RuntimeError]:
+    return [r for r in results if isinstance(r, RuntimeError)]
+
+
+def run(functions: List[Callable[[], Any]], limit: Optional[int] = None) -> list:
+    """
+    Call functions concurrently, if any failed raise a RuntimeError
+    with the messages of every failure, in order.
+    """
+    results = gather(functions, limit=limit)
+    errors = failures(results)
+    if errors:
+        raise RuntimeError("".join(str(e) for e in errors))
+
+    return results
+
+
+def log_failures(results: list) -> bool:
+    """
+    Log the failures among results, in the order the operations were given.
+    Returns whether any failed.
+    """
+    errors = failures(results)
+    for e in errors:
+        ZELogger.log({"level": "ERROR", "message": f"{e}"})
+
+    return bool(errors)
+
+
+def exited(f: Callable[[], Any]) -> bool:
+    """
+    Call f, returning whether it exited.
+    """
+    try:
+        f()
+    except SystemExit:
+        return True
+
+    return False
+
+
+def join(functions: List[Callable[[], Any]], serial: bool = False):
+    """
+    Call cli steps concurrently, such as the root pool and boot pool halves of
+    a command, and wait for all of them. Steps report their own errors through
+    ZELogger and exit, the RuntimeErrors they raise are logged here. If any
+    failed, exit once all finished. With serial they are called in order and
+    the first failure exits at once, for steps that may prompt or print a plan.
+    """
+    if serial:
+        for f in functions:
+            f()
+        return
+
+    results = gather([lambda f=f: exited(f) for f in functions])
+    if log_failures(results) or True in results:
+        raise SystemExit(1)
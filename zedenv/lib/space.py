@@ -0,0 +1,74 @@
+"""
+Space usage accounting for boot environments
+
+Based on the beadm calculation:
+https://github.com/vermaden/beadm/blob/60f8d4de7b0a0a59360f631816d36cfefcc86b75/beadm#L389-L421
+
+Space Used:
+By Snapshot = used
+By Other:
+    Space = usedds + usedrefreserv
+      If all prior BE destroyed (full space):
+        Space += usedbysnapshots
+"""
+
+from typing import Dict
+
+import zedenv.lib.inventory
+
+space_columns = ["space", "exclusive", "shared"]
+
+
+def boot_environment_space(be_root: str) -> Dict[str, dict]:
+    """
+    Space used by every boot environment under be_root, including children,
+    computed in memory from the inventory listing. Values are in bytes:
+        space:     usedds + usedrefreserv + usedbysnapshots, full space used
+                   once all prior boot environments are destroyed.
+        exclusive: Space freed by destroying only this boot environment,
+                   usedds + usedrefreserv plus the used space of snapshots
+                   no clone depends on.
+        shared:    Space held in common with other boot environments, used space
+                   of snapshots that are the origin of a clone, and for clones
+                   the data still referenced from their origin (refer - usedds).
+    E.g.:
+    {
+        'zpool/ROOT/default': {'space': 1073741824, 'exclusive': 536870912, 'shared': 0},
+        ...
+    }
+    """
+    inventory = zedenv.lib.inventory.inventory()
+    subtree = inventory.children(be_root, zfs_type=None)
+
+    # Map each origin snapshot to the clones that depend on it
+    dependents = {}
+    for name in subtree:
+        origin = inventory.datasets[name]['origin']
+        if origin != '-':
+            dependents.setdefault(origin, []).append(name)
+
+    space = {}
+    prefix_len = len(be_root) + 1
+    for name in subtree:
+        relative = name[prefix_len:]
+        if not relative or relative.startswith("@"):
+            continue
+
+        be_dataset = f"{be_root}/{relative.split('@')[0].split('/')[0]}"
+        be_space = space.setdefault(be_dataset, {c: 0 for c in space_columns})
+        ds = inventory.datasets[name]
+
+        if ds['type'] == 'snapshot':
+            clones = dependents.get(name, [])
+            if any(d != be_dataset and not d.startswith(f"{be_dataset}/") for d in clones):
+                be_space['shared'] += ds['used'] or 0
+            else:
+                be_space['exclusive'] += ds['used'] or 0
+        else:
+            dataset_space = (ds['usedds'] or 0) + (ds['usedrefreserv'] or 0)
+            be_space['space'] += dataset_space + (ds['usedbysnapshots'] or 0)
+            be_space['exclusive'] += dataset_space
+            if ds['origin'] != '-':
+                be_space['shared'] += max((ds['refer'] or 0) - (ds['usedds'] or 0), 0)
+
+    return space
@@ -1,32 +1,53 @@
 import datetime
-import locale
 import platform
+import re
 import subprocess
-from contextlib import contextmanager
 from typing import List, Optional
 
 
-@contextmanager
-def setlocale(encoding: str = "C"):
+def parse_time(origin_property: str, fmt: str = "%Y-%m-%d-%H-%f") -> datetime:
     """
-    See: https://stackoverflow.com/a/24070673
+    Parse a time written by zedenv, formats are numeric so no locale is needed.
     """
-    saved = locale.setlocale(locale.LC_ALL)
-    try:
-        yield locale.setlocale(locale.LC_ALL, encoding)
-    finally:
-        locale.setlocale(locale.LC_ALL, saved)
+    return datetime.datetime.strptime(origin_property, fmt)
+
+
+def format_creation(creation: int) -> str:
+    """
+    Format a parsable (epoch) creation time for display,
+    e.g. 'Mon-May-21-16:15-2018'.
+    """
+    creation_datetime = datetime.datetime.fromtimestamp(creation)
+    return "-".join([creation_datetime.strftime("%a"),
+                     creation_datetime.strftime("%b"),
+                     str(creation_datetime.day),
+                     creation_datetime.strftime("%H:%M"),
+                     creation_datetime.strftime("%Y")])
 
 
-def parse_time(origin_property: str, fmt: str = "%Y-%m-%d-%H-%f",
-               encoding: str = "C", no_setlocale: bool = False) -> datetime:
-    if no_setlocale:
-        return datetime.datetime.strptime(origin_property, fmt)
+def format_size(size: Optional[int]) -> str:
+    """
+    Format a size in bytes for display the way zfs does, e.g. '1.21G'.
+    """
+    if size is None:
+        return "-"
+
+    units = ["", "K", "M", "G", "T", "P", "E"]
+    index = 0
+    value = float(size)
+    while value >= 1024 and index < len(units) - 1:
+        value /= 1024
+        index += 1
 
-    with setlocale(encoding=encoding):
-        origin_datetime: datetime = datetime.datetime.strptime(origin_property, fmt)
+    if index == 0 or value == int(value):
+        return f"{int(value)}{units[index]}"
 
-    return origin_datetime
+    for precision in (2, 1, 0):
+        formatted = f"{value:.{precision}f}{units[index]}"
+        if len(formatted) <= 5:
+            return formatted
+
+    return formatted
 
 
 def mount(call_args: List[str] = None,
@@ -91,3 +112,53 @@ def zfs_manual_mount(dataset: str, mountpoint: str, call_args: Optional[list] =
                 raise
         else:
             raise
+
+
+def mount_table(mount_list: Optional[List[str]] = None) -> List[dict]:
+    """
+    Parse 'mount' output into a list of every mount, of any type, in the order
+    they appear. Handles both Linux and FreeBSD formats:
+        zpool/ROOT/default on / type zfs (rw,relatime,xattr,noacl)
+        zpool/ROOT/default on / (zfs, local, noatime, nfsv4acls)
+    E.g.:
+    [
+        {
+            'source': 'zpool/ROOT/default',
+            'mountpoint': '/',
+            'fstype': 'zfs'
+        },
+        ...
+    ]
+    """
+    if mount_list is None:
+        mount_list = mount()
+
+    target = re.compile(r'^(?P<source>.+?) on (?P<mountpoint>.+?) '
+                        r'(?:type (?P<fstype>\S+) \(|\((?P<bsd_fstype>[^,)\s]+))')
+
+    mounts = []
+    for line in mount_list:
+        match = target.match(line)
+        if match:
+            mounts.append({
+                'source': match.group('source'),
+                'mountpoint': match.group('mountpoint'),
+                'fstype': match.group('fstype') or match.group('bsd_fstype')
+            })
+
+    return mounts
+
+
+def zfs_mount_table(mount_list: Optional[List[str]] = None) -> List[dict]:
+    """
+    The ZFS mounts of the mount table, in the order they appear. E.g.:
+    [
+        {
+            'dataset': 'zpool/ROOT/default',
+            'mountpoint': '/'
+        },
+        ...
+    ]
+    """
+    return [{'dataset': m['source'], 'mountpoint': m['mountpoint']}
+            for m in mount_table(mount_list) if m['fstype'] == "zfs"]
@@ -2,8 +2,7 @@ import os
 import re
 import shutil
 
-import pyzfscmds.cmd
-
+import zedenv.lib.be
 import zedenv.plugins.configuration as plugin_config
 from zedenv.lib.logger import ZELogger
 
@@ -34,7 +33,7 @@ class FreeBSDLoader(plugin_config.Plugin):
         ds = f"{self.be_root}/{self.boot_environment}"
 
         try:
-            pyzfscmds.cmd.zfs_set(f"{self.be_root}/{self.boot_environment}", canmount_setting)
+            zedenv.lib.be.zfs_set(f"{self.be_root}/{self.boot_environment}", canmount_setting)
         except RuntimeError as e:
             ZELogger.log({
                 "level": "EXCEPTION",